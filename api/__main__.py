@@ -0,0 +1,42 @@
+"""
+API entry point: `python -m api` serves api.main:app with API_WORKERS uvicorn worker processes.
+
+Only the API runs here; the ETL scheduler is its own process (`python -m services.scheduler`),
+so ETL CPU spikes never compete with requests. Nothing heavy is imported before uvicorn
+starts, and the app itself never imports pandas or the ingestion code.
+"""
+import glob
+import os
+import tempfile
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# One worker per core by default, capped so a big host doesn't open a surprise number of DB pools
+API_WORKERS = int(os.getenv("API_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Development only: reloading runs a single worker
+API_RELOAD = os.getenv("API_RELOAD", "false").lower() == "true"
+
+
+def main():
+    import uvicorn
+
+    workers = 1 if API_RELOAD else API_WORKERS
+    # Read by core/database.py in every worker, so DB_POOL_BUDGET is split across them
+    os.environ["DB_POOL_PROCESSES"] = str(workers)
+    if workers > 1:
+        _share_metrics()
+    print(f"🚀 API on {API_HOST}:{API_PORT} with {workers} worker(s)")
+    uvicorn.run("api.main:app", host=API_HOST, port=API_PORT, workers=workers, reload=API_RELOAD)
+
+
+def _share_metrics():
+    """Points every worker at one METRICS_MULTIPROC_DIR (see core/metrics.py), emptied of the last run's files."""
+    directory = os.environ.get("METRICS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="api-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+        os.remove(path)
+    os.environ["METRICS_MULTIPROC_DIR"] = directory
+
+
+if __name__ == "__main__":
+    main()
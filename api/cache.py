@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlencode
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from core.models import ETLGeneration
+
+try:
+    import orjson
+except ImportError: # Optional dependency: falls back to the stdlib encoder
+    orjson = None
+
+# Read endpoints only change when the ETL commits, so their responses are cached per ETL
+# generation. The TTL is a safety net for changes made outside the pipeline.
+CACHE_ENABLED = os.getenv("API_CACHE_ENABLED", "true").lower() == "true"
+CACHE_BACKEND = os.getenv("API_CACHE_BACKEND", "memory") # memory | shared
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", "300"))
+CACHE_DIR = os.getenv("API_CACHE_DIR", "/tmp/kasparro-api-cache")
+# How often each process re-reads the generation counter from the database
+GENERATION_POLL_SECONDS = float(os.getenv("API_CACHE_GENERATION_POLL_SECONDS", "1"))
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a TTL, bounded to `max_entries` entries."""
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCacheBackend:
+    """
+    Local stand-in for a shared cache server (e.g. Redis): entries are JSON files in one
+    directory, so every API worker on the host shares them. Same get/set/clear interface
+    as MemoryCacheBackend, so a networked backend can replace it without touching routes.
+    """
+    def __init__(self, directory: str = CACHE_DIR, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        # Write to a temp file and rename so other workers never read a half-written entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda path: os.path.getmtime(path))
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class ResponseCache:
+    def __init__(self, backend, poll_seconds: float = GENERATION_POLL_SECONDS):
+        self.backend = backend
+        self.poll_seconds = poll_seconds
+        self._generation = None
+        self._generation_read_at = 0.0
+
+    async def generation(self, db) -> int:
+        """Current ETL generation, re-read from the database at most every poll_seconds."""
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_read_at >= self.poll_seconds:
+            row = await db.get(ETLGeneration, 1)
+            self._generation = row.generation if row else 0
+            self._generation_read_at = now
+        return self._generation
+
+    def clear(self):
+        self.backend.clear()
+        self._generation = None
+
+
+def _build_backend():
+    if CACHE_BACKEND == "shared":
+        return SharedCacheBackend()
+    return MemoryCacheBackend()
+
+response_cache = ResponseCache(_build_backend())
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    # Weak comparison (RFC 9110): If-None-Match ignores the W/ prefix on either side
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def dumps(payload) -> bytes:
+    """JSON-encodes plain Python data (dicts, lists, datetimes, ...) with orjson when available."""
+    if orjson is not None:
+        # UTC as "Z", the same as pydantic writes it
+        return orjson.dumps(payload, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+
+
+def _serialize(response_model, body: dict, validate: bool) -> bytes:
+    if validate:
+        # pydantic validates and writes JSON in one pass (no jsonable_encoder round trip)
+        model = response_model.model_validate({"request_id": "", "api_latency_ms": 0, **body})
+        return model.model_dump_json(exclude={"request_id", "api_latency_ms"}).encode()
+    return dumps(body)
+
+
+async def cached_response(request: Request, db, response_model, build, validate: bool = True):
+    """
+    Serves a read endpoint through the response cache.
+
+    `db` is a reader from api.dependencies.get_read_db. `build()` is a coroutine that runs
+    the actual queries and returns the response body without request_id and api_latency_ms;
+    those two are filled in per request. The body is serialized to JSON once, when it is
+    cached, and validated against `response_model` first unless `validate=False` (for
+    routes whose build() already returns plain, correctly typed column values).
+    Clients sending a matching If-None-Match get an empty 304. The ETag is weak: it covers
+    the cached data, not the bytes sent (request_id and latency differ on every response,
+    and CompressionMiddleware may encode the body).
+    """
+    start_time = time.time()
+
+    key = None
+    entry = None
+    if CACHE_ENABLED:
+        # The API key is left out on purpose: auth has already run, and the data is the same for everyone
+        # Encoded again, so a "&" or "=" inside a value can't pass for another parameter
+        query = urlencode(sorted(request.query_params.multi_items()))
+        key = f"{await response_cache.generation(db)}:{request.url.path}?{query}"
+        entry = response_cache.backend.get(key)
+
+    if entry is None:
+        body = _serialize(response_model, await build(), validate)
+        etag = 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+        # Stored as text so the shared (file) backend can keep it as JSON too
+        entry = {"etag": etag, "body": body.decode()}
+        if key:
+            response_cache.backend.set(key, entry)
+
+    # Vary on every response, compressed or not, so caches keep the encodings apart
+    headers = {"ETag": entry["etag"], "Vary": "Accept-Encoding"}
+    if _etag_matches(request, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    # Splice the per-request fields in front of the cached body instead of re-encoding it
+    latency = (time.time() - start_time) * 1000
+    meta = dumps({"request_id": str(uuid.uuid4()), "api_latency_ms": round(latency, 2)})
+    body = entry["body"].encode()
+    content = meta[:-1] + (b"," + body[1:] if body != b"{}" else b"}")
+    return Response(content, media_type="application/json", headers=headers)
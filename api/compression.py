@@ -0,0 +1,110 @@
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError: # Optional dependency: without it only gzip is offered
+    brotli = None
+
+# Responses smaller than this go out uncompressed; below ~1KB the headers cost more than we save
+COMPRESSION_MIN_BYTES = int(os.getenv("API_COMPRESSION_MIN_BYTES", "1000"))
+GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("API_BROTLI_QUALITY", "4")) # 4 is close to gzip's speed at a better ratio
+
+
+def _accepted_encodings(scope) -> set:
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            return {part.split(";")[0].strip() for part in value.decode("latin-1").lower().split(",")}
+    return set()
+
+
+def choose_encoding(scope):
+    accepted = _accepted_encodings(scope)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._impl = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) # 31 -> gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._impl.process(data)
+        return self._impl.compress(data)
+
+    def finish(self) -> bytes:
+        return self._impl.finish() if self.encoding == "br" else self._impl.flush()
+
+
+class CompressionMiddleware:
+    """
+    gzip (or brotli, when the package is installed and the client accepts it) for responses
+    of at least COMPRESSION_MIN_BYTES. Plain ASGI, so streamed responses (/export) are
+    compressed chunk by chunk instead of being buffered whole like Starlette's GZipMiddleware.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if state["passthrough"]:
+                return await send(message)
+
+            if message["type"] == "http.response.start":
+                # Hold the headers back until the first body chunk tells us the size
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["compressor"] is None:
+                start = state["start"]
+                headers = list(start["headers"])
+                already_encoded = any(name == b"content-encoding" for name, _ in headers)
+                if already_encoded or (not more_body and len(body) < self.minimum_size):
+                    state["passthrough"] = True
+                    await send(start)
+                    return await send(message)
+
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                if not any(name == b"vary" and b"accept-encoding" in value.lower() for name, value in headers):
+                    headers.append((b"vary", b"Accept-Encoding"))
+                state["compressor"] = _Compressor(encoding)
+
+                if not more_body:
+                    # Whole body in one message: we know the final length
+                    compressed = state["compressor"].compress(body) + state["compressor"].finish()
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": compressed})
+
+                await send({**start, "headers": headers})
+
+            compressor = state["compressor"]
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
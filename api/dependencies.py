@@ -1,6 +1,10 @@
 import os
-from fastapi import Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.database import ASYNC_DB_ENABLED, SessionLocal, get_db, get_async_sessionmaker
 
 load_dotenv()
 
@@ -15,4 +19,93 @@ async def verify_api_key(x_api_key: str = Header(...)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key"
         )
-    return x_api_key
\ No newline at end of file
+    return x_api_key
+
+
+# -----------------------------
+# Read-only DB access for routes
+# -----------------------------
+# Read routes are `async def` and talk to the database through one of these readers,
+# so the same route code runs on the sync engine (default, run in the threadpool) or on
+# the asyncpg engine (API_ASYNC_DB=true), where no thread is held while Postgres works.
+class SyncReader:
+    def __init__(self, session: Session):
+        self.session = session
+        self.dialect_name = session.get_bind().dialect.name
+
+    async def all(self, stmt):
+        return await run_in_threadpool(lambda: self.session.execute(stmt).all())
+
+    async def scalars(self, stmt):
+        return await run_in_threadpool(lambda: self.session.execute(stmt).scalars().all())
+
+    async def scalar(self, stmt):
+        return await run_in_threadpool(lambda: self.session.execute(stmt).scalar())
+
+    async def get(self, model, pk):
+        return await run_in_threadpool(self.session.get, model, pk)
+
+
+class AsyncReader:
+    def __init__(self, session):
+        self.session = session
+        self.dialect_name = session.get_bind().dialect.name
+
+    async def all(self, stmt):
+        return (await self.session.execute(stmt)).all()
+
+    async def scalars(self, stmt):
+        return (await self.session.execute(stmt)).scalars().all()
+
+    async def scalar(self, stmt):
+        return (await self.session.execute(stmt)).scalar()
+
+    async def get(self, model, pk):
+        return await self.session.get(model, pk)
+
+
+if ASYNC_DB_ENABLED:
+    async def get_read_db():
+        async with get_async_sessionmaker()() as session:
+            yield AsyncReader(session)
+else:
+    def get_read_db(db: Session = Depends(get_db)):
+        return SyncReader(db)
+
+
+# -----------------------------
+# Streaming reads
+# -----------------------------
+# Streaming responses keep reading after the route returns, when dependencies with yield
+# have already closed the request's session. They open their own session from this factory.
+def get_session_factory():
+    return get_async_sessionmaker() if ASYNC_DB_ENABLED else SessionLocal
+
+
+async def stream_partitions(session_factory, stmt, batch_size: int):
+    """
+    Yields the rows of `stmt` in lists of at most `batch_size`, using a server-side cursor
+    (yield_per), so memory stays flat however many rows the query returns.
+    """
+    stmt = stmt.execution_options(yield_per=batch_size)
+    session = session_factory()
+
+    if isinstance(session, AsyncSession):
+        try:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                yield partition
+        finally:
+            await session.close()
+        return
+
+    try:
+        result = await run_in_threadpool(session.execute, stmt)
+        partitions = result.partitions()
+        while True:
+            partition = await run_in_threadpool(next, partitions, None)
+            if partition is None:
+                break
+            yield partition
+    finally:
+        await run_in_threadpool(session.close)
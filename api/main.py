@@ -1,5 +1,8 @@
 from fastapi import FastAPI
-from api.routes import health, data
+from api.routes import health, data, latest, consensus, indicators, export, metrics, stats
+from api.middleware import MetricsMiddleware
+from api.compression import CompressionMiddleware
+from core.metrics import METRICS_MULTIPROC_DIR, registry
 
 app = FastAPI(
     title="Kasparro ETL API",
@@ -7,10 +10,25 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# With several worker processes, /metrics reports all of them (see core/metrics.py)
+if METRICS_MULTIPROC_DIR:
+    registry.share_across_processes(METRICS_MULTIPROC_DIR)
+
+# Last added runs first: metrics wrap compression, so request latency includes it
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Include the routers
 app.include_router(health.router)
 app.include_router(data.router)
+app.include_router(latest.router)
+app.include_router(consensus.router)
+app.include_router(indicators.router)
+app.include_router(export.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Same as `python -m api` (workers, reload and pool sizing from the environment)
+    from api.__main__ import main
+    main()
\ No newline at end of file
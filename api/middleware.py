@@ -0,0 +1,35 @@
+import time
+from core.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUEST_DB_SECONDS, track_db_time
+
+
+class MetricsMiddleware:
+    """
+    Records latency and database time of every request, labelled by route template
+    (/data, not /data?page=3) so label values stay bounded. Plain ASGI rather than
+    BaseHTTPMiddleware, so streamed responses (/export) are timed until their last chunk.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        with track_db_time() as db_time:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # FastAPI puts the matched route into the scope
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, method=scope["method"], route=route, status=str(status["code"])
+                )
+                HTTP_REQUEST_DB_SECONDS.observe(db_time[0], route=route)
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+
+# How /data reports total_records:
+#   exact       -> COUNT(*) over the filtered query (cost grows with the table)
+#   approximate -> planner estimate on Postgres (constant time), exact elsewhere
+#   none        -> skip counting entirely
+COUNT_MODES = ("exact", "approximate", "none")
+
+
+def encode_cursor(event_timestamp: datetime, row_id: str) -> str:
+    """Opaque cursor pointing at the last row of a page: (event_timestamp, id)."""
+    raw = json.dumps([event_timestamp.isoformat() if event_timestamp else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        ts, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def apply_keyset(stmt, timestamp_col, id_col, cursor: str):
+    """
+    Orders newest first and, if a cursor is given, continues strictly after it.
+    With an index on (..., event_timestamp, id) this is an index range scan, so page 10,000
+    costs the same as page 1 (unlike OFFSET, which reads and throws away every earlier row).
+    """
+    stmt = stmt.order_by(timestamp_col.desc(), id_col.desc())
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(timestamp_col, id_col) < tuple_(ts, row_id))
+    return stmt
+
+
+async def count_rows(db, stmt, mode: str, table_name: str, filtered: bool):
+    """
+    Counts the rows `stmt` would return, according to the requested COUNT_MODES entry.
+    `db` is a reader from api.dependencies.get_read_db.
+    """
+    if mode == "none":
+        return None
+
+    if mode == "approximate" and db.dialect_name == "postgresql":
+        if not filtered:
+            # Table-level estimate maintained by autovacuum/ANALYZE
+            estimate = await db.scalar(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table").bindparams(table=table_name)
+            )
+            return max(int(estimate or 0), 0)
+
+        # Filtered: ask the planner how many rows it expects, without running the query
+        compiled = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        # Escape colons so literals like '10:00:00' aren't read as bind parameters by text()
+        plan = await db.scalar(text("EXPLAIN (FORMAT JSON) " + compiled.replace(":", "\\:")))
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    return await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from core.models import PriceConsensus
+from schemas.api_response import ConsensusResponse
+from api.dependencies import verify_api_key, get_read_db
+from api.cache import cached_response
+
+router = APIRouter()
+
+@router.get("/consensus", response_model=ConsensusResponse)
+async def get_consensus(
+    request: Request,
+    asset: List[str] = Query(None, description="Canonical asset id (ticker), repeat for several (e.g., asset=BTC&asset=ETH)"),
+    start: datetime = Query(None, description="Only buckets starting at or after this timestamp"),
+    end: datetime = Query(None, description="Only buckets starting before this timestamp"),
+    min_sources: int = Query(1, ge=1, description="Only buckets priced by at least this many sources"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Consensus price and cross-source spread per asset and time bucket, newest first.
+    Precomputed by the ETL into price_consensus, so nothing is joined across sources here.
+    """
+    async def build():
+        query = select(PriceConsensus)
+        if asset:
+            query = query.where(PriceConsensus.asset_id.in_([a.upper() for a in asset]))
+        if start:
+            query = query.where(PriceConsensus.bucket >= start)
+        if end:
+            query = query.where(PriceConsensus.bucket < end)
+        if min_sources > 1:
+            query = query.where(PriceConsensus.n_sources >= min_sources)
+
+        rows = await db.scalars(query.order_by(PriceConsensus.bucket.desc(), PriceConsensus.asset_id).limit(limit))
+        return {"data": [
+            {
+                "asset_id": row.asset_id,
+                "bucket": row.bucket,
+                "consensus_price": row.consensus_price,
+                "min_price": row.min_price,
+                "max_price": row.max_price,
+                "spread": row.spread,
+                "spread_bps": row.spread_bps,
+                "n_sources": row.n_sources,
+                "sources": row.sources.split(",") if row.sources else [],
+            }
+            for row in rows
+        ]}
+
+    return await cached_response(request, db, ConsensusResponse, build)
@@ -1,48 +1,123 @@
-import time
-import uuid
+from datetime import datetime
+from typing import List
 from fastapi import APIRouter, Depends, Query, Request
-from sqlalchemy.orm import Session
-from core.database import get_db
+from sqlalchemy import select
 from core.models import UnifiedData
-from schemas.api_response import APIResponse
-from api.dependencies import verify_api_key
+from core.sql import BUCKET_FORMATS, ohlc_rollup, time_bucket
+from schemas.api_response import APIResponse, AggregateResponse
+from api.dependencies import verify_api_key, get_read_db
+from api.pagination import COUNT_MODES, apply_keyset, count_rows, encode_cursor
+from api.cache import cached_response
 
 router = APIRouter()
 
+# Exactly the fields of schemas.api_response.DataItem
+DATA_COLUMNS = (
+    UnifiedData.id,
+    UnifiedData.entity_name,
+    UnifiedData.value,
+    UnifiedData.event_timestamp,
+    UnifiedData.source,
+)
+
+def apply_filters(query, source: str = None, entity: List[str] = None, start: datetime = None, end: datetime = None):
+    """Filters shared by /data and /data/aggregate. Each one is backed by a (column, event_timestamp) index."""
+    if source:
+        query = query.where(UnifiedData.source == source)
+    if entity:
+        query = query.where(UnifiedData.entity_name.in_(entity))
+    if start:
+        query = query.where(UnifiedData.event_timestamp >= start)
+    if end:
+        query = query.where(UnifiedData.event_timestamp < end)
+    return query
+
 @router.get("/data", response_model=APIResponse)
-def get_data(
+async def get_data(
     request: Request,
     source: str = Query(None, description="Filter by data source (e.g., api, csv)"),
-    page: int = Query(1, ge=1),
+    entity: List[str] = Query(None, description="Filter by entity name, repeat for several (e.g., entity=BTC&entity=ETH)"),
+    start: datetime = Query(None, description="Only events at or after this timestamp"),
+    end: datetime = Query(None, description="Only events before this timestamp"),
+    page: int = Query(1, ge=1, description="Offset pagination (ignored when cursor is given)"),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    cursor: str = Query(None, description="Opaque cursor from pagination.next_cursor for constant-time deep pages"),
+    count: str = Query("exact", pattern=f"^({'|'.join(COUNT_MODES)})$", description="How to compute total_records: exact, approximate or none"),
+    db = Depends(get_read_db),
     api_key: str = Depends(verify_api_key) # Secure the endpoint
 ):
-    start_time = time.time()
-    request_id = str(uuid.uuid4())
+    async def build():
+        # Build the query: plain columns, no ORM entities to build per row
+        query = select(*DATA_COLUMNS)
+        
+        # Apply Filtering
+        query = apply_filters(query, source, entity, start, end)
+        filtered = any([source, entity, start, end])
 
-    # Build the query
-    query = db.query(UnifiedData)
-    
-    # Apply Filtering
-    if source:
-        query = query.filter(UnifiedData.source == source)
-
-    # Apply Pagination
-    offset = (page - 1) * limit
-    total_count = query.count()
-    data = query.offset(offset).limit(limit).all()
-
-    # Calculate Latency
-    latency = (time.time() - start_time) * 1000
-
-    return {
-        "request_id": request_id,
-        "api_latency_ms": round(latency, 2),
-        "data": data,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total_records": total_count
+        total_count = await count_rows(db, query, count, UnifiedData.__tablename__, filtered=filtered)
+
+        # Apply Pagination: newest first, keyset when a cursor is given, offset otherwise
+        query = apply_keyset(query, UnifiedData.event_timestamp, UnifiedData.id, cursor)
+        if not cursor:
+            query = query.offset((page - 1) * limit)
+
+        # Fetch one extra row to know whether there is a next page
+        rows = await db.all(query.limit(limit + 1))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].event_timestamp, rows[-1].id)
+
+        return {
+            "data": [dict(row._mapping) for row in rows],
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total_records": total_count,
+                "next_cursor": next_cursor
+            }
         }
-    }
\ No newline at end of file
+
+    # Served from the response cache until the next ETL commit (see api/cache.py).
+    # The columns already have DataItem's types, so the body goes straight to orjson.
+    return await cached_response(request, db, APIResponse, build, validate=False)
+
+@router.get("/data/aggregate", response_model=AggregateResponse)
+async def get_aggregates(
+    request: Request,
+    bucket: str = Query("hour", pattern=f"^({'|'.join(BUCKET_FORMATS)})$", description="Bucket width: minute, hour or day"),
+    source: str = Query(None, description="Filter by data source"),
+    entity: List[str] = Query(None, description="Filter by entity name, repeat for several"),
+    start: datetime = Query(None, description="Only events at or after this timestamp"),
+    end: datetime = Query(None, description="Only events before this timestamp"),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of buckets returned"),
+    db = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    OHLC / avg / min / max per entity, source and time bucket, computed in SQL.
+    A year of daily candles is one response of ~365 rows instead of thousands of /data pages.
+    """
+    async def build():
+        # 1. Filter and tag every row with its bucket
+        bucket_col = time_bucket(UnifiedData.event_timestamp, bucket, db.dialect_name).label("bucket")
+        rows = apply_filters(
+            select(
+                UnifiedData.entity_name,
+                UnifiedData.source,
+                UnifiedData.value,
+                UnifiedData.event_timestamp,
+                UnifiedData.id,
+                bucket_col
+            ),
+            source, entity, start, end
+        ).subquery()
+
+        # 2. Collapse each bucket into one candle
+        query = ohlc_rollup(rows).limit(limit)
+        return {
+            "bucket": bucket,
+            "data": [dict(row._mapping) for row in await db.all(query)]
+        }
+
+    return await cached_response(request, db, AggregateResponse, build)
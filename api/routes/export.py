@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from core.models import UnifiedData
+from api.dependencies import verify_api_key, get_session_factory, stream_partitions
+from api.routes.data import apply_filters
+
+router = APIRouter()
+
+# Rows fetched from the server-side cursor per round trip (and per Arrow record batch)
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_COLUMNS = ["id", "entity_name", "value", "event_timestamp", "source", "original_id"]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+async def _ndjson(partitions):
+    async for rows in partitions:
+        # Rows are plain tuples; serialize them directly instead of building a DataItem per row
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, (r[0], r[1], r[2], _isoformat(r[3]), r[4], r[5])))) + "\n"
+            for r in rows
+        ).encode()
+
+
+async def _csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in partitions:
+        writer.writerows((r[0], r[1], r[2], _isoformat(r[3]), r[4], r[5]) for r in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Drain:
+    """Write-only file object that hands whatever pyarrow writes back to the response stream."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def _arrow(partitions, fmt: str):
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("entity_name", pa.string()),
+        ("value", pa.float64()),
+        ("event_timestamp", pa.timestamp("us", tz="UTC")),
+        ("source", pa.string()),
+        ("original_id", pa.string()),
+    ])
+    sink = _Drain()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    async for rows in partitions:
+        columns = list(zip(*rows))
+        batch = pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+        # One Parquet row group / Arrow record batch per cursor partition
+        writer.write_batch(batch)
+        yield sink.take()
+
+    writer.close()
+    yield sink.take()
+
+
+@router.get("/export")
+async def export_data(
+    format: str = Query("ndjson", pattern=f"^({'|'.join(EXPORT_FORMATS)})$", description="ndjson, csv, arrow (IPC stream) or parquet"),
+    source: str = Query(None, description="Filter by data source"),
+    entity: List[str] = Query(None, description="Filter by entity name, repeat for several"),
+    start: datetime = Query(None, description="Only events at or after this timestamp"),
+    end: datetime = Query(None, description="Only events before this timestamp"),
+    session_factory = Depends(get_session_factory),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Streams every matching unified_data row in one response, read through a server-side
+    cursor. Takes the same filters as /data; memory use does not depend on the result size.
+    """
+    if format in ("arrow", "parquet"):
+        try:
+            import pyarrow # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{format} export requires pyarrow to be installed")
+
+    query = apply_filters(
+        select(*[getattr(UnifiedData, column) for column in EXPORT_COLUMNS]),
+        source, entity, start, end
+    ).order_by(UnifiedData.event_timestamp, UnifiedData.id)
+    partitions = stream_partitions(session_factory, query, EXPORT_BATCH_SIZE)
+
+    if format == "ndjson":
+        body = _ndjson(partitions)
+    elif format == "csv":
+        body = _csv(partitions)
+    else:
+        body = _arrow(partitions, format)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="unified_data.{extension}"'}
+    )
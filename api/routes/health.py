@@ -1,29 +1,36 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from core.database import get_db
-from core.models import ETLCheckpoint
+from sqlalchemy import select, text
+from core.models import SourceStats
 from schemas.api_response import HealthResponse
+from api.dependencies import get_read_db
 
 router = APIRouter()
 
 @router.get("/health", response_model=HealthResponse)
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db = Depends(get_read_db)):
     # 1. Check DB Connectivity
     db_status = False
     try:
-        db.execute(text("SELECT 1"))
+        await db.scalar(text("SELECT 1"))
         db_status = True
     except Exception:
         db_status = False
 
     # 2. Check ETL Status (P0.2 requirement)
-    # We fetch the most recent checkpoint
-    last_run = db.query(ETLCheckpoint).order_by(ETLCheckpoint.updated_at.desc()).first()
-    etl_status = last_run.last_run_status if last_run else "never_run"
+    # The most recent run's outcome, picked the same way as /stats' last_run_status
+    # (checkpoints only track watermarks now, not how runs ended)
+    etl_status = "never_run"
+    if db_status:
+        last_run = await db.scalar(
+            select(SourceStats.last_run_status)
+            .where(SourceStats.last_run_at.isnot(None))
+            .order_by(SourceStats.last_run_at.desc(), SourceStats.source)
+            .limit(1)
+        )
+        etl_status = last_run or "never_run"
 
     return {
         "status": "healthy" if db_status else "unhealthy",
         "db_connectivity": db_status,
         "etl_last_run_status": etl_status
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from core.models import EntityIndicator
+from schemas.api_response import IndicatorResponse
+from api.dependencies import verify_api_key, get_read_db
+from api.cache import cached_response
+
+router = APIRouter()
+
+INDICATOR_COLUMNS = (
+    EntityIndicator.entity_name,
+    EntityIndicator.source,
+    EntityIndicator.event_timestamp,
+    EntityIndicator.value,
+    EntityIndicator.log_return,
+    EntityIndicator.sma_short,
+    EntityIndicator.sma_long,
+    EntityIndicator.ema_short,
+    EntityIndicator.ema_long,
+    EntityIndicator.volatility,
+)
+
+@router.get("/indicators", response_model=IndicatorResponse)
+async def get_indicators(
+    request: Request,
+    entity: List[str] = Query(None, description="Entity name, repeat for several (e.g., entity=Bitcoin&entity=Ethereum)"),
+    source: str = Query(None, description="Only this source"),
+    start: datetime = Query(None, description="Only points at or after this timestamp"),
+    end: datetime = Query(None, description="Only points before this timestamp"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Log return, moving averages and volatility per series and point, newest first.
+    Precomputed by the ETL into entity_indicators as rows are loaded.
+    """
+    async def build():
+        query = select(*INDICATOR_COLUMNS)
+        if entity:
+            query = query.where(EntityIndicator.entity_name.in_(entity))
+        if source:
+            query = query.where(EntityIndicator.source == source)
+        if start:
+            query = query.where(EntityIndicator.event_timestamp >= start)
+        if end:
+            query = query.where(EntityIndicator.event_timestamp < end)
+
+        rows = await db.all(query.order_by(
+            EntityIndicator.event_timestamp.desc(), EntityIndicator.entity_name, EntityIndicator.source
+        ).limit(limit))
+        return {"data": [dict(row._mapping) for row in rows]}
+
+    return await cached_response(request, db, IndicatorResponse, build)
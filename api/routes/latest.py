@@ -0,0 +1,34 @@
+from typing import List
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from core.models import LatestPrice
+from schemas.api_response import LatestResponse
+from api.dependencies import verify_api_key, get_read_db
+from api.cache import cached_response
+
+router = APIRouter()
+
+@router.get("/latest", response_model=LatestResponse)
+async def get_latest(
+    request: Request,
+    source: str = Query(None, description="Filter by data source"),
+    entity: List[str] = Query(None, description="Filter by entity name, repeat for several"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Current price of each entity from each source, served from the latest_prices table
+    that the ETL keeps up to date. Cost depends on the number of entities, not on history.
+    """
+    async def build():
+        query = select(LatestPrice)
+        if source:
+            query = query.where(LatestPrice.source == source)
+        if entity:
+            query = query.where(LatestPrice.entity_name.in_(entity))
+
+        data = await db.scalars(query.order_by(LatestPrice.entity_name, LatestPrice.source).limit(limit))
+        return {"data": data}
+
+    return await cached_response(request, db, LatestResponse, build)
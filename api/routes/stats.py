@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy import select
+from core.models import SourceStats
+from schemas.api_response import StatsResponse
+from api.dependencies import verify_api_key, get_read_db
+from api.cache import cached_response
+
+router = APIRouter()
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(
+    request: Request,
+    db = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    ETL totals from the source_stats running totals (one row per source) that every run
+    updates, so the cost doesn't grow with unified_data. total_records is the number of
+    rows loaded into unified_data over all runs.
+    """
+    async def build():
+        sources = await db.scalars(select(SourceStats).order_by(SourceStats.source))
+        last = max((s for s in sources if s.last_run_at), key=lambda s: s.last_run_at, default=None)
+        return {
+            "total_records": sum(s.rows_loaded for s in sources),
+            "last_run_status": last.last_run_status if last else None,
+            "last_run_timestamp": last.last_run_at if last else None,
+            "sources": sources,
+        }
+
+    return await cached_response(request, db, StatsResponse, build)
@@ -0,0 +1,97 @@
+"""
+Compares /data response serialization before and after switching to column tuples + orjson.
+
+Usage:
+    python -m benchmarks.bench_api --rows 100 --iterations 2000 --requests 500
+
+Two measurements on an in-memory SQLite database:
+  1. serialization only (ops/sec): ORM entities -> model_validate -> jsonable_encoder -> json
+     (the old path) against column tuples -> orjson (the new one), for one page of `--rows`
+  2. end to end (requests/sec): /data through the TestClient with the response cache off,
+     so every request queries and serializes, with and without gzip
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("API_KEY", "bench_key")
+os.environ["API_CACHE_ENABLED"] = "false"
+
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core.database import Base, get_db
+from core.models import UnifiedData
+from api.cache import dumps
+from api.main import app
+from api.routes.data import DATA_COLUMNS
+from schemas.api_response import APIResponse
+
+
+def seed(db, rows: int):
+    db.add_all([
+        UnifiedData(
+            entity_name=f"Coin {i % 50}",
+            value=100.0 + i,
+            event_timestamp=datetime(2024, 1, 1) + timedelta(minutes=i),
+            source="coingecko",
+            original_id=f"coin-{i}",
+        )
+        for i in range(rows)
+    ])
+    db.commit()
+
+
+def ops_per_sec(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="Rows per page (the /data maximum is 100)")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    seed(db, args.rows)
+    pagination = {"page": 1, "limit": args.rows, "total_records": args.rows, "next_cursor": None}
+
+    def legacy():
+        entities = db.scalars(select(UnifiedData).limit(args.rows)).all()
+        model = APIResponse.model_validate({"request_id": "", "api_latency_ms": 0, "data": entities, "pagination": pagination})
+        return json.dumps(jsonable_encoder(model))
+
+    def fast():
+        rows = db.execute(select(*DATA_COLUMNS).limit(args.rows)).all()
+        return dumps({"data": [dict(row._mapping) for row in rows], "pagination": pagination})
+
+    before = ops_per_sec(legacy, args.iterations)
+    after = ops_per_sec(fast, args.iterations)
+    print(f"serialize {args.rows} rows   before {before:>9.1f} ops/sec   after {after:>9.1f} ops/sec   x{after / before:.2f}")
+
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+    headers = {"x-api-key": os.environ["API_KEY"]}
+    url = f"/data?limit={args.rows}&count=none"
+    for encoding in ("identity", "gzip"):
+        response = client.get(url, headers={**headers, "Accept-Encoding": encoding})
+        size = int(response.headers.get("content-length", len(response.content)))
+        rate = ops_per_sec(lambda: client.get(url, headers={**headers, "Accept-Encoding": encoding}), args.requests)
+        print(f"GET /data  {encoding:<8}  {rate:>9.1f} requests/sec   {size:>7} bytes on the wire")
+
+    app.dependency_overrides.clear()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
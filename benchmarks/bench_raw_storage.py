@@ -0,0 +1,40 @@
+"""
+Compares how many bytes one raw API payload takes as a JSON document vs. compressed NDJSON
+(the RAW_COMPRESSION modes), and how fast each decodes.
+
+Usage:
+    python -m benchmarks.bench_raw_storage --items 10000
+"""
+import argparse
+import json
+import time
+from ingestion.raw_codec import ENCODINGS, encode_payload, iter_payload, zstandard
+from benchmarks.generators import coingecko_payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+
+    items = coingecko_payload(args.items, bad_every=0)
+    json_bytes = len(json.dumps(items).encode())
+    print(f"{'json':6} {json_bytes:>12} bytes")
+
+    for encoding in ENCODINGS[1:]:
+        if encoding == "zstd" and zstandard is None:
+            print("zstd   (skipped: zstandard not installed)")
+            continue
+        start = time.perf_counter()
+        blob, _ = encode_payload(items, encoding)
+        encode_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = sum(1 for _ in iter_payload(blob, encoding))
+        decode_seconds = time.perf_counter() - start
+        assert decoded == len(items)
+        print(f"{encoding:6} {len(blob):>12} bytes  x{json_bytes / len(blob):5.1f} smaller  "
+              f"encode {encode_seconds * 1000:7.1f} ms  decode {decode_seconds * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
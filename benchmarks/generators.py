@@ -0,0 +1,98 @@
+"""
+Synthetic, deterministic source data for the benchmarks: CoinGecko- and CoinPaprika-shaped
+payloads and historical CSVs of any size. No network access needed.
+
+Both API generators describe the same universe of coins (coin i is ticker C{i} in every
+source) with slightly different prices per source, so reconciliation has something to match.
+The same arguments always produce the same data.
+"""
+import csv
+import random
+import uuid
+from datetime import datetime, timedelta
+
+DEFAULT_TICKERS = ("BTC", "ETH", "SOL", "BNB", "XRP", "ADA")
+
+
+def _base_price(i: int) -> float:
+    # Log-uniform-ish spread from fractions of a cent to tens of thousands, stable per coin
+    return round(10 ** random.Random(i).uniform(-4, 4.8), 6)
+
+
+def _price(i: int, batch_no: int, source: str, seed: int) -> float:
+    # Each source and batch drifts a little around the coin's base price
+    rng = random.Random(f"{seed}:{source}:{batch_no}:{i}")
+    return round(_base_price(i) * rng.uniform(0.995, 1.005), 8)
+
+
+def coingecko_payload(n_items: int, batch_no: int = 0, seed: int = 42, bad_every: int = 100):
+    """/coins/markets items. Every `bad_every`th item has a negative price (0 = none), to exercise the reject path."""
+    rng = random.Random(f"{seed}:coingecko:{batch_no}")
+    return [
+        {
+            "id": f"coin-{i}",
+            "symbol": f"c{i}",
+            "name": f"Coin {i}",
+            "image": f"https://assets.example.com/coins/images/{i}/large/coin.png",
+            "current_price": -1.0 if bad_every and i % bad_every == bad_every - 1 else _price(i, batch_no, "coingecko", seed),
+            "market_cap": rng.randint(10 ** 5, 10 ** 12),
+            "market_cap_rank": i + 1,
+            "total_volume": rng.randint(10 ** 3, 10 ** 10),
+            "price_change_percentage_24h": round(rng.uniform(-20, 20), 5),
+            "circulating_supply": rng.uniform(10 ** 3, 10 ** 11),
+            "last_updated": "2024-01-01T00:00:00.000Z",
+        }
+        for i in range(n_items)
+    ]
+
+
+def coinpaprika_payload(n_items: int, batch_no: int = 0, seed: int = 42, bad_every: int = 100):
+    """/v1/tickers items, same coins as coingecko_payload."""
+    rng = random.Random(f"{seed}:coinpaprika:{batch_no}")
+    return [
+        {
+            "id": f"c{i}-coin-{i}",
+            "name": f"Coin {i}",
+            "symbol": f"C{i}",
+            "rank": i + 1,
+            "circulating_supply": rng.randint(10 ** 3, 10 ** 11),
+            "last_updated": "2024-01-01T00:00:00Z",
+            "quotes": {
+                "USD": {
+                    "price": -1.0 if bad_every and i % bad_every == bad_every - 1 else _price(i, batch_no, "coinpaprika", seed),
+                    "volume_24h": rng.uniform(10 ** 3, 10 ** 10),
+                    "market_cap": rng.randint(10 ** 5, 10 ** 12),
+                    "percent_change_24h": round(rng.uniform(-20, 20), 2),
+                }
+            },
+        }
+        for i in range(n_items)
+    ]
+
+
+def csv_rows(n_rows: int, tickers=DEFAULT_TICKERS, start: datetime = datetime(2024, 1, 1), seed: int = 42, bad_every: int = 0):
+    """
+    Yields historical_prices.csv rows (trade_date, ticker, close_price, trade_id): one
+    daily close per ticker, tickers interleaved. Every `bad_every`th row has an
+    unparseable price (0 = none).
+    """
+    rng = random.Random(seed)
+    prices = {ticker: 10 ** rng.uniform(-1, 4.7) for ticker in tickers}
+    for n in range(n_rows):
+        ticker = tickers[n % len(tickers)]
+        prices[ticker] *= rng.uniform(0.95, 1.05) # Daily random walk
+        yield {
+            "trade_date": (start + timedelta(days=n // len(tickers))).isoformat(),
+            "ticker": ticker,
+            "close_price": "n/a" if bad_every and n % bad_every == bad_every - 1 else round(prices[ticker], 6),
+            "trade_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        }
+
+
+def write_csv(path: str, n_rows: int, **kwargs) -> str:
+    """Writes csv_rows(n_rows, **kwargs) to `path` row by row, so any size fits in memory."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["trade_date", "ticker", "close_price", "trade_id"])
+        writer.writeheader()
+        writer.writerows(csv_rows(n_rows, **kwargs))
+    return path
@@ -11,8 +11,45 @@ DATABASE_URL = "postgresql://{user}:{password}@{host}:{port}/{db}".format(
     port=os.getenv("POSTGRES_PORT", "5432"),
     db=os.getenv("POSTGRES_DB", "kasparro_db")
 )
+# Same database through asyncpg, used by the API when API_ASYNC_DB=true
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_engine(DATABASE_URL)
+# Connection pool settings (per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Alternatively a total connection budget for the whole role (all API workers together),
+# split evenly over its DB_POOL_PROCESSES processes. The API launcher (python -m api) sets
+# DB_POOL_PROCESSES to its worker count, so adding workers never adds connections.
+DB_POOL_BUDGET = int(os.getenv("DB_POOL_BUDGET", "0"))
+DB_POOL_PROCESSES = int(os.getenv("DB_POOL_PROCESSES", "1"))
+# Server-side cap on any single statement; 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+ASYNC_DB_ENABLED = os.getenv("API_ASYNC_DB", "false").lower() == "true"
+
+def pool_limits(budget: int = DB_POOL_BUDGET, processes: int = DB_POOL_PROCESSES):
+    """(pool_size, max_overflow) for one process: its share of the budget, or the fixed per-process settings."""
+    if not budget:
+        return DB_POOL_SIZE, DB_MAX_OVERFLOW
+    # Half kept open, half as burst, never more than the share in total
+    share = max(budget // max(processes, 1), 1)
+    pool_size = max(share // 2, 1)
+    return pool_size, share - pool_size
+
+def _pool_kwargs():
+    pool_size, max_overflow = pool_limits()
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"} if DB_STATEMENT_TIMEOUT_MS else {},
+    **_pool_kwargs()
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -23,4 +60,21 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# The async engine is only built on first use, so processes that never touch it
+# (the ETL worker, tests) don't need asyncpg installed
+_async_sessionmaker = None
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}} if DB_STATEMENT_TIMEOUT_MS else {},
+            **_pool_kwargs()
+        )
+        _async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False)
+    return _async_sessionmaker
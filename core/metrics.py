@@ -0,0 +1,253 @@
+import atexit
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# -----------------------------
+# Metrics Registry
+# -----------------------------
+# Small in-process counters and histograms rendered in the Prometheus text format.
+# The API serves them on /metrics; the scheduler serves its own (the ETL runs there) on
+# SCHEDULER_METRICS_PORT. Each process only reports what happened inside it.
+#
+# The API can run several worker processes, and a scrape lands on any one of them. With
+# METRICS_MULTIPROC_DIR set (`python -m api` sets it when it starts more than one worker)
+# every API worker writes its samples to a file there every METRICS_FLUSH_SECONDS and
+# /metrics sums the files of all workers. Files of workers that exited stay, so counters
+# don't go backwards; `python -m api` empties the directory when it starts.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Seconds; covers everything from a fast index lookup to a slow paginated fetch
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._values = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(tuple(sorted(labels.items())))
+        return state[-1] if state else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, bucket_count in zip(self.buckets, state):
+                    samples.append((f"{self.name}_bucket", key + (("le", repr(float(bound))),), bucket_count))
+                samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), state[-1]))
+                samples.append((f"{self.name}_sum", key, state[-2]))
+                samples.append((f"{self.name}_count", key, state[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        # Set by share_across_processes: then render() reports every worker's samples
+        self.multiprocess = None
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def samples(self) -> dict:
+        """metric name -> [(sample name, labels, value), ...] of this process."""
+        return {metric.name: metric.samples() for metric in self._metrics.values()}
+
+    def share_across_processes(self, directory: str, interval: float = METRICS_FLUSH_SECONDS):
+        """Starts writing this process' samples to `directory` and reporting the sum of all of them."""
+        self.multiprocess = MultiprocessCollector(self, directory, interval)
+        self.multiprocess.start()
+        return self.multiprocess
+
+    def render(self) -> str:
+        samples = self.multiprocess.collect() if self.multiprocess else self.samples()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in samples.get(metric.name, []):
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MultiprocessCollector:
+    """
+    Shares one process' samples with the other workers through a file per process in
+    `directory`. Every scrape reads all the files, its own worker's included (flushed first),
+    so each worker's share of a total only ever moves forward whichever worker is asked.
+    """
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = METRICS_FLUSH_SECONDS, pid: int = None):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"metrics-{pid or os.getpid()}.json")
+        self._lock = threading.Lock()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush()
+        threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        data = {
+            name: [[sample, [list(label) for label in labels], value] for sample, labels, value in samples]
+            for name, samples in self.registry.samples().items()
+        }
+        # Write to a temp file and rename so a scrape never reads a half-written file
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def collect(self) -> dict:
+        """Samples of every worker, summed; same shape as MetricsRegistry.samples()."""
+        self.flush()
+        totals = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "metrics-*.json"))):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, samples in data.items():
+                metric = totals.setdefault(name, {})
+                for sample, labels, value in samples:
+                    key = (sample, tuple(tuple(label) for label in labels))
+                    metric[key] = metric.get(key, 0) + value
+        return {
+            name: [(sample, labels, value) for (sample, labels), value in metric.items()]
+            for name, metric in totals.items()
+        }
+
+
+registry = MetricsRegistry()
+
+# --- ETL ---
+ETL_STAGE_SECONDS = registry.histogram("etl_stage_duration_seconds", "Time spent per pipeline stage and source.")
+ETL_ROWS = registry.counter("etl_rows_total", "Rows handled per pipeline stage, source and outcome.")
+ETL_BYTES = registry.counter("etl_bytes_total", "Payload bytes handled per pipeline stage and source.")
+
+# --- Scheduler ---
+SCHEDULER_JOB_SECONDS = registry.histogram("scheduler_job_duration_seconds", "Duration of scheduled jobs by job and status.")
+SCHEDULER_SKIPPED_TICKS = registry.counter("scheduler_skipped_ticks_total", "Scheduler ticks not run, by job and reason.")
+
+# --- API ---
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "API request latency per route.")
+HTTP_REQUEST_DB_SECONDS = registry.histogram("http_request_db_seconds", "Database time spent inside each API request, per route.")
+
+# --- Database ---
+DB_QUERY_SECONDS = registry.histogram("db_query_duration_seconds", "Duration of every SQL statement executed by this process.")
+
+
+# -----------------------------
+# Database timing
+# -----------------------------
+# Statement timing hooks on every engine (sync, async and test engines alike). Time is also
+# added to the current request's accumulator, if one is active; the accumulator is a mutable
+# list so time spent in threadpool copies of the context still lands in the request's total.
+_db_time = contextvars.ContextVar("db_time", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_SECONDS.observe(elapsed)
+    accumulator = _db_time.get()
+    if accumulator is not None:
+        accumulator[0] += elapsed
+
+
+@contextmanager
+def track_db_time():
+    """Collects the database time of every statement run inside the block. Yields [seconds]."""
+    accumulator = [0.0]
+    token = _db_time.set(accumulator)
+    try:
+        yield accumulator
+    finally:
+        _db_time.reset(token)
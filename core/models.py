@@ -1,19 +1,51 @@
+import os
 import uuid
-from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Boolean
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, Boolean, Index, LargeBinary, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from core.database import Base
 
+# Optional Postgres range partitioning of the two big append-only tables (see core/partitions.py).
+# raw_api_data is partitioned on ingested_at and unified_data on event_timestamp. Postgres
+# requires the partition key in the primary key, so in this mode it joins `id` in the PK.
+PARTITIONING_ENABLED = os.getenv("DB_PARTITIONING", "false").lower() == "true"
+
+def _partition_by(column: str):
+    return {"postgresql_partition_by": f"RANGE ({column})"} if PARTITIONING_ENABLED else {}
+
+def _partition_key_column(**kwargs):
+    if PARTITIONING_ENABLED:
+        # Part of the PK, so the ORM needs the value before the INSERT: default it client-side
+        return Column(DateTime(timezone=True), primary_key=True, default=lambda: datetime.now(timezone.utc), **kwargs)
+    return Column(DateTime(timezone=True), **kwargs)
+
 # -----------------------------
 # Raw API Data
 # -----------------------------
 class RawAPIData(Base):
     __tablename__ = "raw_api_data"
+    __table_args__ = (
+        # Partial index holding only unprocessed rows: the transform's watermark query
+        # reads it instead of the whole raw table, so it stays small as history grows
+        Index(
+            "ix_raw_api_data_unprocessed", "source_name", "ingested_at", "id",
+            postgresql_where=text("NOT processed"), sqlite_where=text("NOT processed")
+        ),
+        # Newest batch per source, to compare content hashes against (see RAW_COMPRESSION)
+        Index("ix_raw_api_data_source_ingested", "source_name", "ingested_at"),
+        _partition_by("ingested_at"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     source_name = Column(String, index=True)
-    payload = Column(JSON)
-    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Either the payload as a JSON document...
+    payload = Column(JSON().with_variant(JSONB, "postgresql"))
+    # ...or, with RAW_COMPRESSION set, compressed NDJSON bytes (see ingestion/raw_codec.py)
+    payload_blob = Column(LargeBinary, nullable=True)
+    payload_encoding = Column(String(8), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    ingested_at = _partition_key_column(server_default=func.now())
     processed = Column(Boolean, default=False)
 
 
@@ -22,12 +54,35 @@ class RawAPIData(Base):
 # -----------------------------
 class RawCSVData(Base):
     __tablename__ = "raw_csv_data"
+    __table_args__ = (
+        Index(
+            "ix_raw_csv_data_unprocessed", "ingested_at", "id",
+            postgresql_where=text("NOT processed"), sqlite_where=text("NOT processed")
+        ),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     filename = Column(String)
     row_data = Column(JSON)
     ingested_at = Column(DateTime(timezone=True), server_default=func.now())
     processed = Column(Boolean, default=False)
+    # Why the transform skipped the row (it is marked processed all the same); NULL once loaded
+    reject_reason = Column(String, nullable=True)
+
+
+# -----------------------------
+# Ingested Files
+# -----------------------------
+# Content hashes of files that were loaded completely. fetch_csv_data checks this before
+# parsing anything, so re-running on an unchanged file costs one hash of the file.
+class IngestedFile(Base):
+    __tablename__ = "ingested_files"
+
+    content_hash = Column(String(64), primary_key=True)
+    filename = Column(String)
+    row_count = Column(Integer)
+    status = Column(String)
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 # -----------------------------
@@ -35,16 +90,136 @@ class RawCSVData(Base):
 # -----------------------------
 class UnifiedData(Base):
     __tablename__ = "unified_data"
+    __table_args__ = (
+        # Serve /data filters + keyset pagination (ORDER BY event_timestamp DESC, id DESC)
+        # straight from the index instead of scanning and sorting the table
+        Index("ix_unified_data_ts_id", "event_timestamp", "id"),
+        Index("ix_unified_data_source_ts_id", "source", "event_timestamp", "id"),
+        Index("ix_unified_data_entity_ts_id", "entity_name", "event_timestamp", "id"),
+        # Natural key: loads upsert on it, so reruns never duplicate rows
+        UniqueConstraint("source", "original_id", "event_timestamp", name="uq_unified_data_natural_key"),
+        _partition_by("event_timestamp"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    entity_name = Column(String, index=True)
+    entity_name = Column(String) # Indexed through ix_unified_data_entity_ts_id
     value = Column(Float)
-    event_timestamp = Column(DateTime(timezone=True))
+    event_timestamp = _partition_key_column()
     source = Column(String)
     original_id = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+# -----------------------------
+# Unified Rollups
+# -----------------------------
+# Daily OHLC candles that replace unified_data rows older than the retention window
+# (see core/partitions.downsample_unified).
+class UnifiedRollup(Base):
+    __tablename__ = "unified_rollups"
+
+    entity_name = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    avg = Column(Float)
+    count = Column(Integer)
+    # When the open and close prices were taken, so late rows merge into the right end
+    open_at = Column(DateTime(timezone=True), nullable=True)
+    close_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# -----------------------------
+# Latest Price per Entity
+# -----------------------------
+# One row per (entity_name, source), upserted by the pipeline in the same transaction as
+# the unified insert. "Current price of X" reads this small table instead of scanning history.
+class LatestPrice(Base):
+    __tablename__ = "latest_prices"
+
+    entity_name = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    value = Column(Float)
+    event_timestamp = Column(DateTime(timezone=True))
+    original_id = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# -----------------------------
+# Entity Identity Index
+# -----------------------------
+# Every source names the same asset differently (CoinPaprika "btc-bitcoin", CoinGecko
+# "bitcoin", the CSV "BTC"). The transform records here which canonical asset id each
+# (source, entity_name) belongs to, so cross-source queries join on an indexed id instead
+# of matching strings (see ingestion/reconcile.py).
+class EntityIdentity(Base):
+    __tablename__ = "entity_identities"
+
+    source = Column(String, primary_key=True)
+    entity_name = Column(String, primary_key=True)
+    asset_id = Column(String, nullable=False, index=True)
+    original_id = Column(String) # The source's own id for the asset (API sources only)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# -----------------------------
+# Cross-Source Price Consensus
+# -----------------------------
+# One row per canonical asset and time bucket: the median of each source's last price in
+# the bucket, and how far the sources disagree. Recomputed by the transform for every
+# bucket a load touches, in the same transaction as the load.
+class PriceConsensus(Base):
+    __tablename__ = "price_consensus"
+
+    asset_id = Column(String, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    consensus_price = Column(Float)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    spread = Column(Float) # max - min
+    spread_bps = Column(Float) # spread relative to the consensus price, in basis points
+    n_sources = Column(Integer)
+    sources = Column(String) # Comma-separated, sorted
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# -----------------------------
+# Technical Indicators
+# -----------------------------
+# Derived metrics per price point of each (entity_name, source) series, computed by the
+# transform (see ingestion/indicators.py). NULL until a window has enough points.
+# The primary key doubles as the index for "one series over a time range".
+class EntityIndicator(Base):
+    __tablename__ = "entity_indicators"
+
+    entity_name = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    event_timestamp = Column(DateTime(timezone=True), primary_key=True)
+    value = Column(Float)
+    log_return = Column(Float)
+    sma_short = Column(Float)
+    sma_long = Column(Float)
+    ema_short = Column(Float)
+    ema_long = Column(Float)
+    volatility = Column(Float) # Rolling sample std of log_return
+
+
+# Where each series' indicators stopped, so new points are computed without re-reading history
+class IndicatorState(Base):
+    __tablename__ = "indicator_state"
+
+    entity_name = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    last_timestamp = Column(DateTime(timezone=True))
+    ema_short = Column(Float)
+    ema_long = Column(Float)
+    tail = Column(JSON) # Last values of the series, oldest first
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 # -----------------------------
 # ETL Checkpoints
 # -----------------------------
@@ -57,3 +232,54 @@ class ETLCheckpoint(Base):
     last_processed_id = Column(String, nullable=True)
     last_run_status = Column(String)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# -----------------------------
+# ETL Generation
+# -----------------------------
+# Single-row counter bumped by the pipeline in every transaction that changes unified data.
+# The API keys its response cache on it, so cached reads are dropped as soon as new data lands.
+class ETLGeneration(Base):
+    __tablename__ = "etl_generation"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# -----------------------------
+# ETL Run History
+# -----------------------------
+# One row per source per pipeline run (scheduler job or run_etl.py), written when the run ends.
+class ETLRun(Base):
+    __tablename__ = "etl_runs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    run_id = Column(String(36), index=True) # Shared by the rows of one run
+    job = Column(String)
+    source = Column(String, index=True)
+    status = Column(String)
+    rows_read = Column(Integer, default=0)
+    rows_loaded = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    duration_seconds = Column(Float)
+    started_at = Column(DateTime(timezone=True), index=True)
+    finished_at = Column(DateTime(timezone=True))
+
+
+# -----------------------------
+# Per-Source Running Totals
+# -----------------------------
+# Upserted in the same transaction as each run's etl_runs rows, so /stats reads one small
+# row per source instead of counting unified_data.
+class SourceStats(Base):
+    __tablename__ = "source_stats"
+
+    source = Column(String, primary_key=True)
+    total_runs = Column(Integer, nullable=False, default=0)
+    rows_read = Column(Integer, nullable=False, default=0)
+    rows_loaded = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    last_run_status = Column(String)
+    last_run_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
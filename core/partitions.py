@@ -0,0 +1,194 @@
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, delete, func, select, text
+from core.models import PARTITIONING_ENABLED, UnifiedData, UnifiedRollup
+from core.sql import dialect_insert, ohlc_rollup, time_bucket
+
+# Partitioned tables, their partition key and how much time each partition covers.
+# Raw payloads arrive every minute, so raw_api_data gets daily partitions; unified history
+# spans years (the CSV backfill), so monthly partitions keep the partition count sane.
+PARTITIONED_TABLES = {
+    "raw_api_data": ("ingested_at", "day"),
+    "unified_data": ("event_timestamp", "month"),
+}
+
+# How many future partitions to keep created ahead of time
+PARTITIONS_AHEAD = int(os.getenv("DB_PARTITIONS_AHEAD", "7"))
+# 0 disables the corresponding maintenance step
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "0"))
+UNIFIED_DOWNSAMPLE_AFTER_DAYS = int(os.getenv("UNIFIED_DOWNSAMPLE_AFTER_DAYS", "0"))
+
+PARTITION_NAME = re.compile(r"_p(\d{8})$")
+
+
+def _period_start(moment: datetime, interval: str) -> datetime:
+    day = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    return day.replace(day=1) if interval == "month" else day
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def _is_partitioned(db) -> bool:
+    return PARTITIONING_ENABLED and db.get_bind().dialect.name == "postgresql"
+
+
+def partition_ddl(now: datetime = None):
+    """
+    CREATE statements for the partitions covering the current period and the next
+    PARTITIONS_AHEAD ones, plus a DEFAULT partition that catches anything outside them
+    (e.g. old history from a CSV backfill). All of them are IF NOT EXISTS.
+    """
+    now = now or datetime.now(timezone.utc)
+    for table, (_, interval) in PARTITIONED_TABLES.items():
+        yield f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+        start = _period_start(now, interval)
+        for _ in range(PARTITIONS_AHEAD + 1):
+            end = _next_period(start, interval)
+            yield (
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            start = end
+
+
+def ensure_partitions(db, now: datetime = None):
+    """Creates upcoming partitions. Idempotent; the scheduler runs it with the other maintenance jobs."""
+    if not _is_partitioned(db):
+        return
+    for statement in partition_ddl(now):
+        db.execute(text(statement))
+    db.commit()
+
+
+def list_partitions(db, table: str):
+    """(name, start, end) for every range partition of `table`, oldest first."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table}).scalars().all()
+
+    _, interval = PARTITIONED_TABLES[table]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.search(name)
+        if match:
+            start = datetime.strptime(match.group(1), "%Y%m%d").replace(tzinfo=timezone.utc)
+            partitions.append((name, start, _next_period(start, interval)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _drop_partitions_before(db, table: str, cutoff: datetime, skip_if=None):
+    dropped = []
+    for name, _, end in list_partitions(db, table):
+        if end > cutoff:
+            continue
+        if skip_if and db.execute(text(f"SELECT 1 FROM {name} WHERE {skip_if} LIMIT 1")).first():
+            print(f"⚠️ Keeping {name}: it still has rows matching {skip_if}")
+            continue
+        db.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+def drop_expired_raw_partitions(db, retention_days: int = RAW_RETENTION_DAYS, now: datetime = None):
+    """
+    Drops raw_api_data partitions that ended more than `retention_days` ago. Dropping a
+    partition is instant and leaves no bloat, unlike DELETE. Partitions that still hold
+    unprocessed batches are kept.
+    """
+    if not retention_days or not _is_partitioned(db):
+        return []
+
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    dropped = _drop_partitions_before(db, "raw_api_data", cutoff, skip_if="NOT processed")
+    db.commit()
+    if dropped:
+        print(f"🧹 Dropped raw partitions: {', '.join(dropped)}")
+    return dropped
+
+
+def downsample_unified(db, after_days: int = UNIFIED_DOWNSAMPLE_AFTER_DAYS, now: datetime = None):
+    """
+    Replaces unified_data rows older than `after_days` with daily OHLC candles in
+    unified_rollups, in one transaction. Whole expired partitions are dropped; rows
+    elsewhere (default partition, unpartitioned table) are deleted.
+    Returns the number of daily buckets written.
+    """
+    if not after_days:
+        return 0
+
+    now = now or datetime.now(timezone.utc)
+    # Align to midnight so no day is ever split between raw rows and its rollup
+    cutoff = _period_start(now - timedelta(days=after_days), "day")
+    dialect_name = db.get_bind().dialect.name
+    # SQLite stores naive timestamps, so compare against a naive cutoff there
+    bound = cutoff if dialect_name == "postgresql" else cutoff.replace(tzinfo=None)
+
+    rows = select(
+        UnifiedData.entity_name,
+        UnifiedData.source,
+        UnifiedData.value,
+        UnifiedData.event_timestamp,
+        UnifiedData.id,
+        time_bucket(UnifiedData.event_timestamp, "day", dialect_name).label("bucket"),
+    ).where(UnifiedData.event_timestamp < bound).subquery()
+
+    columns = ["entity_name", "source", "bucket", "open", "high", "low", "close", "avg", "count", "open_at", "close_at"]
+    stmt = dialect_insert(db, UnifiedRollup).from_select(columns, ohlc_rollup(rows, with_times=True).order_by(None))
+    # A day can only be rolled up twice if older data arrives late; merge it into the candle.
+    # The late rows may fall anywhere in the day, so open/close come from whichever side is
+    # earlier/later. Candles written before open_at/close_at existed keep their open and close.
+    excluded = stmt.excluded
+    stored_open_at = func.coalesce(UnifiedRollup.open_at, excluded.open_at)
+    stored_close_at = func.coalesce(UnifiedRollup.close_at, excluded.close_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity_name", "source", "bucket"],
+        set_={
+            "open": case((excluded.open_at < stored_open_at, excluded.open), else_=UnifiedRollup.open),
+            "high": _greatest(db, UnifiedRollup.high, excluded.high),
+            "low": _least(db, UnifiedRollup.low, excluded.low),
+            "close": case((excluded.close_at > stored_close_at, excluded.close), else_=UnifiedRollup.close),
+            "avg": (UnifiedRollup.avg * UnifiedRollup.count + excluded.avg * excluded.count)
+                   / (UnifiedRollup.count + excluded.count),
+            "count": UnifiedRollup.count + excluded.count,
+            "open_at": _least(db, stored_open_at, excluded.open_at),
+            "close_at": _greatest(db, stored_close_at, excluded.close_at),
+        },
+    )
+    buckets = db.execute(stmt).rowcount
+
+    if _is_partitioned(db):
+        dropped = _drop_partitions_before(db, "unified_data", cutoff)
+        if dropped:
+            print(f"🧹 Dropped unified partitions: {', '.join(dropped)}")
+    db.execute(delete(UnifiedData).where(UnifiedData.event_timestamp < bound))
+    db.commit()
+    print(f"✅ Downsampled unified_data before {cutoff:%Y-%m-%d} into {buckets} daily rollups.")
+    return buckets
+
+
+def _greatest(db, a, b):
+    # SQLite spells GREATEST/LEAST as multi-argument MAX/MIN
+    return func.greatest(a, b) if db.get_bind().dialect.name == "postgresql" else func.max(a, b)
+
+
+def _least(db, a, b):
+    return func.least(a, b) if db.get_bind().dialect.name == "postgresql" else func.min(a, b)
+
+
+def run_maintenance(db):
+    """All storage housekeeping, in dependency order."""
+    ensure_partitions(db)
+    drop_expired_raw_partitions(db)
+    downsample_unified(db)
@@ -0,0 +1,68 @@
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Bucket widths supported by time_bucket(), mapped to SQLite strftime formats.
+# Postgres uses date_trunc with the same names.
+BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def time_bucket(column, bucket: str, dialect_name: str):
+    """
+    SQL expression truncating a timestamp column to the start of its minute/hour/day,
+    so rollups can GROUP BY it inside the database.
+    """
+    if dialect_name == "postgresql":
+        return func.date_trunc(bucket, column)
+    return func.strftime(BUCKET_FORMATS[bucket], column)
+
+
+def dialect_insert(db, model):
+    """
+    INSERT construct for the session's dialect, which adds on_conflict_do_update /
+    on_conflict_do_nothing. Postgres and SQLite (the test database) share the same API.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def ohlc_rollup(rows, with_times: bool = False):
+    """
+    Collapses `rows` (a subquery with entity_name, source, value, event_timestamp, id and
+    bucket columns) into one OHLC/avg/count row per (entity_name, source, bucket).
+    Open and close come from window functions, so everything runs inside the database.
+    `with_times` adds open_at/close_at, the timestamps the open and close were taken at.
+    """
+    # Rank rows inside each bucket from both ends to find the open and close values
+    partition = (rows.c.entity_name, rows.c.source, rows.c.bucket)
+    ranked = select(
+        rows,
+        func.row_number().over(partition_by=partition, order_by=(rows.c.event_timestamp.asc(), rows.c.id.asc())).label("rn_first"),
+        func.row_number().over(partition_by=partition, order_by=(rows.c.event_timestamp.desc(), rows.c.id.desc())).label("rn_last"),
+    ).subquery()
+
+    # Collapse each bucket into one candle
+    times = (
+        func.min(ranked.c.event_timestamp).label("open_at"),
+        func.max(ranked.c.event_timestamp).label("close_at"),
+    ) if with_times else ()
+    return (
+        select(
+            ranked.c.entity_name,
+            ranked.c.source,
+            ranked.c.bucket,
+            func.max(case((ranked.c.rn_first == 1, ranked.c.value))).label("open"),
+            func.max(ranked.c.value).label("high"),
+            func.min(ranked.c.value).label("low"),
+            func.max(case((ranked.c.rn_last == 1, ranked.c.value))).label("close"),
+            func.avg(ranked.c.value).label("avg"),
+            func.count().label("count"),
+            *times,
+        )
+        .group_by(ranked.c.entity_name, ranked.c.source, ranked.c.bucket)
+        .order_by(ranked.c.entity_name, ranked.c.source, ranked.c.bucket)
+    )
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import random
+import httpx
+from core.metrics import ETL_BYTES
+
+# Defaults for the shared HTTP client, all overridable from .env
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", "10"))
+FETCH_MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "3"))
+FETCH_BACKOFF_SECONDS = float(os.getenv("FETCH_BACKOFF_SECONDS", "0.5"))
+FETCH_MAX_BACKOFF_SECONDS = float(os.getenv("FETCH_MAX_BACKOFF_SECONDS", "30"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "20"))
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def build_client() -> httpx.AsyncClient:
+    """
+    One pooled client shared by every source in a run, so connections (and TLS handshakes)
+    are reused instead of opening a new socket per request.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=FETCH_MAX_CONNECTIONS, max_keepalive_connections=FETCH_MAX_CONNECTIONS),
+        timeout=FETCH_TIMEOUT_SECONDS,
+        headers={"User-Agent": "kasparro-etl"},
+    )
+
+
+def _retry_after_seconds(response: httpx.Response):
+    """Reads the Retry-After header (seconds form) that rate-limited APIs send with a 429."""
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _backoff_seconds(attempt: int, backoff: float) -> float:
+    # Exponential backoff with a little jitter so retries from several sources don't line up
+    delay = backoff * (2 ** attempt)
+    return min(delay + random.uniform(0, backoff), FETCH_MAX_BACKOFF_SECONDS)
+
+
+async def fetch_json(
+    client: httpx.AsyncClient,
+    url: str,
+    params: dict = None,
+    headers: dict = None,
+    timeout: float = FETCH_TIMEOUT_SECONDS,
+    max_retries: int = FETCH_MAX_RETRIES,
+    backoff: float = FETCH_BACKOFF_SECONDS,
+    source: str = None,
+):
+    """
+    GETs a URL and returns the decoded JSON body.
+    Timeouts, connection errors, 429s and 5xx responses are retried with exponential backoff;
+    a 429 with a Retry-After header waits as long as the server asked for.
+    Response bytes are counted in the etl_bytes_total metric under `source` (default: the host).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.get(url, params=params, headers=headers, timeout=timeout)
+        except httpx.TransportError:
+            if attempt == max_retries:
+                raise
+            delay = _backoff_seconds(attempt, backoff)
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                response.raise_for_status()
+                ETL_BYTES.inc(len(response.content), stage="fetch", source=source or response.url.host)
+                return response.json()
+
+            delay = _retry_after_seconds(response)
+            if delay is None:
+                delay = _backoff_seconds(attempt, backoff)
+            delay = min(delay, FETCH_MAX_BACKOFF_SECONDS)
+
+        print(f"↻ Retrying {url} in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+        await asyncio.sleep(delay)
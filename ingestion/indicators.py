@@ -0,0 +1,306 @@
+import os
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_
+from core.models import EntityIndicator, IndicatorState, UnifiedData
+from core.sql import dialect_insert
+
+# -----------------------------
+# Technical indicators
+# -----------------------------
+# Per (entity_name, source) series: log return, short/long SMA and EMA, and rolling
+# volatility (sample std of the log returns), written to entity_indicators next to each price.
+# Windows count observations, not time: days for the historical CSV, ticks for API sources.
+#
+# Updates are incremental. indicator_state keeps, per series, the last timestamp, both EMAs
+# and the last few values, which is all the next point needs; a load only computes its own
+# new points. A series is rebuilt from unified_data when it has no state yet or when rows
+# arrive that are older than its last point (a backfill).
+#
+# Off by default: every loaded point costs one more entity_indicators row and every series
+# one indicator_state upsert, in the load's transaction. For a full-universe API tick that
+# is more than the unified insert itself, so turn it on for the sources analysts need.
+INDICATORS_ENABLED = os.getenv("ETL_INDICATORS_ENABLED", "false").lower() == "true"
+# Comma-separated sources to compute indicators for; empty means every source
+INDICATOR_SOURCES = {s.strip() for s in os.getenv("ETL_INDICATOR_SOURCES", "").split(",") if s.strip()}
+SHORT_WINDOW = int(os.getenv("INDICATOR_SHORT_WINDOW", "7"))
+LONG_WINDOW = int(os.getenv("INDICATOR_LONG_WINDOW", "30"))
+VOLATILITY_WINDOW = int(os.getenv("INDICATOR_VOLATILITY_WINDOW", "30"))
+
+# EMAs are evaluated in closed form over blocks of this many points (see ema)
+_EMA_BLOCK = 256
+
+
+def tail_size() -> int:
+    """Values kept in indicator_state: enough history for the longest SMA and the volatility window."""
+    return max(LONG_WINDOW, VOLATILITY_WINDOW + 1)
+
+
+def log_returns(values: np.ndarray) -> np.ndarray:
+    """log(v[i] / v[i-1]); NaN for the first point and around non-positive prices."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.log(np.where(values > 0, values, np.nan))
+    return np.concatenate(([np.nan], np.diff(logs)))
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average over the last `window` points; NaN until the window is full."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).mean(axis=-1)
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Sample standard deviation over the last `window` points; NaN until the window is full."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window and window > 1:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).std(axis=-1, ddof=1)
+    return out
+
+
+def ema(values: np.ndarray, window: int, seed: float = None) -> np.ndarray:
+    """
+    Exponential moving average with alpha = 2 / (window + 1), continuing from `seed`
+    (the EMA before the first value) or starting at the first value, like
+    pandas' ewm(span=window, adjust=False).
+
+    The recursion ema[k] = a * x[k] + (1 - a) * ema[k-1] unrolls to a decay term on the seed
+    plus a convolution of the values with the decay weights; blocks keep the weights from
+    underflowing on long series.
+    """
+    alpha = 2 / (window + 1)
+    out = np.empty(len(values))
+    previous = seed
+    for start in range(0, len(values), _EMA_BLOCK):
+        block = values[start:start + _EMA_BLOCK]
+        if previous is None:
+            previous = block[0]
+        decay = (1 - alpha) ** np.arange(1, len(block) + 1)
+        weights = alpha * (1 - alpha) ** np.arange(len(block))
+        out[start:start + len(block)] = decay * previous + np.convolve(block, weights)[:len(block)]
+        previous = out[start + len(block) - 1]
+    return out
+
+
+def compute_series(values: np.ndarray, tail: np.ndarray = None, ema_short: float = None, ema_long: float = None) -> dict:
+    """
+    Indicators for `values`, the new points of one series in time order. `tail` holds the
+    series' previous values (oldest first) and ema_short/ema_long its EMAs at the last of
+    them; leave all three out to compute a series from its start.
+    Returns arrays aligned with `values`.
+    """
+    tail = np.asarray(tail if tail is not None else [], dtype=float)
+    full = np.concatenate((tail, values))
+    new = slice(len(tail), None)
+    returns = log_returns(full)
+    return {
+        "log_return": returns[new],
+        "sma_short": sma(full, SHORT_WINDOW)[new],
+        "sma_long": sma(full, LONG_WINDOW)[new],
+        "ema_short": ema(values, SHORT_WINDOW, ema_short),
+        "ema_long": ema(values, LONG_WINDOW, ema_long),
+        "volatility": rolling_std(returns, VOLATILITY_WINDOW)[new],
+    }
+
+
+def compute_next(tails: list, values: np.ndarray, ema_short: np.ndarray, ema_long: np.ndarray) -> dict:
+    """
+    compute_series for many series at once that each gain exactly one point, the usual case
+    for API ticks: one matrix operation per indicator instead of a call per series.
+    `tails` are the series' previous values; shorter ones are padded with NaN, which makes
+    any window reaching into the padding NaN, same as a window that isn't full yet.
+    """
+    width = tail_size()
+    history = np.full((len(values), width), np.nan)
+    for i, tail in enumerate(tails):
+        tail = tail[-width:]
+        if len(tail):
+            history[i, width - len(tail):] = tail
+    full = np.hstack((history, values[:, None]))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.log(np.where(full > 0, full, np.nan))
+    returns = np.diff(logs, axis=1)
+    alpha_short, alpha_long = 2 / (SHORT_WINDOW + 1), 2 / (LONG_WINDOW + 1)
+    return {
+        "log_return": returns[:, -1],
+        "sma_short": full[:, -SHORT_WINDOW:].mean(axis=1),
+        "sma_long": full[:, -LONG_WINDOW:].mean(axis=1),
+        "ema_short": alpha_short * values + (1 - alpha_short) * ema_short,
+        "ema_long": alpha_long * values + (1 - alpha_long) * ema_long,
+        "volatility": returns[:, -VOLATILITY_WINDOW:].std(axis=1, ddof=1) if VOLATILITY_WINDOW > 1 else np.full(len(values), np.nan),
+    }
+
+
+def _nullable(value):
+    # NaN (window not full yet) is stored as NULL
+    return None if np.isnan(value) else float(value)
+
+
+def update_indicators(db, records, chunk_size: int = 1000) -> int:
+    """
+    Brings entity_indicators up to date with freshly loaded unified `records` (dicts with
+    entity_name, source, value and event_timestamp). Caller commits. Returns rows written.
+    """
+    series = {}
+    for record in records:
+        if INDICATOR_SOURCES and record["source"] not in INDICATOR_SOURCES:
+            continue
+        # Keyed by timestamp: a repeated timestamp keeps the last value, like the unified upsert
+        series.setdefault((record["entity_name"], record["source"]), {})[record["event_timestamp"]] = record["value"]
+    if not series:
+        return 0
+
+    written = 0
+    keys = sorted(series) # Every worker locks state rows in this order (see _lock_states)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        states = {(state.entity_name, state.source): state for state in _lock_states(db, chunk)}
+
+        rebuild, appended = [], {}
+        for key in chunk:
+            state = states.get(key)
+            points = series[key]
+            first = min(points)
+            if state.last_timestamp is None or first < _comparable(state.last_timestamp, first):
+                rebuild.append(key)
+                continue
+            # Points at the last timestamp are already in (a reprocessed batch)
+            last = _comparable(state.last_timestamp, first)
+            new = sorted(ts for ts in points if ts > last)
+            if new:
+                appended[key] = (state, new, np.array([points[ts] for ts in new], dtype=float))
+
+        rows, state_rows = [], []
+        # One new point per series (every API tick): all of them in one go
+        single = [key for key, (_, timestamps, _) in appended.items() if len(timestamps) == 1]
+        if single:
+            states_of = [appended[key][0] for key in single]
+            values = np.array([appended[key][2][0] for key in single])
+            result = compute_next(
+                [state.tail or [] for state in states_of], values,
+                np.array([state.ema_short for state in states_of], dtype=float),
+                np.array([state.ema_long for state in states_of], dtype=float),
+            )
+            for i, key in enumerate(single):
+                state, timestamps, point = appended[key]
+                row_result = {name: column[i:i + 1] for name, column in result.items()}
+                rows += _indicator_rows(key, timestamps, point, row_result)
+                state_rows.append(_state_row(key, timestamps[-1], np.concatenate((state.tail or [], point)), row_result))
+
+        # Several new points (catching up after a gap): per series
+        for key, (state, timestamps, values) in appended.items():
+            if len(timestamps) == 1:
+                continue
+            result = compute_series(values, state.tail, state.ema_short, state.ema_long)
+            rows += _indicator_rows(key, timestamps, values, result)
+            state_rows.append(_state_row(key, timestamps[-1], np.concatenate((state.tail or [], values)), result))
+
+        for key, timestamps, values in _load_series(db, rebuild):
+            result = compute_series(values)
+            rows += _indicator_rows(key, timestamps, values, result)
+            state_rows.append(_state_row(key, timestamps[-1], values, result))
+
+        if rebuild:
+            db.execute(delete(EntityIndicator).where(tuple_(EntityIndicator.entity_name, EntityIndicator.source).in_(rebuild)))
+        _upsert(db, EntityIndicator, ["entity_name", "source", "event_timestamp"], rows, chunk_size)
+        _upsert(db, IndicatorState, ["entity_name", "source"], state_rows, chunk_size)
+        written += len(rows)
+    return written
+
+
+def _lock_states(db, keys):
+    """
+    Locks the indicator_state rows of `keys` (sorted) until the caller commits and returns
+    them; keys without state get an empty row (no last_timestamp), which means "rebuild".
+
+    A no-op upsert rather than SELECT ... FOR UPDATE, which can't lock rows that don't exist
+    yet. Transform workers can load batches of the same series at the same time: the second
+    one waits here until the first commits and then gets its state back (an upsert always
+    acts on the latest committed row), so it continues from there instead of both appending
+    to the same tail and the last commit dropping the other's point.
+    """
+    stmt = dialect_insert(db, IndicatorState)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity_name", "source"],
+        set_={"entity_name": stmt.excluded.entity_name},
+    ).returning(
+        IndicatorState.entity_name, IndicatorState.source, IndicatorState.last_timestamp,
+        IndicatorState.ema_short, IndicatorState.ema_long, IndicatorState.tail,
+    )
+    return db.execute(stmt, [{"entity_name": entity_name, "source": source} for entity_name, source in keys]).all()
+
+
+def _comparable(stored, like):
+    # SQLite hands timestamps back naive; line the stored one up with the loaded records
+    if stored.tzinfo is None and like.tzinfo is not None:
+        return stored.replace(tzinfo=like.tzinfo)
+    if stored.tzinfo is not None and like.tzinfo is None:
+        return stored.replace(tzinfo=None)
+    return stored
+
+
+def _load_series(db, keys):
+    """Yields (key, timestamps, values) with the full history of each series in `keys`."""
+    if not keys:
+        return
+    query = (
+        select(UnifiedData.entity_name, UnifiedData.source, UnifiedData.event_timestamp, UnifiedData.value)
+        .where(tuple_(UnifiedData.entity_name, UnifiedData.source).in_(keys))
+        .order_by(UnifiedData.entity_name, UnifiedData.source, UnifiedData.event_timestamp)
+    )
+    current, timestamps, values = None, [], []
+    for entity_name, source, event_timestamp, value in db.execute(query):
+        if (entity_name, source) != current:
+            if current:
+                yield current, timestamps, np.array(values, dtype=float)
+            current, timestamps, values = (entity_name, source), [], []
+        if timestamps and timestamps[-1] == event_timestamp:
+            values[-1] = value # Same timestamp twice: keep one point
+            continue
+        timestamps.append(event_timestamp)
+        values.append(value)
+    if current:
+        yield current, timestamps, np.array(values, dtype=float)
+
+
+def _indicator_rows(key, timestamps, values, result):
+    entity_name, source = key
+    return [
+        {
+            "entity_name": entity_name,
+            "source": source,
+            "event_timestamp": ts,
+            "value": float(values[i]),
+            **{name: _nullable(column[i]) for name, column in result.items()},
+        }
+        for i, ts in enumerate(timestamps)
+    ]
+
+
+def _state_row(key, last_timestamp, values, result):
+    entity_name, source = key
+    return {
+        "entity_name": entity_name,
+        "source": source,
+        "last_timestamp": last_timestamp,
+        "ema_short": float(result["ema_short"][-1]),
+        "ema_long": float(result["ema_long"][-1]),
+        "tail": [float(v) for v in values[-tail_size():]],
+    }
+
+
+def _upsert(db, model, key_columns, rows, chunk_size):
+    if not rows:
+        return
+    stmt = dialect_insert(db, model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            **{column.name: stmt.excluded[column.name] for column in model.__table__.columns
+               if column.name not in key_columns and column.name != "updated_at"},
+            **({"updated_at": func.now()} if "updated_at" in model.__table__.columns else {}),
+        },
+    )
+    for start in range(0, len(rows), chunk_size):
+        db.execute(stmt, rows[start:start + chunk_size])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Columns every normalized frame must have, in the same order as UnifiedRow
+UNIFIED_COLUMNS = ["entity_name", "value", "event_timestamp", "source", "original_id"]
+
+
+def normalize_csv_frame(df: pd.DataFrame, source: str = "historical_csv"):
+    """
+    Vectorized version of the per-row CSV -> UnifiedRow mapping.
+
+    Takes a frame with the raw CSV columns (ticker, close_price, trade_date, trade_id) and
+    applies the same rules as UnifiedRow over whole columns instead of row by row.
+
+    Returns (clean, rejected):
+      * clean    -> DataFrame with UNIFIED_COLUMNS for the rows that passed
+      * rejected -> Series of reasons, indexed like `df`, for the rows that failed
+    """
+    # Missing columns behave like missing values, the same as dict.get() in the row path
+    column = lambda name: df[name] if name in df.columns else pd.Series(np.nan, index=df.index)
+
+    ticker = column("ticker")
+    trade_id = column("trade_id")
+    value = pd.to_numeric(column("close_price"), errors="coerce")
+    event_timestamp = pd.to_datetime(column("trade_date"), errors="coerce", format="ISO8601")
+    # None/NaN must be caught before the str cast below, which would turn them into "None"/"nan"
+    missing_ticker = ticker.isna()
+    missing_trade_id = trade_id.isna()
+
+    # Checked in order, the first failing rule is the reason reported for that row
+    checks = [
+        (missing_ticker, "missing ticker"),
+        (missing_trade_id, "missing trade_id"),
+        (value.isna(), "invalid close_price"),
+        (value < 0, "value must be positive"), # Same rule as UnifiedRow.value_must_be_positive
+        (event_timestamp.isna(), "invalid trade_date"),
+    ]
+    reasons = np.select([mask.to_numpy() for mask, _ in checks], [reason for _, reason in checks], default="")
+    bad = reasons != ""
+
+    # Only the rows that passed are cast, so a missing value can never load as a string
+    ok = ~bad
+    clean = pd.DataFrame({
+        "entity_name": ticker[ok].astype(str),
+        "value": value[ok].astype(float),
+        "event_timestamp": event_timestamp[ok],
+        "source": source,
+        "original_id": trade_id[ok].astype(str),
+    }, index=df.index[ok])
+
+    rejected = pd.Series(reasons[bad], index=df.index[bad], dtype=object)
+    return clean, rejected
+
+
+def frame_to_records(clean: pd.DataFrame):
+    """
+    Turns a normalized frame into the list of dicts an executemany INSERT expects,
+    with plain Python datetimes instead of pandas Timestamps.
+    """
+    records = clean[UNIFIED_COLUMNS].to_dict(orient="records")
+    for record in records:
+        record["event_timestamp"] = record["event_timestamp"].to_pydatetime()
+    return records
@@ -1,82 +1,218 @@
 import os
-import requests
+import asyncio
+import hashlib
 import json
+import time
+import uuid
 import pandas as pd # <--- Added pandas
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, insert, update, func, or_, select, tuple_
 from sqlalchemy.orm import Session
-from core.models import RawAPIData, RawCSVData, UnifiedData
+from core.models import RawAPIData, RawCSVData, UnifiedData, ETLCheckpoint, LatestPrice, ETLGeneration, IngestedFile, ETLRun, SourceStats
+from core.sql import dialect_insert
+from core.metrics import ETL_STAGE_SECONDS, ETL_ROWS, ETL_BYTES
 from schemas.etl_schema import UnifiedRow
+from ingestion.normalize import normalize_csv_frame, frame_to_records
+from ingestion.http_client import build_client
+from ingestion.raw_codec import RAW_COMPRESSION, resolve_encoding, encode_payload, iter_raw_items
+from ingestion.indicators import INDICATORS_ENABLED, update_indicators
+from ingestion.reconcile import RECONCILE_ENABLED, RECONCILE_BUCKET, bucket_start, canonical_asset_id, reconcile_buckets, resolve_asset_ids, upsert_identities
+from ingestion.sources import SOURCE_REGISTRY
+
+# Bulk mode writes unified rows with multi-row INSERTs instead of one ORM object per row.
+# The chunk size caps how many rows go into a single INSERT statement.
+BULK_MODE = os.getenv("ETL_BULK_MODE", "false").lower() == "true"
+BULK_CHUNK_SIZE = int(os.getenv("ETL_BULK_CHUNK_SIZE", "1000"))
+
+# Streaming CSV mode reads the file this many rows at a time and commits after each chunk.
+# 0 keeps the old behaviour of loading the whole file in one go.
+CSV_CHUNK_SIZE = int(os.getenv("ETL_CSV_CHUNK_SIZE", "0"))
+
+# Raw rows are picked up by per-source watermark (last ingested_at processed) rather than by
+# scanning the whole raw table. The lag re-checks a short window before the watermark, so a
+# batch whose transaction committed late is never skipped; the processed flag stops repeats.
+WATERMARK_LAG_SECONDS = int(os.getenv("ETL_WATERMARK_LAG_SECONDS", "300"))
+
+# Watermark name for CSV rows (API sources use their own source name)
+CSV_SOURCE_NAME = "historical_csv"
+
+# The transform reads unprocessed raw rows a page at a time, so memory is bounded by these
+# sizes and not by how big the backlog is (e.g. after an outage): raw API batches (whole
+# payloads) per page, and raw CSV rows per page (each CSV page is also one transaction).
+TRANSFORM_BATCH_SIZE = int(os.getenv("ETL_TRANSFORM_BATCH_SIZE", "20"))
+TRANSFORM_CSV_BATCH_SIZE = int(os.getenv("ETL_TRANSFORM_CSV_BATCH_SIZE", "10000"))
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a file, read in 1 MB blocks so big dumps don't need to fit in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def after_row(query, model, after_id):
+    """
+    Keyset condition: rows that come after `after_id` in (ingested_at, id) order.
+    Compares against the stored timestamp of that row rather than a bound parameter:
+    exact on every dialect (SQLite keeps timestamps as text).
+    """
+    if not after_id:
+        return query
+    after_ts = select(model.ingested_at).where(model.id == after_id).scalar_subquery()
+    return query.filter(tuple_(model.ingested_at, model.id) > tuple_(after_ts, after_id))
 
 class IngestionPipeline:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, bulk: bool = BULK_MODE, chunk_size: int = BULK_CHUNK_SIZE, sources: dict = None,
+                 raw_compression: str = RAW_COMPRESSION, reconcile: bool = RECONCILE_ENABLED,
+                 batch_size: int = TRANSFORM_BATCH_SIZE, csv_batch_size: int = TRANSFORM_CSV_BATCH_SIZE,
+                 indicators: bool = INDICATORS_ENABLED):
         self.db = db
-        
-    def fetch_coinpaprika(self):
-        # We use the 'tickers' endpoint to get a list of all coins and prices
-        url = "https://api.coinpaprika.com/v1/tickers"
-        api_key = os.getenv("COINPAPRIKA_API_KEY") # Ensure this is in your .env
-        
-        print("Fetching CoinPaprika data...")
+        self.bulk = bulk
+        self.chunk_size = chunk_size
+        # Raw rows read per page by the transform (see TRANSFORM_BATCH_SIZE)
+        self.batch_size = batch_size
+        self.csv_batch_size = csv_batch_size
+        # Keep entity_identities and price_consensus up to date with every load (see ingestion/reconcile.py)
+        self.reconcile = reconcile
+        # Keep entity_indicators up to date with every load (see ingestion/indicators.py)
+        self.indicators = indicators
+        # How API payloads are stored in raw_api_data: "none" (JSON document) or compressed
+        self.raw_compression = resolve_encoding(raw_compression)
+        # name -> SourceAdapter; defaults to every adapter registered in ingestion/sources.py
+        self.sources = sources if sources is not None else SOURCE_REGISTRY
+        # stage -> source -> seconds/rows/rejected/bytes for this pipeline's lifetime (one run);
+        # the same numbers also feed the process-wide metrics behind /metrics
+        self.stats = {}
+
+    # --- INSTRUMENTATION ---
+    def _stage_stats(self, stage: str, source: str) -> dict:
+        return self.stats.setdefault(stage, {}).setdefault(source, {"seconds": 0.0, "rows": 0, "rejected": 0, "bytes": 0})
+
+    @contextmanager
+    def _stage(self, stage: str, source: str):
+        """Times one stage (fetch, raw_write, transform, load, commit) for one source."""
+        start = time.perf_counter()
         try:
-            # CoinPaprika usually expects the ID in the header or query param.
-            # Free tier often works without it, but we add it if present.
-            headers = {}
-            if api_key:
-                headers = {"Authorization": api_key}
-            
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            # Limiting to first 50 to avoid hitting rate limits or massive DB writes during dev
-            data = data[:50] 
-            
-            # Store Raw Data
-            raw_record = RawAPIData(
-                source_name="coinpaprika",
-                payload=data, 
-                processed=False
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            ETL_STAGE_SECONDS.observe(elapsed, stage=stage, source=source)
+            self._stage_stats(stage, source)["seconds"] += elapsed
+
+    def _count(self, stage: str, source: str, rows: int = 0, rejected: int = 0, nbytes: int = 0):
+        stats = self._stage_stats(stage, source)
+        if rows:
+            ETL_ROWS.inc(rows, stage=stage, source=source, outcome="ok")
+            stats["rows"] += rows
+        if rejected:
+            ETL_ROWS.inc(rejected, stage=stage, source=source, outcome="rejected")
+            stats["rejected"] += rejected
+        if nbytes:
+            ETL_BYTES.inc(nbytes, stage=stage, source=source)
+            stats["bytes"] += nbytes
+        
+    # --- API SOURCES (see ingestion/sources.py, fetched concurrently) ---
+    def fetch_api_sources(self, names=None):
+        """
+        Fetches every registered API source (or just `names`) concurrently over one pooled
+        client, then stores each payload as raw data. A tick takes as long as the slowest
+        source, and one failing source (fetch or store) doesn't stop the others from being saved.
+        """
+        sources = {name: adapter for name, adapter in self.sources.items() if names is None or name in names}
+        if not sources:
+            return
+
+        print(f"Fetching {', '.join(sources)} data...")
+        results = asyncio.run(self._fetch_concurrently(sources))
+
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                print(f"❌ Error fetching {name}: {result}")
+                continue
+            try:
+                self._store_raw(name, result)
+            except Exception as e:
+                # Roll back this source's write so the session is usable for the next one
+                self.db.rollback()
+                print(f"❌ Error storing {name}: {e}")
+
+    async def _fetch_concurrently(self, sources: dict):
+        async def timed_fetch(name, adapter, client):
+            # fetch_json counts response bytes into the process-wide counter; the difference
+            # is this fetch's share
+            bytes_before = ETL_BYTES.value(stage="fetch", source=name)
+            with self._stage("fetch", name):
+                items = await adapter.fetch(client)
+            self._count("fetch", name, rows=len(items))
+            self._stage_stats("fetch", name)["bytes"] += ETL_BYTES.value(stage="fetch", source=name) - bytes_before
+            return items
+
+        async with build_client() as client:
+            results = await asyncio.gather(
+                *[timed_fetch(name, adapter, client) for name, adapter in sources.items()],
+                return_exceptions=True,
             )
+        return dict(zip(sources, results))
+
+    def _store_raw(self, source_name: str, data):
+        if self.raw_compression != "none":
+            return self._store_raw_compressed(source_name, data)
+
+        # Store Raw Data
+        raw_record = RawAPIData(
+            source_name=source_name,
+            payload=data,
+            processed=False
+        )
+        with self._stage("raw_write", source_name):
             self.db.add(raw_record)
             self.db.commit()
-            print(f"✅ Saved {len(data)} records from CoinPaprika.")
-            
-        except Exception as e:
-            print(f"❌ Error fetching CoinPaprika: {e}")
+        self._count("raw_write", source_name, rows=len(data))
+        print(f"✅ Saved {len(data)} records from {source_name}.")
 
-    # --- SOURCE 2: CoinGecko (Public) ---
-    def fetch_coingecko(self):
-        # We use the 'markets' endpoint to get price + market cap
-        url = "https://api.coingecko.com/api/v3/coins/markets"
-        params = {
-            "vs_currency": "usd",
-            "order": "market_cap_desc",
-            "per_page": 50,
-            "page": 1
-        }
-        
-        print("Fetching CoinGecko data...")
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Store Raw Data
-            raw_record = RawAPIData(
-                source_name="coingecko",
-                payload=data,
+    def _store_raw_compressed(self, source_name: str, data):
+        """
+        Stores the payload as compressed NDJSON plus its content hash. A payload identical to
+        the source's previous one is not stored again: it would only add duplicate prices.
+        """
+        with self._stage("raw_write", source_name):
+            blob, content_hash = encode_payload(data, self.raw_compression)
+            previous_hash = self.db.query(RawAPIData.content_hash).filter(
+                RawAPIData.source_name == source_name
+            ).order_by(RawAPIData.ingested_at.desc()).limit(1).scalar()
+            if previous_hash == content_hash:
+                print(f"⏭️ {source_name} payload unchanged since the last fetch. Skipping.")
+                return
+
+            self.db.add(RawAPIData(
+                source_name=source_name,
+                payload_blob=blob,
+                payload_encoding=self.raw_compression,
+                content_hash=content_hash,
                 processed=False
-            )
-            self.db.add(raw_record)
+            ))
             self.db.commit()
-            print(f"✅ Saved {len(data)} records from CoinGecko.")
-            
-        except Exception as e:
-            print(f"❌ Error fetching CoinGecko: {e}")
+        self._count("raw_write", source_name, rows=len(data), nbytes=len(blob))
+        print(f"✅ Saved {len(data)} records from {source_name} ({len(blob)} bytes, {self.raw_compression}).")
+
+    def fetch_coinpaprika(self):
+        self.fetch_api_sources(["coinpaprika"])
+
+    def fetch_coingecko(self):
+        self.fetch_api_sources(["coingecko"])
 
     # --- SOURCE 3: CSV File (Local File System) ---
-    def fetch_csv_data(self, file_path: str):
+    def fetch_csv_data(self, file_path: str, chunk_size: int = CSV_CHUNK_SIZE):
+        # Skip files we have already loaded completely, before paying for any parsing
+        content_hash = file_sha256(file_path)
+        if self.db.query(IngestedFile).filter(IngestedFile.content_hash == content_hash, IngestedFile.status == "success").first():
+            print(f"⏭️ {file_path} is unchanged since its last load. Skipping.")
+            return
+
+        if chunk_size:
+            return self._stream_csv_data(file_path, chunk_size, content_hash)
+
         print(f"Reading CSV from {file_path}...")
         try:
             # Pandas makes it easy to read CSVs and convert to JSON
@@ -94,129 +230,506 @@ class IngestionPipeline:
                     processed=False
                 ))
             
-            self.db.add_all(new_records)
-            self.db.commit()
+            with self._stage("raw_write", CSV_SOURCE_NAME):
+                self.db.add_all(new_records)
+                self._mark_file_ingested(content_hash, file_path, len(new_records))
+                self.db.commit()
+            self._count("raw_write", CSV_SOURCE_NAME, rows=len(new_records), nbytes=os.path.getsize(file_path))
             print(f"✅ Saved {len(new_records)} CSV rows to Postgres.")
             
         except Exception as e:
             print(f"❌ Error reading CSV: {e}")
 
+    def _mark_file_ingested(self, content_hash: str, file_path: str, row_count: int):
+        self.db.merge(IngestedFile(content_hash=content_hash, filename=file_path, row_count=row_count, status="success"))
+
+    def _stream_csv_data(self, file_path: str, chunk_size: int, content_hash: str):
+        """
+        Reads the CSV in fixed-size chunks, bulk-inserts each chunk and commits it together
+        with the row offset in ETLCheckpoint. If a previous load crashed, we resume after the
+        last committed chunk instead of starting over, and memory stays bounded by chunk_size.
+        The checkpoint is keyed by content hash, so an edited file never resumes a stale offset.
+        """
+        checkpoint = self._get_checkpoint(f"csv:{content_hash}")
+        self.db.add(checkpoint)
+
+        # Only an interrupted load resumes; a finished one is read again from the top
+        offset = 0
+        if checkpoint.last_run_status == "running" and checkpoint.last_processed_id:
+            offset = int(checkpoint.last_processed_id)
+            print(f"Resuming CSV {file_path} from row {offset}...")
+        else:
+            print(f"Streaming CSV from {file_path} in chunks of {chunk_size}...")
+
+        checkpoint.last_run_status = "running"
+        checkpoint.last_processed_id = str(offset)
+        self.db.commit()
+
+        saved = 0
+        try:
+            # skiprows keeps the header (line 0) and skips the rows we already committed
+            reader = pd.read_csv(file_path, chunksize=chunk_size, skiprows=range(1, offset + 1))
+            for chunk in reader:
+                records = [
+                    {"filename": file_path, "row_data": row, "processed": False}
+                    for row in chunk.to_dict(orient="records")
+                ]
+                with self._stage("raw_write", CSV_SOURCE_NAME):
+                    self.db.execute(insert(RawCSVData), records)
+
+                    # Commit the chunk and the new offset in the same transaction
+                    offset += len(records)
+                    saved += len(records)
+                    checkpoint.last_processed_id = str(offset)
+                    checkpoint.last_processed_timestamp = datetime.utcnow()
+                    self.db.commit()
+                self._count("raw_write", CSV_SOURCE_NAME, rows=len(records))
+
+            checkpoint.last_run_status = "success"
+            self._mark_file_ingested(content_hash, file_path, offset)
+            self.db.commit()
+            print(f"✅ Saved {saved} CSV rows to Postgres ({offset} rows total).")
+
+        except Exception as e:
+            self.db.rollback()
+            print(f"❌ Error reading CSV at row {offset}: {e}")
+
     # --- TRANSFORMATION LOGIC ---
-    def process_raw_data(self):
+    def process_raw_data(self, include_csv: bool = True):
         """
         Reads unprocessed raw rows (API + CSV), detects source, and normalizes.
+        Only the pipeline's `sources` are transformed; `include_csv=False` leaves CSV rows
+        alone (the scheduler runs each source as its own job).
+        Returns how many rows were accepted into unified_data and how many were rejected.
         """
         # 1. Process API Data (Existing logic)
-        self._process_api_tables()
+        api_accepted, api_rejected = self._process_api_tables()
         
         # 2. Process CSV Data (New logic)
-        self._process_csv_tables()
+        csv_accepted, csv_rejected = self._process_csv_tables() if include_csv else (0, 0)
+
+        return {
+            "accepted": api_accepted + csv_accepted,
+            "rejected": api_rejected + csv_rejected
+        }
+
+    def _map_api_item(self, source_name: str, item: dict, now: datetime):
+        """
+        Maps a single item from an API payload to a UnifiedRow using the source's adapter.
+        Raises if the item is malformed, returns None for unknown sources.
+        """
+        adapter = self.sources.get(source_name)
+        if adapter is None:
+            return None
+        return adapter.map_item(item, now)
+
+    def _load_unified(self, clean_rows):
+        """
+        Writes validated rows to unified_data and refreshes latest_prices and the
+        cross-source consensus (caller commits). Returns how many rows were new to unified_data.
+        """
+        records = [clean_data.model_dump(exclude={"asset_id"}) for clean_data in clean_rows]
+        inserted = self._insert_unified(records)
+        self._upsert_latest(records)
+        self._reconcile(records, [clean_data.asset_id for clean_data in clean_rows])
+        self._derive_indicators(records)
+        return inserted
+
+    def _derive_indicators(self, records):
+        """Adds the loaded points to each series' technical indicators (caller commits)."""
+        if not self.indicators or not records:
+            return
+        source = records[0]["source"]
+        with self._stage("indicators", source):
+            written = update_indicators(self.db, records, self.chunk_size)
+        self._count("indicators", source, rows=written)
+
+    def _reconcile(self, records, asset_ids):
+        """
+        Records the canonical asset of each loaded (source, entity_name) and recomputes the
+        consensus of every (asset, bucket) the load touched. `asset_ids` lines up with `records`.
+        """
+        if not self.reconcile or not records:
+            return
+        source = records[0]["source"]
+        with self._stage("reconcile", source):
+            # The CSV's ticker is its own id for an asset (its original_ids are per trade)
+            asset_ids = resolve_asset_ids(source, [
+                record["entity_name"] if source == CSV_SOURCE_NAME else record["original_id"] for record in records
+            ], asset_ids)
+            upsert_identities(self.db, [
+                {
+                    "source": record["source"],
+                    "entity_name": record["entity_name"],
+                    "asset_id": asset_id,
+                    # CSV original_ids are per trade, not per asset
+                    "original_id": None if record["source"] == CSV_SOURCE_NAME else record["original_id"],
+                }
+                for record, asset_id in zip(records, asset_ids)
+            ], self.chunk_size)
+            keys = {
+                (asset_id, bucket_start(record["event_timestamp"], RECONCILE_BUCKET))
+                for record, asset_id in zip(records, asset_ids) if asset_id
+            }
+            written = reconcile_buckets(self.db, keys, RECONCILE_BUCKET, self.chunk_size)
+        self._count("reconcile", source, rows=written)
+
+    def _insert_unified(self, records):
+        """
+        INSERT ... ON CONFLICT DO NOTHING on the natural key (source, original_id, event_timestamp),
+        so reprocessing the same data never duplicates rows.
+        ORM mode sends one statement per row; bulk mode sends multi-row INSERTs in chunks.
+        Returns how many rows were actually inserted (rows dropped by the conflict don't count).
+        """
+        # The Core table, not the entity: ORM-enabled INSERTs report no rowcount
+        stmt = dialect_insert(self.db, UnifiedData.__table__).on_conflict_do_nothing(
+            index_elements=["source", "original_id", "event_timestamp"]
+        )
+        if not self.bulk:
+            return sum(self.db.execute(stmt, record).rowcount for record in records)
+
+        inserted = 0
+        for start in range(0, len(records), self.chunk_size):
+            inserted += self.db.execute(stmt, records[start:start + self.chunk_size]).rowcount
+        return inserted
+
+    def _commit_load(self, source: str):
+        """
+        Commits a load together with a bump of the ETL generation counter, which the API's
+        response cache is keyed on. Same transaction, so readers never see new data under
+        an old generation for longer than their generation poll interval.
+        """
+        with self._stage("commit", source):
+            self._bump_generation()
+            self.db.commit()
+
+    def _bump_generation(self):
+        stmt = dialect_insert(self.db, ETLGeneration).values(id=1, generation=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"generation": ETLGeneration.generation + 1, "updated_at": func.now()},
+        )
+        self.db.execute(stmt)
+
+    # --- RUN HISTORY ---
+    def record_run(self, job: str, started_at: datetime, status: str = "success"):
+        """
+        Writes one etl_runs row per source this pipeline touched and adds the same numbers
+        to the per-source running totals in source_stats, in one transaction.
+        Call once when a run ends (also when it failed: anything uncommitted is rolled back first).
+        """
+        self.db.rollback()
+        finished_at = datetime.now(started_at.tzinfo)
+        run_id = str(uuid.uuid4())
+
+        sources = sorted({source for stage in self.stats.values() for source in stage})
+        if not sources:
+            return
+        for source in sources:
+            transform = self.stats.get("transform", {}).get(source, {})
+            run = ETLRun(
+                run_id=run_id,
+                job=job,
+                source=source,
+                status=status,
+                rows_read=transform.get("rows", 0) + transform.get("rejected", 0),
+                rows_loaded=self.stats.get("load", {}).get(source, {}).get("rows", 0),
+                rows_rejected=transform.get("rejected", 0),
+                # Time this source spent across all stages of the run
+                duration_seconds=sum(stage.get(source, {}).get("seconds", 0.0) for stage in self.stats.values()),
+                started_at=started_at,
+                finished_at=finished_at,
+            )
+            self.db.add(run)
+
+            stmt = dialect_insert(self.db, SourceStats).values(
+                source=source, total_runs=1, rows_read=run.rows_read, rows_loaded=run.rows_loaded,
+                rows_rejected=run.rows_rejected, last_run_status=status, last_run_at=finished_at,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["source"],
+                set_={
+                    "total_runs": SourceStats.total_runs + 1,
+                    "rows_read": SourceStats.rows_read + stmt.excluded.rows_read,
+                    "rows_loaded": SourceStats.rows_loaded + stmt.excluded.rows_loaded,
+                    "rows_rejected": SourceStats.rows_rejected + stmt.excluded.rows_rejected,
+                    "last_run_status": stmt.excluded.last_run_status,
+                    "last_run_at": stmt.excluded.last_run_at,
+                    "updated_at": func.now(),
+                },
+            )
+            self.db.execute(stmt)
+
+        # /stats is served from the response cache, so the run history moves the generation too
+        self._bump_generation()
+        self.db.commit()
+
+    def _upsert_latest(self, records):
+        """
+        Upserts the newest value per (entity_name, source) into latest_prices.
+        Runs before the caller's commit, so it lands in the same transaction as the unified rows.
+        """
+        # Keep only the newest record per key: one statement can't touch the same row twice
+        latest = {}
+        for record in records:
+            key = (record["entity_name"], record["source"])
+            if key not in latest or record["event_timestamp"] >= latest[key]["event_timestamp"]:
+                latest[key] = record
+        if not latest:
+            return
+
+        stmt = dialect_insert(self.db, LatestPrice)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["entity_name", "source"],
+            set_={
+                "value": stmt.excluded.value,
+                "event_timestamp": stmt.excluded.event_timestamp,
+                "original_id": stmt.excluded.original_id,
+                "updated_at": func.now(),
+            },
+            # Late-arriving older data (e.g. a historical CSV) must not overwrite a newer price
+            where=or_(LatestPrice.event_timestamp.is_(None), LatestPrice.event_timestamp <= stmt.excluded.event_timestamp),
+        )
+
+        # Sorted, so concurrent transform workers always lock latest_prices rows in the same order (no deadlocks)
+        rows = [
+            {column: latest[key][column] for column in ("entity_name", "source", "value", "event_timestamp", "original_id")}
+            for key in sorted(latest)
+        ]
+        for start in range(0, len(rows), self.chunk_size):
+            self.db.execute(stmt, rows[start:start + self.chunk_size])
+
+    def _get_checkpoint(self, source_name: str):
+        """Existing checkpoint for a source, or a new one that is only saved once it has a watermark."""
+        checkpoint = self.db.query(ETLCheckpoint).filter(ETLCheckpoint.source_name == source_name).first()
+        return checkpoint or ETLCheckpoint(source_name=source_name)
+
+    def _after_watermark(self, query, model, checkpoint):
+        """
+        Restricts a raw-table query to unprocessed rows ingested since the source's watermark
+        (minus the lag). Served by the partial "unprocessed" indexes on the raw tables.
+        """
+        query = query.filter(model.processed == False)
+        if checkpoint.last_processed_timestamp:
+            query = query.filter(model.ingested_at >= checkpoint.last_processed_timestamp - timedelta(seconds=WATERMARK_LAG_SECONDS))
+        return query.order_by(model.ingested_at, model.id)
+
+    def _pages(self, query, model, size: int):
+        """
+        Yields the rows of an (ingested_at, id)-ordered query in pages of at most `size`,
+        each page read only after the previous one was handled. Keyset paging rather than one
+        server-side cursor, because every page is committed and a commit would close the cursor.
+        """
+        after = None
+        while True:
+            page = after_row(query, model, after).limit(size).all()
+            if not page:
+                return
+            # Read now: once the caller commits, ORM rows are expired (and maybe expunged)
+            after = page[-1].id
+            yield page
+
+    def _advance_watermark(self, checkpoint, ingested_at, row_id):
+        # Called before the load's commit, so the watermark moves in the same transaction
+        self.db.add(checkpoint)
+        if ingested_at and (not checkpoint.last_processed_timestamp or ingested_at >= checkpoint.last_processed_timestamp):
+            checkpoint.last_processed_timestamp = ingested_at
+            checkpoint.last_processed_id = row_id
+        checkpoint.last_run_status = "success"
 
     def _process_api_tables(self):
         """
-        Reads unprocessed raw rows, detects the source, and normalizes them.
+        Reads new raw rows of each registered source (by watermark) and normalizes them.
+        Returns (accepted, rejected) row counts.
         """
-        # Get all raw rows that haven't been processed yet
-        raw_rows = self.db.query(RawAPIData).filter(RawAPIData.processed == False).all()
-        
-        if not raw_rows:
+        accepted, rejected, batches = 0, 0, 0
+        for source_name in self.sources:
+            checkpoint = self._get_checkpoint(source_name)
+
+            # Get the raw rows that arrived since this source's watermark, a page at a time
+            query = self._after_watermark(
+                self.db.query(RawAPIData).filter(RawAPIData.source_name == source_name),
+                RawAPIData, checkpoint
+            )
+
+            for page in self._pages(query, RawAPIData, self.batch_size):
+                for row in page:
+                    batch_accepted, batch_rejected = self._transform_api_batch(row)
+                    accepted += batch_accepted
+                    rejected += batch_rejected
+
+                    # Move the watermark in the same transaction as the load
+                    self._advance_watermark(checkpoint, row.ingested_at, row.id)
+                    self._commit_load(source_name)
+                    batches += 1
+
+                    # Committed: let go of the row and its payload instead of holding every
+                    # batch of the backlog in the session until the run ends
+                    self.db.expunge(row)
+
+        if not batches:
             print("No new raw data to process.")
-            return
+            return 0, 0
 
-        for row in raw_rows:
-            payload = row.payload # This is the list of coins
-            now = datetime.utcnow() # Timestamp for when we processed this
+        print(f"✅ Transformation complete. Processed {batches} batches ({accepted} accepted, {rejected} rejected).")
+        return accepted, rejected
 
-            print(f"Processing batch from: {row.source_name}...")
+    def _transform_api_batch(self, row):
+        """
+        Maps one raw API batch into unified_data/latest_prices and marks it processed
+        (caller commits). Returns (accepted, rejected) item counts.
+        """
+        # The list of coins; compressed payloads are decoded item by item as the loop pulls them
+        payload = iter_raw_items(row)
+        # Prices are stamped with when the batch was fetched, so reprocessing a batch
+        # produces the same natural keys (and no duplicates)
+        now = row.ingested_at or datetime.utcnow()
+
+        print(f"Processing batch from: {row.source_name}...")
 
+        with self._stage("transform", row.source_name):
+            clean_rows = []
+            rejected = 0
             for item in payload:
                 try:
-                    clean_data = None
-                    
-                    # --- MAPPING LOGIC FOR COINPAPRIKA ---
-                    if row.source_name == "coinpaprika":
-                        # Structure: {'id': 'btc-bitcoin', 'name': 'Bitcoin', 'quotes': {'USD': {'price': 20000}}}
-                        
-                        # Safely access nested dictionary for price
-                        quotes = item.get("quotes", {})
-                        usd_quote = quotes.get("USD", {})
-                        price = usd_quote.get("price", 0)
-
-                        clean_data = UnifiedRow(
-                            entity_name=item.get("name", "Unknown"),
-                            value=float(price),
-                            event_timestamp=now, 
-                            source="coinpaprika",
-                            original_id=item.get("id")
-                        )
-
-                    # --- MAPPING LOGIC FOR COINGECKO ---
-                    elif row.source_name == "coingecko":
-                        # Structure: {'id': 'bitcoin', 'name': 'Bitcoin', 'current_price': 20000}
-                        
-                        clean_data = UnifiedRow(
-                            entity_name=item.get("name", "Unknown"),
-                            value=float(item.get("current_price", 0)),
-                            event_timestamp=now,
-                            source="coingecko",
-                            original_id=item.get("id")
-                        )
-
-                    # --- LOAD INTO UNIFIED TABLE ---
+                    clean_data = self._map_api_item(row.source_name, item, now)
                     if clean_data:
-                        unified_db_row = UnifiedData(
-                            entity_name=clean_data.entity_name,
-                            value=clean_data.value,
-                            event_timestamp=clean_data.event_timestamp,
-                            source=clean_data.source,
-                            original_id=clean_data.original_id
-                        )
-                        self.db.add(unified_db_row)
+                        clean_rows.append(clean_data)
 
                 except Exception as e:
                     # Log error but don't stop the whole pipeline
+                    rejected += 1
                     print(f"⚠️ Skipping bad row in {row.source_name}: {e}")
 
-            # Mark batch as processed so we don't do it again
+        self._count("transform", row.source_name, rows=len(clean_rows), rejected=rejected)
+
+        # --- LOAD INTO UNIFIED TABLE ---
+        with self._stage("load", row.source_name):
+            loaded = self._load_unified(clean_rows)
             row.processed = True
-            self.db.commit()
-        
-        print(f"✅ Transformation complete. Processed {len(raw_rows)} batches.")
+        self._count("load", row.source_name, rows=loaded)
+        return len(clean_rows), rejected
 
     def _process_csv_tables(self):
-        raw_rows = self.db.query(RawCSVData).filter(RawCSVData.processed == False).all()
-        
-        if not raw_rows:
-            return
+        """
+        Normalizes unprocessed CSV rows. Returns (accepted, rejected) row counts.
+        """
+        if self.bulk:
+            return self._process_csv_tables_vectorized()
 
+        checkpoint = self._get_checkpoint(CSV_SOURCE_NAME)
+        query = self._after_watermark(self.db.query(RawCSVData), RawCSVData, checkpoint)
+
+        accepted, rejected = 0, 0
+        for raw_rows in self._pages(query, RawCSVData, self.csv_batch_size):
+            page_accepted, page_rejected = self._transform_csv_page(raw_rows, checkpoint)
+            accepted += page_accepted
+            rejected += page_rejected
+
+        if accepted or rejected:
+            print(f"✅ CSV Processing complete ({accepted} accepted, {rejected} rejected).")
+        return accepted, rejected
+
+    def _transform_csv_page(self, raw_rows, checkpoint):
+        """Row-by-row transform and load of one page of raw CSV rows, committed with the watermark."""
         print(f"Processing {len(raw_rows)} CSV rows...")
         
-        for row in raw_rows:
-            try:
-                data = row.row_data # This is a dictionary
+        with self._stage("transform", CSV_SOURCE_NAME):
+            clean_rows = []
+            rejected = 0
+            for row in raw_rows:
+                try:
+                    data = row.row_data # This is a dictionary
                 
-                # CSV Structure: ticker, close_price, trade_date, trade_id
-                clean_data = UnifiedRow(
-                    entity_name=data.get("ticker"),
-                    value=float(data.get("close_price")),
-                    event_timestamp=datetime.fromisoformat(data.get("trade_date")),
-                    source="historical_csv",
-                    original_id=data.get("trade_id")
-                )
-                
-                # Load to Unified
-                self.db.add(UnifiedData(
-                    entity_name=clean_data.entity_name,
-                    value=clean_data.value,
-                    event_timestamp=clean_data.event_timestamp,
-                    source=clean_data.source,
-                    original_id=clean_data.original_id
-                ))
+                    # CSV Structure: ticker, close_price, trade_date, trade_id
+                    clean_rows.append(UnifiedRow(
+                        entity_name=data.get("ticker"),
+                        value=float(data.get("close_price")),
+                        event_timestamp=datetime.fromisoformat(data.get("trade_date")),
+                        source=CSV_SOURCE_NAME,
+                        original_id=data.get("trade_id"),
+                        asset_id=canonical_asset_id(data.get("ticker"))
+                    ))
                 
+                except Exception as e:
+                    rejected += 1
+                    row.reject_reason = str(e)
+                    print(f"⚠️ Skipping bad CSV row {row.id}: {e}")
+
+                # Rejected rows are marked too (with their reject_reason): left unprocessed,
+                # every run inside the watermark lag would read and count them again
                 row.processed = True
-                
-            except Exception as e:
-                print(f"⚠️ Skipping bad CSV row {row.id}: {e}")
         
-        self.db.commit()
-        print(f"✅ CSV Processing complete.")
\ No newline at end of file
+        self._count("transform", CSV_SOURCE_NAME, rows=len(clean_rows), rejected=rejected)
+
+        # Load to Unified
+        with self._stage("load", CSV_SOURCE_NAME):
+            loaded = self._load_unified(clean_rows)
+        self._count("load", CSV_SOURCE_NAME, rows=loaded)
+        self._advance_watermark(checkpoint, raw_rows[-1].ingested_at, raw_rows[-1].id)
+        self._commit_load(CSV_SOURCE_NAME)
+        for row in raw_rows:
+            self.db.expunge(row)
+        return len(clean_rows), rejected
+
+    def _process_csv_tables_vectorized(self):
+        """
+        Bulk-mode CSV transform: validates all unprocessed rows as whole columns with
+        pandas/NumPy (see ingestion/normalize.py) instead of one UnifiedRow per row.
+        """
+        checkpoint = self._get_checkpoint(CSV_SOURCE_NAME)
+        query = self._after_watermark(
+            self.db.query(RawCSVData.id, RawCSVData.row_data, RawCSVData.ingested_at),
+            RawCSVData, checkpoint
+        )
+
+        accepted, rejected = 0, 0
+        for raw_rows in self._pages(query, RawCSVData, self.csv_batch_size):
+            print(f"Processing {len(raw_rows)} CSV rows (vectorized)...")
+            page_accepted, page_rejected = self._transform_csv_rows(raw_rows)
+            accepted += page_accepted
+            rejected += page_rejected
+
+            self._advance_watermark(checkpoint, raw_rows[-1].ingested_at, raw_rows[-1].id)
+            self._commit_load(CSV_SOURCE_NAME)
+
+        if accepted or rejected:
+            print(f"✅ CSV Processing complete ({accepted} accepted, {rejected} rejected).")
+        return accepted, rejected
+
+    def _transform_csv_rows(self, raw_rows):
+        """
+        Normalizes (id, row_data) raw CSV rows as whole columns and loads them
+        (caller commits). Returns (accepted, rejected) row counts.
+        """
+        with self._stage("transform", CSV_SOURCE_NAME):
+            ids = [row.id for row in raw_rows]
+            df = pd.DataFrame.from_records([row.row_data for row in raw_rows], index=ids)
+            clean, rejected = normalize_csv_frame(df, source=CSV_SOURCE_NAME)
+
+            for row_id, reason in rejected.items():
+                print(f"⚠️ Skipping bad CSV row {row_id}: {reason}")
+
+            records = frame_to_records(clean)
+        self._count("transform", CSV_SOURCE_NAME, rows=len(records), rejected=len(rejected))
+
+        with self._stage("load", CSV_SOURCE_NAME):
+            loaded = self._insert_unified(records)
+            for start in range(0, len(ids), self.chunk_size):
+                # Rejected rows are marked too, same as the row-by-row path
+                self.db.execute(
+                    update(RawCSVData)
+                    .where(RawCSVData.id.in_(ids[start:start + self.chunk_size]))
+                    .values(processed=True)
+                )
+            if len(rejected):
+                table = RawCSVData.__table__
+                self.db.execute(
+                    update(table).where(table.c.id == bindparam("row_id")).values(reject_reason=bindparam("reason")),
+                    [{"row_id": row_id, "reason": reason} for row_id, reason in rejected.items()]
+                )
+            self._upsert_latest(records)
+        self._count("load", CSV_SOURCE_NAME, rows=loaded)
+        self._reconcile(records, [canonical_asset_id(record["entity_name"]) for record in records])
+        self._derive_indicators(records)
+        return len(records), len(rejected)
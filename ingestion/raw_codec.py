@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+
+# -----------------------------
+# Compressed raw payloads
+# -----------------------------
+# With RAW_COMPRESSION=gzip|zstd, raw_api_data keeps each payload as compressed bytes in
+# payload_blob instead of a JSON document. The bytes are NDJSON (one item per line), so the
+# transform can decompress and parse one item at a time instead of the whole array.
+# zstd needs the optional `zstandard` package; without it we fall back to gzip.
+RAW_COMPRESSION = os.getenv("RAW_COMPRESSION", "none") # none | gzip | zstd
+RAW_COMPRESSION_LEVEL = int(os.getenv("RAW_COMPRESSION_LEVEL", "6"))
+ENCODINGS = ("none", "gzip", "zstd")
+
+try:
+    import zstandard
+except ImportError: # Optional dependency
+    zstandard = None
+
+
+def resolve_encoding(encoding: str) -> str:
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown raw compression {encoding!r}, expected one of {ENCODINGS}")
+    if encoding == "zstd" and zstandard is None:
+        print("⚠️ RAW_COMPRESSION=zstd needs the zstandard package; using gzip instead.")
+        return "gzip"
+    return encoding
+
+
+def encode_payload(items: list, encoding: str, level: int = RAW_COMPRESSION_LEVEL):
+    """
+    Serializes a payload to NDJSON and compresses it. Returns (blob, content_hash); the hash is
+    over the uncompressed NDJSON, so the same data always hashes the same whatever the codec.
+    """
+    ndjson = b"".join(json.dumps(item, sort_keys=True, separators=(",", ":")).encode() + b"\n" for item in items)
+    content_hash = hashlib.sha256(ndjson).hexdigest()
+
+    if encoding == "zstd":
+        blob = zstandard.ZstdCompressor(level=level).compress(ndjson)
+    else:
+        blob = gzip.compress(ndjson, compresslevel=level)
+    return blob, content_hash
+
+
+def iter_payload(blob: bytes, encoding: str):
+    """Yields the items of a compressed payload one at a time, decompressing as it goes."""
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This raw payload is zstd-compressed; install the zstandard package to read it.")
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(io.BytesIO(blob)))
+    else:
+        stream = gzip.GzipFile(fileobj=io.BytesIO(blob))
+
+    with stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_raw_items(row):
+    """Items of a RawAPIData row, whichever way it was stored."""
+    if row.payload_blob is not None:
+        return iter_payload(row.payload_blob, row.payload_encoding)
+    return row.payload or []
@@ -0,0 +1,294 @@
+import os
+import statistics
+from collections import Counter
+from datetime import timedelta, timezone
+from sqlalchemy import delete, func, select, tuple_
+from core.models import EntityIdentity, PriceConsensus, UnifiedData
+from core.sql import BUCKET_FORMATS, dialect_insert
+
+# -----------------------------
+# Cross-source reconciliation
+# -----------------------------
+# During the transform every source's rows are tagged with a canonical asset id (the
+# upper-cased ticker: CoinPaprika and CoinGecko both ship a `symbol`, the CSV has `ticker`).
+# The id is recorded once per (source, entity_name) in entity_identities, and every
+# (asset, bucket) a load touches gets its consensus price recomputed into price_consensus.
+#
+# Sources are fetched on their own intervals, with jitter and multi-page fetches, so they
+# rarely land in the same bucket. A bucket therefore takes each source's latest price as of
+# its end: the last one in the bucket, or else one from at most RECONCILE_TOLERANCE_SECONDS
+# before it starts.
+#
+# Tickers are not globally unique: across the full universe different coins share one. A
+# ticker that more than one of a source's assets carry in a load is ambiguous and those
+# assets get no id (and lose any identity recorded earlier), unless ETL_RECONCILE_ASSET_MAP
+# names their id explicitly by the source's own id, e.g.
+# "coingecko:uniswap=UNI,coinpaprika:uni-uniswap=UNI". Consensus only counts a source's rows
+# with the source id its identity was recorded with.
+RECONCILE_ENABLED = os.getenv("ETL_RECONCILE_ENABLED", "true").lower() == "true"
+RECONCILE_BUCKET = os.getenv("ETL_RECONCILE_BUCKET", "minute") # minute | hour | day
+RECONCILE_TOLERANCE_SECONDS = int(os.getenv("ETL_RECONCILE_TOLERANCE_SECONDS", "300"))
+RECONCILE_ASSET_MAP = os.getenv("ETL_RECONCILE_ASSET_MAP", "")
+
+BUCKET_WIDTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def canonical_asset_id(symbol):
+    """Canonical id for a ticker/symbol ("btc", " BTC" -> "BTC"), None if there is none."""
+    if not isinstance(symbol, str) or not symbol.strip():
+        return None
+    return symbol.strip().upper()
+
+
+def parse_asset_map(spec: str) -> dict:
+    """"coingecko:uniswap=UNI,coinpaprika:uni-uniswap=UNI" -> {("coingecko", "uniswap"): "UNI", ...}"""
+    mapping = {}
+    for entry in (part.strip() for part in spec.split(",")):
+        if not entry:
+            continue
+        key, _, asset_id = entry.partition("=")
+        source, _, source_id = key.partition(":")
+        if not (source.strip() and source_id.strip() and canonical_asset_id(asset_id)):
+            raise ValueError(f"Bad ETL_RECONCILE_ASSET_MAP entry {entry!r}, expected source:id=ASSET")
+        mapping[(source.strip(), source_id.strip())] = canonical_asset_id(asset_id)
+    return mapping
+
+
+ASSET_ID_MAP = parse_asset_map(RECONCILE_ASSET_MAP)
+
+
+def resolve_asset_ids(source: str, source_ids, asset_ids, asset_map: dict = None) -> list:
+    """
+    Final asset ids for one load of one source. `source_ids` are the source's own ids for
+    its assets and line up with `asset_ids`, the ids derived from their tickers. An
+    ASSET_ID_MAP entry wins; otherwise a ticker carried by more than one source id gets None.
+    """
+    asset_map = ASSET_ID_MAP if asset_map is None else asset_map
+    owners = {}
+    for source_id, asset_id in zip(source_ids, asset_ids):
+        if asset_id:
+            owners.setdefault(asset_id, set()).add(source_id)
+    return [
+        asset_map.get((source, source_id)) or (asset_id if asset_id and len(owners[asset_id]) == 1 else None)
+        for source_id, asset_id in zip(source_ids, asset_ids)
+    ]
+
+
+def bucket_start(ts, bucket: str = RECONCILE_BUCKET):
+    """
+    Start of the bucket `ts` falls in, as an aware UTC datetime: price_consensus.bucket is
+    timezone-aware, and a naive value would be read in the session's time zone on Postgres.
+    """
+    if bucket not in BUCKET_FORMATS:
+        raise ValueError(f"Unknown reconcile bucket {bucket!r}, expected one of {tuple(BUCKET_FORMATS)}")
+    ts = _utc(ts)
+    if bucket == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def as_of_buckets(ts, bucket: str = RECONCILE_BUCKET, tolerance: timedelta = None):
+    """
+    Starts of the buckets a price at `ts` counts for: its own, and the following ones that
+    start at most `tolerance` after it (for a source that has no price of its own there).
+    """
+    tolerance = timedelta(seconds=RECONCILE_TOLERANCE_SECONDS) if tolerance is None else tolerance
+    start, last = bucket_start(ts, bucket), _utc(ts) + tolerance
+    starts = []
+    while start <= last:
+        starts.append(start)
+        start += BUCKET_WIDTHS[bucket]
+    return starts
+
+
+def _utc(ts):
+    # Naive timestamps (SQLite, the sources' own UTC times) are UTC already
+    return ts.astimezone(timezone.utc) if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def consensus(prices: dict) -> dict:
+    """
+    Consensus of one bucket from {source: price}. The median, so a single source that is
+    off doesn't drag the consensus the way it would drag a mean.
+    """
+    values = list(prices.values())
+    median = statistics.median(values)
+    spread = max(values) - min(values)
+    return {
+        "consensus_price": median,
+        "min_price": min(values),
+        "max_price": max(values),
+        "spread": spread,
+        "spread_bps": spread / median * 10000 if median else None,
+        "n_sources": len(values),
+        "sources": ",".join(sorted(prices)),
+    }
+
+
+def upsert_identities(db, identities, chunk_size: int = 1000):
+    """
+    Records which asset each (source, entity_name) is. `identities` are dicts with source,
+    entity_name, asset_id and original_id; entries without an asset_id (no ticker, or an
+    ambiguous one) lose any identity recorded for them earlier.
+    """
+    unique, unmapped = {}, set()
+    for identity in identities:
+        key = (identity["source"], identity["entity_name"])
+        if identity["asset_id"]:
+            unique[key] = identity
+        elif identity["entity_name"] is not None:
+            unmapped.add(key)
+    unmapped = sorted(unmapped - set(unique))
+    for start in range(0, len(unmapped), chunk_size):
+        db.execute(delete(EntityIdentity).where(
+            tuple_(EntityIdentity.source, EntityIdentity.entity_name).in_(unmapped[start:start + chunk_size])
+        ))
+    if not unique:
+        return
+
+    stmt = dialect_insert(db, EntityIdentity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["source", "entity_name"],
+        set_={
+            "asset_id": stmt.excluded.asset_id,
+            "original_id": stmt.excluded.original_id,
+            "updated_at": func.now(),
+        },
+        # Skip the write when nothing changed, which is almost always
+        where=(EntityIdentity.asset_id != stmt.excluded.asset_id)
+              | (EntityIdentity.original_id.is_distinct_from(stmt.excluded.original_id)),
+    )
+    # Sorted, so concurrent transform workers lock rows in the same order (no deadlocks)
+    rows = [unique[key] for key in sorted(unique)]
+    for start in range(0, len(rows), chunk_size):
+        db.execute(stmt, rows[start:start + chunk_size])
+
+
+def reconcile_buckets(db, keys, bucket: str = RECONCILE_BUCKET, chunk_size: int = 1000,
+                      tolerance_seconds: int = RECONCILE_TOLERANCE_SECONDS) -> int:
+    """
+    Recomputes price_consensus for every (asset_id, bucket_start) in `keys` from each
+    source's latest unified price as of the bucket (see as_of_buckets), each source
+    counting once. Caller commits. Returns the number of consensus rows written.
+    """
+    if not keys:
+        return 0
+    tolerance = timedelta(seconds=tolerance_seconds)
+    keys = {(asset_id, _utc(bucket_ts)) for asset_id, bucket_ts in keys}
+    keys = sorted(_with_later_buckets(db, keys, tolerance, chunk_size))
+    _lock_buckets(db, keys, chunk_size)
+
+    assets = sorted({asset_id for asset_id, _ in keys})
+    low = min(start for _, start in keys) - tolerance
+    high = max(start for _, start in keys) + BUCKET_WIDTHS[bucket]
+    wanted = set(keys)
+
+    # (asset_id, bucket) -> source -> (event_timestamp, value) of the source's latest price
+    latest = {}
+    for start in range(0, len(assets), chunk_size):
+        # Resolve the identities first and then seek unified_data by entity_name: a join lets
+        # the planner walk every row of a source in the window once per identity instead
+        identities = db.execute(
+            select(EntityIdentity.source, EntityIdentity.entity_name, EntityIdentity.asset_id, EntityIdentity.original_id)
+            .where(EntityIdentity.asset_id.in_(assets[start:start + chunk_size]))
+        ).all()
+        # A source with two entities on one asset (e.g. mapped explicitly by mistake) doesn't get to pick
+        per_source = Counter((asset_id, source) for source, _, asset_id, _ in identities)
+        asset_of = {
+            (source, entity_name): (asset_id, original_id)
+            for source, entity_name, asset_id, original_id in identities
+            if per_source[(asset_id, source)] == 1
+        }
+        names = sorted({entity_name for _, entity_name in asset_of})
+        for name_start in range(0, len(names), chunk_size):
+            query = (
+                select(UnifiedData.entity_name, UnifiedData.source, UnifiedData.original_id,
+                       UnifiedData.event_timestamp, UnifiedData.value)
+                .where(UnifiedData.entity_name.in_(names[name_start:name_start + chunk_size]))
+                .where(UnifiedData.event_timestamp >= low, UnifiedData.event_timestamp < high)
+            )
+            for entity_name, source, original_id, event_timestamp, value in db.execute(query):
+                asset_id, identity_original_id = asset_of.get((source, entity_name), (None, None))
+                # Another of the source's assets that happens to have the same name
+                if asset_id is None or (identity_original_id and original_id != identity_original_id):
+                    continue
+                for bucket_ts in as_of_buckets(event_timestamp, bucket, tolerance):
+                    if (asset_id, bucket_ts) not in wanted:
+                        continue
+                    by_source = latest.setdefault((asset_id, bucket_ts), {})
+                    if source not in by_source or event_timestamp >= by_source[source][0]:
+                        by_source[source] = (event_timestamp, value)
+
+    rows = [
+        {"asset_id": asset_id, "bucket": bucket_ts, **consensus({source: value for source, (_, value) in by_source.items()})}
+        for (asset_id, bucket_ts), by_source in sorted(latest.items())
+    ]
+    # Buckets left without a price (their identities went away) get no consensus at all
+    empty = [key for key in keys if key not in latest]
+    for start in range(0, len(empty), chunk_size):
+        db.execute(delete(PriceConsensus).where(
+            tuple_(PriceConsensus.asset_id, PriceConsensus.bucket).in_(empty[start:start + chunk_size])
+        ))
+    if not rows:
+        return 0
+
+    stmt = dialect_insert(db, PriceConsensus)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["asset_id", "bucket"],
+        set_={
+            **{column: stmt.excluded[column] for column in
+               ("consensus_price", "min_price", "max_price", "spread", "spread_bps", "n_sources", "sources")},
+            "updated_at": func.now(),
+        },
+    )
+    for start in range(0, len(rows), chunk_size):
+        db.execute(stmt, rows[start:start + chunk_size])
+    return len(rows)
+
+
+def _with_later_buckets(db, keys, tolerance: timedelta, chunk_size: int) -> set:
+    """
+    `keys` plus the existing consensus buckets that start within `tolerance` after one of
+    them: a price loaded late (a backlog, a transform worker running behind) counts for
+    those as well, so the result doesn't depend on the order loads are processed in.
+    """
+    starts = {}
+    for asset_id, start in keys:
+        starts.setdefault(asset_id, []).append(start)
+    assets = sorted(starts)
+    low = min(start for _, start in keys)
+    high = max(start for _, start in keys) + tolerance
+
+    found = set(keys)
+    for start in range(0, len(assets), chunk_size):
+        query = (
+            select(PriceConsensus.asset_id, PriceConsensus.bucket)
+            .where(PriceConsensus.asset_id.in_(assets[start:start + chunk_size]))
+            .where(PriceConsensus.bucket > low, PriceConsensus.bucket <= high)
+        )
+        for asset_id, bucket_ts in db.execute(query):
+            bucket_ts = _utc(bucket_ts)
+            if any(loaded < bucket_ts <= loaded + tolerance for loaded in starts[asset_id]):
+                found.add((asset_id, bucket_ts))
+    return found
+
+
+def _lock_buckets(db, keys, chunk_size: int):
+    """
+    Locks the price_consensus rows of `keys` (sorted) until the caller commits, inserting
+    empty ones for new buckets. Every source's job recomputes the consensus from the other
+    sources' committed rows: without the lock, two jobs touching the same bucket each read
+    without the other's uncommitted prices and the later commit drops a source. With it the
+    second job waits here, and its reads (after the wait) see what the first committed.
+    """
+    stmt = dialect_insert(db, PriceConsensus)
+    stmt = stmt.on_conflict_do_update(index_elements=["asset_id", "bucket"], set_={"asset_id": stmt.excluded.asset_id})
+    rows = [{"asset_id": asset_id, "bucket": bucket_ts} for asset_id, bucket_ts in keys]
+    for start in range(0, len(rows), chunk_size):
+        db.execute(stmt, rows[start:start + chunk_size])
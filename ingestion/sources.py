@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+import httpx
+from datetime import datetime
+from schemas.etl_schema import UnifiedRow
+from ingestion.http_client import fetch_json, FETCH_TIMEOUT_SECONDS, FETCH_MAX_RETRIES, FETCH_BACKOFF_SECONDS
+from ingestion.reconcile import canonical_asset_id
+
+# How often the scheduler fetches a source, unless the adapter sets its own `interval`
+FETCH_INTERVAL_SECONDS = float(os.getenv("FETCH_INTERVAL_SECONDS", "60"))
+
+# -----------------------------
+# Source Registry
+# -----------------------------
+# Every adapter decorated with @register_source ends up here, keyed by its name.
+# IngestionPipeline fetches and maps whatever is registered, so adding a source
+# means writing an adapter class and nothing else.
+SOURCE_REGISTRY = {}
+
+
+def register_source(cls):
+    """Class decorator that registers one instance of the adapter under cls.name."""
+    SOURCE_REGISTRY[cls.name] = cls()
+    return cls
+
+
+def get_source(name: str):
+    return SOURCE_REGISTRY.get(name)
+
+
+class RateLimiter:
+    """
+    Caps how hard we hit one upstream: at most `max_concurrency` requests in flight,
+    and request starts spaced at least `min_interval` seconds apart.
+    Created per fetch because asyncio primitives belong to a single event loop.
+    """
+    def __init__(self, max_concurrency: int, min_interval: float):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._min_interval = min_interval
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        async with self._lock:
+            wait = self._next_start - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start = time.monotonic() + self._min_interval
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+class SourceAdapter:
+    """
+    Base class for an API source. Subclasses set `name` and `url`, and implement
+    `fetch` (how to pull the full payload, with pagination if the API has it) and
+    `map_item` (how one payload item becomes a UnifiedRow).
+
+    Any class attribute can be overridden per instance, e.g. SourceAdapter(url=...)
+    to point an adapter at a stub server.
+    """
+    name = None
+    url = None
+    timeout = FETCH_TIMEOUT_SECONDS
+    max_retries = FETCH_MAX_RETRIES
+    backoff = FETCH_BACKOFF_SECONDS
+    # Seconds between scheduled fetches (see services/scheduler.py)
+    interval = FETCH_INTERVAL_SECONDS
+
+    # Rate limits: parallel requests allowed and minimum seconds between request starts
+    max_concurrency = 1
+    min_interval = 0.0
+
+    def __init__(self, **overrides):
+        for key, value in overrides.items():
+            setattr(self, key, value)
+
+    def headers(self) -> dict:
+        return {}
+
+    async def get_json(self, client: httpx.AsyncClient, limiter: RateLimiter, params: dict = None):
+        async with limiter:
+            return await fetch_json(
+                client,
+                self.url,
+                params=params,
+                headers=self.headers(),
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+                backoff=self.backoff,
+                source=self.name,
+            )
+
+    async def fetch(self, client: httpx.AsyncClient) -> list:
+        """Returns the list of raw items for one run. Default: a single GET."""
+        limiter = RateLimiter(self.max_concurrency, self.min_interval)
+        return await self.get_json(client, limiter)
+
+    async def fetch_pages(self, client: httpx.AsyncClient, page_params, per_page: int, max_pages: int) -> list:
+        """
+        Fetches pages 1..max_pages, `max_concurrency` pages at a time, and stops at the first
+        short page. `page_params(page)` returns the query params for a given page number.
+        """
+        limiter = RateLimiter(self.max_concurrency, self.min_interval)
+        items = []
+        page = 1
+        while page <= max_pages:
+            window = range(page, min(page + self.max_concurrency, max_pages + 1))
+            results = await asyncio.gather(*[self.get_json(client, limiter, page_params(p)) for p in window])
+            for result in results:
+                items.extend(result)
+                if len(result) < per_page:
+                    return items
+            page = window.stop
+        return items
+
+    def map_item(self, item: dict, now: datetime) -> UnifiedRow:
+        """Maps one payload item. Set asset_id (canonical_asset_id of its ticker) so the row takes part in reconciliation."""
+        raise NotImplementedError
+
+
+# -----------------------------
+# SOURCE 1: CoinPaprika
+# -----------------------------
+@register_source
+class CoinPaprikaAdapter(SourceAdapter):
+    name = "coinpaprika"
+    # The 'tickers' endpoint returns every coin and its price in one response
+    url = os.getenv("COINPAPRIKA_URL", "https://api.coinpaprika.com/v1/tickers")
+    timeout = float(os.getenv("COINPAPRIKA_TIMEOUT_SECONDS", FETCH_TIMEOUT_SECONDS))
+    interval = float(os.getenv("COINPAPRIKA_INTERVAL_SECONDS", FETCH_INTERVAL_SECONDS))
+
+    def headers(self) -> dict:
+        # CoinPaprika usually expects the ID in the header or query param.
+        # Free tier often works without it, but we add it if present.
+        api_key = os.getenv("COINPAPRIKA_API_KEY") # Ensure this is in your .env
+        return {"Authorization": api_key} if api_key else {}
+
+    def map_item(self, item: dict, now: datetime) -> UnifiedRow:
+        # Structure: {'id': 'btc-bitcoin', 'name': 'Bitcoin', 'symbol': 'BTC', 'quotes': {'USD': {'price': 20000}}}
+
+        # Safely access nested dictionary for price
+        quotes = item.get("quotes", {})
+        usd_quote = quotes.get("USD", {})
+        price = usd_quote.get("price", 0)
+
+        return UnifiedRow(
+            entity_name=item.get("name", "Unknown"),
+            value=float(price),
+            event_timestamp=now,
+            source=self.name,
+            original_id=item.get("id"),
+            asset_id=canonical_asset_id(item.get("symbol"))
+        )
+
+
+# -----------------------------
+# SOURCE 2: CoinGecko
+# -----------------------------
+@register_source
+class CoinGeckoAdapter(SourceAdapter):
+    name = "coingecko"
+    # The 'markets' endpoint gives price + market cap, paginated by market cap
+    url = os.getenv("COINGECKO_URL", "https://api.coingecko.com/api/v3/coins/markets")
+    timeout = float(os.getenv("COINGECKO_TIMEOUT_SECONDS", FETCH_TIMEOUT_SECONDS))
+    interval = float(os.getenv("COINGECKO_INTERVAL_SECONDS", FETCH_INTERVAL_SECONDS))
+
+    per_page = 250 # API maximum
+    max_pages = int(os.getenv("COINGECKO_MAX_PAGES", "40"))
+    # The public tier is rate limited, so keep a few pages in flight and space them out
+    max_concurrency = int(os.getenv("COINGECKO_MAX_CONCURRENCY", "3"))
+    min_interval = float(os.getenv("COINGECKO_MIN_INTERVAL_SECONDS", "1.0"))
+
+    async def fetch(self, client: httpx.AsyncClient) -> list:
+        return await self.fetch_pages(
+            client,
+            lambda page: {
+                "vs_currency": "usd",
+                "order": "market_cap_desc",
+                "per_page": self.per_page,
+                "page": page
+            },
+            per_page=self.per_page,
+            max_pages=self.max_pages,
+        )
+
+    def map_item(self, item: dict, now: datetime) -> UnifiedRow:
+        # Structure: {'id': 'bitcoin', 'name': 'Bitcoin', 'symbol': 'btc', 'current_price': 20000}
+        return UnifiedRow(
+            entity_name=item.get("name", "Unknown"),
+            value=float(item.get("current_price", 0)),
+            event_timestamp=now,
+            source=self.name,
+            original_id=item.get("id"),
+            asset_id=canonical_asset_id(item.get("symbol"))
+        )
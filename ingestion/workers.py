@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.database import DATABASE_URL
+from core.models import RawAPIData, RawCSVData
+from ingestion.pipeline import IngestionPipeline, BULK_CHUNK_SIZE, CSV_SOURCE_NAME, after_row
+
+# Parallel transform stage: several processes drain the raw tables at once.
+#
+# Each worker claims raw rows with SELECT ... FOR UPDATE SKIP LOCKED, transforms them and
+# commits on its own. A claimed row stays locked until that commit, so other workers skip
+# straight past it, and it is marked processed in the same transaction as its load, so no
+# batch is ever transformed twice. Postgres only: SQLite has no row locks, so there the
+# transform runs in-process on a single worker.
+#
+# Workers don't touch the per-source watermarks (every worker updating the same checkpoint
+# rows would serialize them). Each reports the furthest row it processed per source, and once
+# the pool is done run_transform_workers moves every watermark there, or back to the oldest
+# row still unprocessed (a batch that committed late), so the next sequential run starts
+# where the workers stopped.
+
+TRANSFORM_WORKERS = int(os.getenv("ETL_TRANSFORM_WORKERS", "1"))
+# Raw CSV rows claimed per transaction (API rows are claimed one batch at a time)
+CSV_CLAIM_SIZE = int(os.getenv("ETL_WORKER_CSV_CLAIM_SIZE", "5000"))
+
+
+def _claim(db, query, model, after, limit: int):
+    """
+    Locks the next `limit` unprocessed rows after the worker's own position, skipping rows
+    other workers hold.
+    """
+    query = after_row(query.filter(model.processed == False), model, after)
+    return query.order_by(model.ingested_at, model.id).limit(limit).with_for_update(skip_locked=True).all()
+
+
+def drain_raw_batches(db, chunk_size: int = BULK_CHUNK_SIZE, csv_claim_size: int = CSV_CLAIM_SIZE):
+    """
+    One worker's loop: claim, transform, commit, until nothing is left to claim.
+    Returns {"accepted", "rejected", "batches"} for this worker, plus "positions": the last
+    (ingested_at, id) it processed per source.
+    """
+    pipeline = IngestionPipeline(db, bulk=True, chunk_size=chunk_size)
+    started_at = datetime.now(timezone.utc)
+    accepted, rejected, batches = 0, 0, 0
+    positions = {}
+
+    # Only sources with an adapter, like the sequential transform (also the leading column
+    # of the partial "unprocessed" index the claim reads)
+    api_rows = db.query(RawAPIData).filter(RawAPIData.source_name.in_(list(pipeline.sources)))
+    after = None
+    while True:
+        rows = _claim(db, api_rows, RawAPIData, after, 1)
+        if not rows:
+            db.rollback()
+            break
+        row = rows[0]
+        after = row.id
+        source_name = row.source_name
+        positions[source_name] = (row.ingested_at, row.id)
+        batch_accepted, batch_rejected = pipeline._transform_api_batch(row)
+        pipeline._commit_load(source_name)
+        db.expunge(row) # Don't keep every claimed payload in the session
+        accepted, rejected, batches = accepted + batch_accepted, rejected + batch_rejected, batches + 1
+
+    after = None
+    while True:
+        query = db.query(RawCSVData.id, RawCSVData.row_data, RawCSVData.ingested_at)
+        rows = _claim(db, query, RawCSVData, after, csv_claim_size)
+        if not rows:
+            db.rollback()
+            break
+        after = rows[-1].id
+        positions[CSV_SOURCE_NAME] = (rows[-1].ingested_at, rows[-1].id)
+        batch_accepted, batch_rejected = pipeline._transform_csv_rows(rows)
+        pipeline._commit_load(CSV_SOURCE_NAME)
+        accepted, rejected, batches = accepted + batch_accepted, rejected + batch_rejected, batches + 1
+
+    pipeline.record_run("transform_worker", started_at)
+    return {"accepted": accepted, "rejected": rejected, "batches": batches, "positions": positions}
+
+
+def advance_watermarks(db, positions: dict):
+    """
+    Moves each source's watermark to the furthest (ingested_at, id) any worker processed,
+    unless an older row of the source is still unprocessed: then to that row, which the
+    next run's watermark window (>= watermark - lag) still includes. Never moves one back.
+    """
+    pipeline = IngestionPipeline(db)
+    for source_name, position in sorted(positions.items()):
+        model = RawCSVData if source_name == CSV_SOURCE_NAME else RawAPIData
+        query = db.query(model.ingested_at, model.id).filter(model.processed == False)
+        if model is RawAPIData:
+            query = query.filter(RawAPIData.source_name == source_name)
+        # Served by the partial "unprocessed" indexes
+        oldest = query.order_by(model.ingested_at, model.id).first()
+        if oldest and tuple(oldest) < position:
+            position = tuple(oldest)
+        pipeline._advance_watermark(pipeline._get_checkpoint(source_name), *position)
+    db.commit()
+
+
+def _session(database_url: str):
+    # Each process opens its own connection; nothing from the parent's engine is shared
+    pool_kwargs = {"pool_size": 1, "max_overflow": 0} if database_url.startswith("postgresql") else {}
+    engine = create_engine(database_url, **pool_kwargs)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def _worker_main(database_url: str, chunk_size: int, csv_claim_size: int):
+    engine, db = _session(database_url)
+    try:
+        return drain_raw_batches(db, chunk_size, csv_claim_size)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _advance_after_workers(database_url: str, results):
+    positions = {}
+    for result in results:
+        for source_name, position in result["positions"].items():
+            positions[source_name] = max(positions.get(source_name, position), position)
+
+    engine, db = _session(database_url)
+    try:
+        advance_watermarks(db, positions)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def run_transform_workers(workers: int = TRANSFORM_WORKERS, database_url: str = DATABASE_URL,
+                          chunk_size: int = BULK_CHUNK_SIZE, csv_claim_size: int = CSV_CLAIM_SIZE):
+    """
+    Drains all unprocessed raw rows with `workers` processes, then moves the watermarks.
+    Returns the summed {"accepted", "rejected", "batches"}.
+    """
+    if not database_url.startswith("postgresql"):
+        workers = 1
+
+    if workers <= 1:
+        results = [_worker_main(database_url, chunk_size, csv_claim_size)]
+    else:
+        print(f"Transforming raw data with {workers} workers...")
+        # spawn, not fork: a forked child would inherit the parent's open DB connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_worker_main, database_url, chunk_size, csv_claim_size) for _ in range(workers)]
+            results = [future.result() for future in futures]
+
+    _advance_after_workers(database_url, results)
+    totals = {key: sum(result[key] for result in results) for key in ("accepted", "rejected", "batches")}
+    print(f"✅ Workers done. Processed {totals['batches']} batches ({totals['accepted']} accepted, {totals['rejected']} rejected).")
+    return totals
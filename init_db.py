@@ -1,7 +1,14 @@
-from core.database import engine, Base
-from core.models import RawAPIData, RawCSVData, UnifiedData, ETLCheckpoint
+from core.database import engine, Base, SessionLocal
+from core.models import RawAPIData, RawCSVData, UnifiedData, UnifiedRollup, ETLCheckpoint, LatestPrice, ETLGeneration, IngestedFile, ETLRun, SourceStats
+from core.partitions import ensure_partitions
 
 # This command looks at all classes inheriting from Base and creates tables
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
-print("Tables created successfully!")
\ No newline at end of file
+# With DB_PARTITIONING=true the partitioned tables need partitions before the first insert
+db = SessionLocal()
+try:
+    ensure_partitions(db)
+finally:
+    db.close()
+print("Tables created successfully!")
@@ -0,0 +1,98 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+The tables as init_db.py created them before Alembic was introduced, spelled out here
+rather than taken from the models: later model changes must not leak into the baseline,
+they get their own revisions. Tables that already exist are skipped, so databases created
+earlier by init_db.py can be stamped into Alembic by simply upgrading; the indexes and
+constraints added since are created by the later revisions, which check for them first.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return (
+        ("raw_api_data", (
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("source_name", sa.String, index=True),
+            sa.Column("payload", sa.JSON),
+            sa.Column("ingested_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("processed", sa.Boolean),
+        )),
+        ("raw_csv_data", (
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("filename", sa.String),
+            sa.Column("row_data", sa.JSON),
+            sa.Column("ingested_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("processed", sa.Boolean),
+        )),
+        ("ingested_files", (
+            sa.Column("content_hash", sa.String(64), primary_key=True),
+            sa.Column("filename", sa.String),
+            sa.Column("row_count", sa.Integer),
+            sa.Column("status", sa.String),
+            sa.Column("ingested_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+        ("unified_data", (
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("entity_name", sa.String, index=True),
+            sa.Column("value", sa.Float),
+            sa.Column("event_timestamp", sa.DateTime(timezone=True)),
+            sa.Column("source", sa.String),
+            sa.Column("original_id", sa.String),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+        ("unified_rollups", (
+            sa.Column("entity_name", sa.String, primary_key=True),
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("open", sa.Float),
+            sa.Column("high", sa.Float),
+            sa.Column("low", sa.Float),
+            sa.Column("close", sa.Float),
+            sa.Column("avg", sa.Float),
+            sa.Column("count", sa.Integer),
+        )),
+        ("latest_prices", (
+            sa.Column("entity_name", sa.String, primary_key=True),
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("value", sa.Float),
+            sa.Column("event_timestamp", sa.DateTime(timezone=True)),
+            sa.Column("original_id", sa.String),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+        ("etl_checkpoints", (
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("source_name", sa.String, unique=True, index=True),
+            sa.Column("last_processed_timestamp", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("last_processed_id", sa.String, nullable=True),
+            sa.Column("last_run_status", sa.String),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+        ("etl_generation", (
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("generation", sa.Integer, nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+    )
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns in _tables():
+        if name not in existing:
+            op.create_table(name, *columns)
+
+
+def downgrade():
+    for name, _ in reversed(_tables()):
+        op.drop_table(name)
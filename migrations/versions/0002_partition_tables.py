@@ -0,0 +1,99 @@
+"""Range-partition raw_api_data and unified_data
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Only does anything on Postgres with DB_PARTITIONING=true. An existing table cannot be
+turned into a partitioned one in place, so each table is renamed aside, recreated
+partitioned, given its partitions, refilled and the old copy dropped.
+Run it during a quiet window: the copy holds locks on both tables until it commits.
+
+The new tables are spelled out with the columns they had at this revision, not taken from
+the models: later revisions add their own columns and indexes. Columns the old table
+already has beyond these (a database created by a later init_db) are carried over as they are.
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect, text
+from core.models import PARTITIONING_ENABLED
+from core.partitions import PARTITIONED_TABLES, partition_ddl
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    # Postgres needs the partition key in the primary key and in every unique constraint
+    return {
+        "raw_api_data": (
+            sa.Column("id", sa.String(36)),
+            sa.Column("source_name", sa.String, index=True),
+            sa.Column("payload", sa.JSON),
+            sa.Column("ingested_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("processed", sa.Boolean),
+            sa.PrimaryKeyConstraint("id", "ingested_at"),
+        ),
+        "unified_data": (
+            sa.Column("id", sa.String(36)),
+            sa.Column("entity_name", sa.String, index=True),
+            sa.Column("value", sa.Float),
+            sa.Column("event_timestamp", sa.DateTime(timezone=True)),
+            sa.Column("source", sa.String),
+            sa.Column("original_id", sa.String),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.PrimaryKeyConstraint("id", "event_timestamp"),
+            sa.UniqueConstraint("source", "original_id", "event_timestamp", name="uq_unified_data_natural_key"),
+        ),
+    }
+
+
+def _is_partitioned(bind, table: str) -> bool:
+    return bind.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table"
+    ), {"table": table}).first() is not None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not PARTITIONING_ENABLED or bind.dialect.name != "postgresql":
+        return
+
+    tables = [table for table in PARTITIONED_TABLES if not _is_partitioned(bind, table)]
+    inspector = inspect(bind)
+    copied_columns = {}
+    for table in tables:
+        legacy = f"{table}_legacy"
+        # Free up every name the new table needs: the table itself, its PK, indexes and constraints
+        op.rename_table(table, legacy)
+        op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+        for constraint in inspector.get_unique_constraints(legacy):
+            op.drop_constraint(constraint["name"], legacy, type_="unique")
+        for index in inspector.get_indexes(legacy):
+            op.drop_index(index["name"], table_name=legacy)
+
+        partition_column, _ = PARTITIONED_TABLES[table]
+        columns = _tables()[table]
+        known = {column.name for column in columns if isinstance(column, sa.Column)}
+        extra = [
+            sa.Column(column["name"], column["type"], nullable=column["nullable"])
+            for column in inspector.get_columns(legacy) if column["name"] not in known
+        ]
+        op.create_table(table, *columns, *extra, postgresql_partition_by=f"RANGE ({partition_column})")
+        copied_columns[table] = [column["name"] for column in inspector.get_columns(legacy)]
+
+    for statement in partition_ddl():
+        op.execute(statement)
+
+    for table in tables:
+        columns = ", ".join(copied_columns[table])
+        # The new table carries the unified_data natural key; duplicates in the old copy are dropped
+        op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_legacy ON CONFLICT DO NOTHING")
+        op.drop_table(f"{table}_legacy")
+
+
+def downgrade():
+    # Going back to single heap tables means another full copy; not worth automating
+    pass
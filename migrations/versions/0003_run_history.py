@@ -0,0 +1,57 @@
+"""ETL run history and per-source totals
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+The tables are spelled out as they were at this revision rather than taken from the models,
+so later model changes don't leak into it. Tables that already exist (created by init_db.py)
+are skipped.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return (
+        ("etl_runs", (
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("run_id", sa.String(36), index=True),
+            sa.Column("job", sa.String),
+            sa.Column("source", sa.String, index=True),
+            sa.Column("status", sa.String),
+            sa.Column("rows_read", sa.Integer),
+            sa.Column("rows_loaded", sa.Integer),
+            sa.Column("rows_rejected", sa.Integer),
+            sa.Column("duration_seconds", sa.Float),
+            sa.Column("started_at", sa.DateTime(timezone=True), index=True),
+            sa.Column("finished_at", sa.DateTime(timezone=True)),
+        )),
+        ("source_stats", (
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("total_runs", sa.Integer, nullable=False),
+            sa.Column("rows_read", sa.Integer, nullable=False),
+            sa.Column("rows_loaded", sa.Integer, nullable=False),
+            sa.Column("rows_rejected", sa.Integer, nullable=False),
+            sa.Column("last_run_status", sa.String),
+            sa.Column("last_run_at", sa.DateTime(timezone=True)),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+    )
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns in _tables():
+        if name not in existing:
+            op.create_table(name, *columns)
+
+
+def downgrade():
+    for name, _ in reversed(_tables()):
+        op.drop_table(name)
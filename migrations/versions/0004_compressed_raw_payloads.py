@@ -0,0 +1,43 @@
+"""Compressed raw payloads and JSONB payload column
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    sa.Column("payload_blob", sa.LargeBinary, nullable=True),
+    sa.Column("payload_encoding", sa.String(8), nullable=True),
+    sa.Column("content_hash", sa.String(64), nullable=True),
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # Databases created from the current models (0001 on an empty database) already have these
+    existing = {column["name"] for column in inspector.get_columns("raw_api_data")}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column("raw_api_data", column.copy())
+
+    if "ix_raw_api_data_source_ingested" not in {index["name"] for index in inspector.get_indexes("raw_api_data")}:
+        op.create_index("ix_raw_api_data_source_ingested", "raw_api_data", ["source_name", "ingested_at"])
+
+    if bind.dialect.name == "postgresql":
+        # The models always promised JSONB; older tables were created as plain JSON
+        op.alter_column("raw_api_data", "payload", type_=JSONB, postgresql_using="payload::jsonb")
+
+
+def downgrade():
+    op.drop_index("ix_raw_api_data_source_ingested", table_name="raw_api_data")
+    for column in NEW_COLUMNS:
+        op.drop_column("raw_api_data", column.name)
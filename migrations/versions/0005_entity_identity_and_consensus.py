@@ -0,0 +1,53 @@
+"""Entity identity index and cross-source price consensus
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+The tables are spelled out as they were at this revision rather than taken from the models,
+so later model changes don't leak into it. Tables that already exist (created by init_db.py)
+are skipped.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return (
+        ("entity_identities", (
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("entity_name", sa.String, primary_key=True),
+            sa.Column("asset_id", sa.String, nullable=False, index=True),
+            sa.Column("original_id", sa.String),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+        ("price_consensus", (
+            sa.Column("asset_id", sa.String, primary_key=True),
+            sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("consensus_price", sa.Float),
+            sa.Column("min_price", sa.Float),
+            sa.Column("max_price", sa.Float),
+            sa.Column("spread", sa.Float),
+            sa.Column("spread_bps", sa.Float),
+            sa.Column("n_sources", sa.Integer),
+            sa.Column("sources", sa.String),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+    )
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns in _tables():
+        if name not in existing:
+            op.create_table(name, *columns)
+
+
+def downgrade():
+    for name, _ in reversed(_tables()):
+        op.drop_table(name)
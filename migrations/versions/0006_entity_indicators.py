@@ -0,0 +1,55 @@
+"""Technical indicators and their incremental state
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+The tables are spelled out as they were at this revision rather than taken from the models,
+so later model changes don't leak into it. Tables that already exist (created by init_db.py)
+are skipped.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return (
+        ("entity_indicators", (
+            sa.Column("entity_name", sa.String, primary_key=True),
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("event_timestamp", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("value", sa.Float),
+            sa.Column("log_return", sa.Float),
+            sa.Column("sma_short", sa.Float),
+            sa.Column("sma_long", sa.Float),
+            sa.Column("ema_short", sa.Float),
+            sa.Column("ema_long", sa.Float),
+            sa.Column("volatility", sa.Float),
+        )),
+        ("indicator_state", (
+            sa.Column("entity_name", sa.String, primary_key=True),
+            sa.Column("source", sa.String, primary_key=True),
+            sa.Column("last_timestamp", sa.DateTime(timezone=True)),
+            sa.Column("ema_short", sa.Float),
+            sa.Column("ema_long", sa.Float),
+            sa.Column("tail", sa.JSON),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )),
+    )
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns in _tables():
+        if name not in existing:
+            op.create_table(name, *columns)
+
+
+def downgrade():
+    for name, _ in reversed(_tables()):
+        op.drop_table(name)
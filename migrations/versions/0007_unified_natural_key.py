@@ -0,0 +1,56 @@
+"""Natural-key unique constraint on unified_data
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Loads insert with ON CONFLICT (source, original_id, event_timestamp) DO NOTHING, which
+needs a unique constraint on exactly those columns. Tables created before it existed can
+hold duplicates from earlier reruns, so those are removed first (the oldest row of each
+key is kept). Both steps lock unified_data until the revision commits: quiet window.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+CONSTRAINT = "uq_unified_data_natural_key"
+KEY = ("source", "original_id", "event_timestamp")
+
+# NULLs never conflict in a unique constraint, so rows with one in the key are left alone
+DELETE_DUPLICATES = """
+DELETE FROM unified_data WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY source, original_id, event_timestamp ORDER BY created_at, id
+        ) AS n
+        FROM unified_data
+        WHERE source IS NOT NULL AND original_id IS NOT NULL AND event_timestamp IS NOT NULL
+    ) ranked
+    WHERE n > 1
+)
+"""
+
+
+def _has_natural_key(inspector) -> bool:
+    # A partitioned table recreated by 0002 already has it; SQLite reports it either way
+    names = {constraint["name"] for constraint in inspector.get_unique_constraints("unified_data")}
+    names |= {index["name"] for index in inspector.get_indexes("unified_data") if index.get("unique")}
+    return CONSTRAINT in names
+
+
+def upgrade():
+    if _has_natural_key(sa.inspect(op.get_bind())):
+        return
+    op.execute(DELETE_DUPLICATES)
+    # Batch mode, because SQLite can't add a constraint to an existing table
+    with op.batch_alter_table("unified_data") as batch:
+        batch.create_unique_constraint(CONSTRAINT, list(KEY))
+
+
+def downgrade():
+    with op.batch_alter_table("unified_data") as batch:
+        batch.drop_constraint(CONSTRAINT, type_="unique")
@@ -0,0 +1,39 @@
+"""Composite indexes for /data filters and keyset pagination
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+ORDER BY event_timestamp DESC, id DESC (optionally filtered by source or entity) is served
+from these instead of a scan and sort. The single-column entity_name index of the original
+schema is the leading prefix of ix_unified_data_entity_ts_id, so it goes.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_unified_data_ts_id", ["event_timestamp", "id"]),
+    ("ix_unified_data_source_ts_id", ["source", "event_timestamp", "id"]),
+    ("ix_unified_data_entity_ts_id", ["entity_name", "event_timestamp", "id"]),
+)
+
+
+def upgrade():
+    # Databases created from the current models (or partitioned by 0002) already have them
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("unified_data")}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, "unified_data", columns)
+    if "ix_unified_data_entity_name" in existing:
+        op.drop_index("ix_unified_data_entity_name", table_name="unified_data")
+
+
+def downgrade():
+    op.create_index("ix_unified_data_entity_name", "unified_data", ["entity_name"])
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="unified_data")
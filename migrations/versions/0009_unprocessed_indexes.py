@@ -0,0 +1,36 @@
+"""Partial "unprocessed" indexes on the raw tables
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+The transform's watermark query (unprocessed rows of a source since its watermark, in
+ingested_at, id order) reads these instead of the whole raw table. They only hold rows
+with processed = false, so they stay small however much history the tables keep.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+UNPROCESSED = sa.text("NOT processed")
+INDEXES = (
+    ("ix_raw_api_data_unprocessed", "raw_api_data", ["source_name", "ingested_at", "id"]),
+    ("ix_raw_csv_data_unprocessed", "raw_csv_data", ["ingested_at", "id"]),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        # Databases created from the current models (or partitioned by 0002) already have them
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, postgresql_where=UNPROCESSED, sqlite_where=UNPROCESSED)
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,50 @@
+"""Reject reason on raw CSV rows
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+
+The transform used to leave rejected CSV rows unprocessed, so they stayed in the partial
+"unprocessed" index forever. It now marks them processed with a reject_reason. Rows still
+unprocessed well behind the CSV watermark can only be such old rejects (the transform never
+looks that far back again), so they are marked here too.
+"""
+from datetime import timedelta
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+CSV_SOURCE_NAME = "historical_csv"
+# ETL_WATERMARK_LAG_SECONDS' default: rows inside the lag are still re-read by the next run
+WATERMARK_LAG = timedelta(seconds=300)
+OLD_REJECT_REASON = "rejected before reject_reason was recorded"
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Databases created by init_db.py from the current models already have it
+    if "reject_reason" not in {column["name"] for column in sa.inspect(bind).get_columns("raw_csv_data")}:
+        op.add_column("raw_csv_data", sa.Column("reject_reason", sa.String, nullable=True))
+
+    watermark = bind.execute(
+        sa.text("SELECT last_processed_timestamp FROM etl_checkpoints WHERE source_name = :source")
+        .columns(last_processed_timestamp=sa.DateTime),
+        {"source": CSV_SOURCE_NAME}
+    ).scalar()
+    if watermark is not None:
+        bind.execute(
+            sa.text(
+                "UPDATE raw_csv_data SET processed = :processed, reject_reason = :reason "
+                "WHERE NOT processed AND ingested_at < :before"
+            ).bindparams(sa.bindparam("before", type_=sa.DateTime)),
+            {"processed": True, "reason": OLD_REJECT_REASON, "before": watermark - WATERMARK_LAG}
+        )
+
+
+def downgrade():
+    op.drop_column("raw_csv_data", "reject_reason")
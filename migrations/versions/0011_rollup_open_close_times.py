@@ -0,0 +1,34 @@
+"""Open/close timestamps on daily rollups
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+
+Late rows merged into an existing candle pick its open and close by comparing these.
+Candles rolled up before this revision have NULLs and keep their open and close.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    sa.Column("open_at", sa.DateTime(timezone=True), nullable=True),
+    sa.Column("close_at", sa.DateTime(timezone=True), nullable=True),
+)
+
+
+def upgrade():
+    # Databases created by init_db.py from the current models already have these
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("unified_rollups")}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column("unified_rollups", column.copy())
+
+
+def downgrade():
+    for column in NEW_COLUMNS:
+        op.drop_column("unified_rollups", column.name)
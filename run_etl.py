@@ -1,17 +1,20 @@
 import os
+from datetime import datetime, timezone
 from core.database import SessionLocal
 from ingestion.pipeline import IngestionPipeline
+from ingestion.workers import TRANSFORM_WORKERS, run_transform_workers
 
 def main():
     db = SessionLocal()
     pipeline = IngestionPipeline(db)
+    started_at = datetime.now(timezone.utc)
+    status = "failed"
     
     try:
         print("--- Starting ETL Run ---")
         
         # 1. APIs
-        pipeline.fetch_coinpaprika()
-        pipeline.fetch_coingecko()
+        pipeline.fetch_api_sources()
         
         # 2. CSV (Check if file exists first)
         csv_file = "historical_prices.csv"
@@ -23,13 +26,20 @@ def main():
         # 3. Process All
         # Note: You need to ensure process_raw_data calls both _process_api_tables AND _process_csv_tables
         # or simply put the logic in one big function as before.
-        pipeline.process_raw_data()
+        if TRANSFORM_WORKERS > 1:
+            # Backfills: drain the raw tables with a pool of worker processes
+            run_transform_workers()
+        else:
+            pipeline.process_raw_data()
         
+        status = "success"
         print("--- ETL Run Finished Successfully ---")
         
     except Exception as e:
         print(f"Critical Error: {e}")
     finally:
+        # Run history behind /stats (worker processes record their own share)
+        pipeline.record_run("run_etl", started_at, status)
         db.close()
 
 if __name__ == "__main__":
@@ -21,14 +21,99 @@ class APIResponse(BaseModel):
     data: List[DataItem]
     pagination: dict
 
+# One OHLC candle for an entity/source in a time bucket
+class AggregateBucket(BaseModel):
+    entity_name: str
+    source: str
+    bucket: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    avg: float
+    count: int
+
+class AggregateResponse(BaseModel):
+    request_id: str
+    api_latency_ms: float
+    bucket: str
+    data: List[AggregateBucket]
+
+# Latest value of one entity from one source
+class LatestItem(BaseModel):
+    entity_name: str
+    source: str
+    value: float
+    event_timestamp: datetime
+    original_id: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class LatestResponse(BaseModel):
+    request_id: str
+    api_latency_ms: float
+    data: List[LatestItem]
+
+# Cross-source consensus of one asset in one time bucket
+class ConsensusItem(BaseModel):
+    asset_id: str
+    bucket: datetime
+    consensus_price: float
+    min_price: float
+    max_price: float
+    spread: float
+    spread_bps: Optional[float]
+    n_sources: int
+    sources: List[str]
+
+class ConsensusResponse(BaseModel):
+    request_id: str
+    api_latency_ms: float
+    data: List[ConsensusItem]
+
+# Technical indicators of one series at one point (None until the window has enough points)
+class IndicatorItem(BaseModel):
+    entity_name: str
+    source: str
+    event_timestamp: datetime
+    value: float
+    log_return: Optional[float]
+    sma_short: Optional[float]
+    sma_long: Optional[float]
+    ema_short: Optional[float]
+    ema_long: Optional[float]
+    volatility: Optional[float]
+
+class IndicatorResponse(BaseModel):
+    request_id: str
+    api_latency_ms: float
+    data: List[IndicatorItem]
+
 # Health Check Response
 class HealthResponse(BaseModel):
     status: str
     db_connectivity: bool
     etl_last_run_status: Optional[str]
 
+# Running totals of one source, kept up to date by the ETL
+class SourceStatsItem(BaseModel):
+    source: str
+    total_runs: int
+    rows_read: int
+    rows_loaded: int
+    rows_rejected: int
+    last_run_status: Optional[str]
+    last_run_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
 # Stats Response (P1.3 requirement)
 class StatsResponse(BaseModel):
+    request_id: str
+    api_latency_ms: float
     total_records: int
     last_run_status: Optional[str]
-    last_run_timestamp: Optional[datetime]
\ No newline at end of file
+    last_run_timestamp: Optional[datetime]
+    sources: List[SourceStatsItem]
\ No newline at end of file
@@ -10,6 +10,8 @@ class UnifiedRow(BaseModel):
     event_timestamp: datetime
     source: str
     original_id: str
+    # Canonical asset id (ticker) shared by every source, see ingestion/reconcile.py
+    asset_id: Optional[str] = None
 
     # Example Validator: Ensure value is positive
     @field_validator('value')
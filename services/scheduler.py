@@ -1,38 +1,237 @@
+import json
+import os
+import random
+import threading
 import time
-import schedule
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from core.database import SessionLocal
-from ingestion.pipeline import IngestionPipeline
+from core.metrics import registry, SCHEDULER_JOB_SECONDS, SCHEDULER_SKIPPED_TICKS
+from core.partitions import run_maintenance
+from ingestion.pipeline import IngestionPipeline, CSV_SOURCE_NAME
+from ingestion.sources import SOURCE_REGISTRY
 
-def run_etl_job():
-    print("⏰ Scheduler: Starting scheduled ETL job...")
+# Every job gets up to this many seconds of random delay per tick, so sources don't all
+# hit the database (and their upstreams) in the same second
+SCHEDULER_JITTER_SECONDS = float(os.getenv("SCHEDULER_JITTER_SECONDS", "5"))
+# What to do when a job is due but one or more of its ticks were missed (process paused,
+# previous run overran, ...):
+#   coalesce -> run once now for all missed ticks
+#   skip     -> drop the missed ticks and wait for the next regular one
+SCHEDULER_MISFIRE_POLICY = os.getenv("SCHEDULER_MISFIRE_POLICY", "coalesce")
+MISFIRE_POLICIES = ("coalesce", "skip")
+SCHEDULER_CSV_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_CSV_INTERVAL_SECONDS", "60"))
+SCHEDULER_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+# The ETL runs in this process, so its metrics are served from here; 0 disables the server
+SCHEDULER_METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "9100"))
+
+
+class Job:
+    """
+    One recurring job. Ticks sit on a fixed grid (first run + k * interval), so a slow run
+    never shifts later ticks. The lock makes sure only one run of a job is in flight.
+    """
+    def __init__(self, name: str, func, interval: float, jitter: float, misfire: str, first_run: float):
+        if misfire not in MISFIRE_POLICIES:
+            raise ValueError(f"Unknown misfire policy {misfire!r}, expected one of {MISFIRE_POLICIES}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.misfire = misfire
+        self.lock = threading.Lock()
+        self._grid_start = first_run
+        self._tick = 0
+        self.next_run = first_run
+
+    def _schedule_after(self, now: float):
+        # Next grid slot strictly after `now`, plus this tick's jitter
+        self._tick = max(self._tick + 1, int((now - self._grid_start) // self.interval) + 1)
+        self.next_run = self._grid_start + self._tick * self.interval + random.uniform(0, self.jitter)
+
+    def missed_ticks(self, now: float) -> int:
+        return int((now - self.next_run) // self.interval)
+
+
+class Scheduler:
+    """
+    Runs each job on its own interval in a thread pool. A job that is still running when
+    its next tick comes up misses that tick instead of queueing behind itself, so ticks
+    never pile up; the pool has a thread per job, so a slow job never starves the others.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.jobs = []
+        self.clock = clock
+        self._executor = None
+        self._stopped = threading.Event()
+
+    def add_job(self, name: str, func, interval: float, jitter: float = SCHEDULER_JITTER_SECONDS,
+                misfire: str = SCHEDULER_MISFIRE_POLICY, run_now: bool = True):
+        first_run = self.clock() if run_now else self.clock() + interval
+        self.jobs.append(Job(name, func, interval, jitter, misfire, first_run))
+
+    def _run(self, job: Job):
+        start = time.perf_counter()
+        status = "success"
+        try:
+            job.func()
+        except Exception as e:
+            status = "failed"
+            print(f"❌ Scheduler: {job.name} failed - {e}")
+        finally:
+            SCHEDULER_JOB_SECONDS.observe(time.perf_counter() - start, job=job.name, status=status)
+            job.lock.release()
+
+    def run_pending(self):
+        """Starts every due job that isn't already running. Returns the futures it submitted."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(len(self.jobs), 1), thread_name_prefix="etl-job")
+
+        futures = []
+        now = self.clock()
+        for job in self.jobs:
+            if now < job.next_run:
+                continue
+
+            missed = job.missed_ticks(now)
+            job._schedule_after(now)
+
+            if missed and job.misfire == "skip":
+                print(f"⏭️ Scheduler: {job.name} missed {missed} tick(s), skipping to the next one.")
+                SCHEDULER_SKIPPED_TICKS.inc(missed, job=job.name, reason="misfire")
+                continue
+            if not job.lock.acquire(blocking=False):
+                print(f"⏭️ Scheduler: {job.name} is still running, skipping this tick.")
+                SCHEDULER_SKIPPED_TICKS.inc(job=job.name, reason="overlap")
+                continue
+            futures.append(self._executor.submit(self._run, job))
+        return futures
+
+    def start(self):
+        print("🚀 ETL Scheduler is running...")
+        while not self._stopped.is_set():
+            self.run_pending()
+            # Sleep until the next job is due (at most 1s, so stop() is noticed quickly)
+            wait = min((job.next_run for job in self.jobs), default=self.clock() + 1) - self.clock()
+            self._stopped.wait(min(max(wait, 0), 1))
+
+    def stop(self, wait: bool = True):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+def _round_stats(stats: dict) -> dict:
+    return {
+        stage: {source: {**values, "seconds": round(values["seconds"], 4)} for source, values in sources.items()}
+        for stage, sources in stats.items()
+    }
+
+def log_run_summary(job: str, pipeline: IngestionPipeline, started_at: datetime, status: str, result: dict = None):
+    """One JSON line per ETL run: what ran, how it went and where the time went, per stage and source."""
+    finished_at = datetime.now(timezone.utc)
+    print(json.dumps({
+        "event": "etl_run",
+        "job": job,
+        "status": status,
+        "started_at": started_at.isoformat(),
+        "duration_seconds": round((finished_at - started_at).total_seconds(), 4),
+        "result": result,
+        "stages": _round_stats(pipeline.stats),
+    }))
+
+def _run_pipeline_job(job: str, sources: dict, work):
+    started_at = datetime.now(timezone.utc)
     db = SessionLocal()
+    pipeline = IngestionPipeline(db, sources=sources)
+    status, result = "failed", None
     try:
-        pipeline = IngestionPipeline(db)
-        
-        # Run all sources
-        pipeline.fetch_coinpaprika()
-        pipeline.fetch_coingecko()
-        
-        # Process data
-        pipeline.process_raw_data()
-        print("✅ Scheduler: Job finished successfully.")
-    except Exception as e:
-        print(f"❌ Scheduler: Job failed - {e}")
+        result = work(pipeline)
+        status = "success"
+        return result
+    finally:
+        try:
+            pipeline.record_run(job, started_at, status)
+        finally:
+            log_run_summary(job, pipeline, started_at, status, result)
+            db.close()
+
+def run_source_job(name: str):
+    """Fetches one API source and transforms its new raw batches."""
+    print(f"⏰ Scheduler: Starting {name} job...")
+
+    def work(pipeline):
+        pipeline.fetch_api_sources()
+        return pipeline.process_raw_data(include_csv=False)
+
+    _run_pipeline_job(name, {name: SOURCE_REGISTRY[name]}, work)
+    print(f"✅ Scheduler: {name} job finished successfully.")
+
+def run_csv_job():
+    """Transforms raw CSV rows loaded since the last run."""
+    _run_pipeline_job(CSV_SOURCE_NAME, {}, lambda pipeline: pipeline.process_raw_data())
+
+def run_maintenance_job():
+    # Partition creation, raw retention and unified downsampling (all no-ops unless configured)
+    print("🧹 Scheduler: Running storage maintenance...")
+    db = SessionLocal()
+    try:
+        run_maintenance(db)
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
+def build_scheduler() -> Scheduler:
+    scheduler = Scheduler()
+    # start_scheduler runs maintenance once before anything else, so it starts one interval in
+    scheduler.add_job("maintenance", run_maintenance_job, SCHEDULER_MAINTENANCE_INTERVAL_SECONDS, jitter=0, run_now=False)
+    for name, adapter in SOURCE_REGISTRY.items():
+        scheduler.add_job(name, lambda name=name: run_source_job(name), adapter.interval)
+    scheduler.add_job(CSV_SOURCE_NAME, run_csv_job, SCHEDULER_CSV_INTERVAL_SECONDS)
+    return scheduler
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would drown the ETL logs
+
+def start_metrics_server(port: int = SCHEDULER_METRICS_PORT):
+    """Serves /metrics for Prometheus from a daemon thread."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Scheduler metrics on :{port}/metrics")
+    return server
+
 def start_scheduler():
-    # Schedule the job to run every 1 minute (for demo purposes)
-    # In production, you might change this to .hours.do(run_etl_job)
-    schedule.every(1).minutes.do(run_etl_job)
-    
-    # Run once immediately on startup so we have data right away
-    run_etl_job()
-
-    print("🚀 ETL Scheduler is running...")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    start_metrics_server()
+
+    # Maintenance first, so today's partitions exist before the first load
+    try:
+        run_maintenance_job()
+    except Exception as e:
+        print(f"❌ Scheduler: maintenance failed - {e}")
+
+    # Every other job runs once right away so we have data on startup, then on its own interval
+    scheduler = build_scheduler()
+    try:
+        scheduler.start()
+    except KeyboardInterrupt:
+        scheduler.stop(wait=False)
 
 if __name__ == "__main__":
-    start_scheduler()
\ No newline at end of file
+    start_scheduler()
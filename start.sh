@@ -1,8 +1,26 @@
 #!/bin/bash
+# Usage: ./start.sh [api|worker|all]
+#   api    -> API only, API_WORKERS uvicorn processes (python -m api)
+#   worker -> ETL scheduler only, with its own /metrics on SCHEDULER_METRICS_PORT
+#   all    -> both in one container (single-box setups); the default
+set -e
 
-# 1. Start the ETL Scheduler in the background (&)
-python -m services.scheduler &
+ROLE=${1:-all}
 
-# 2. Start the API Server in the foreground
-# This keeps the container alive
-uvicorn api.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+case "$ROLE" in
+  api)
+    exec python -m api
+    ;;
+  worker)
+    exec python -m services.scheduler
+    ;;
+  all)
+    # The scheduler in the background, the API in the foreground keeps the container alive
+    python -m services.scheduler &
+    exec python -m api
+    ;;
+  *)
+    echo "Unknown role '$ROLE', expected api, worker or all" >&2
+    exit 1
+    ;;
+esac
@@ -1,12 +1,17 @@
+import json
+import threading
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from sqlalchemy import create_engine, StaticPool
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from core.database import Base, get_db
 from api.main import app
+from api.cache import response_cache
+from api.dependencies import get_session_factory
 
 # IMPORT MODELS HERE so they register with Base.metadata
-from core.models import RawAPIData, UnifiedData, ETLCheckpoint, RawCSVData
+from core.models import RawAPIData, UnifiedData, ETLCheckpoint, RawCSVData, LatestPrice, ETLGeneration
 
 # Use in-memory SQLite for fast testing
 # StaticPool is important for SQLite in-memory to maintain state across threads
@@ -42,4 +47,48 @@ def client(db_session):
             db_session.close()
     
     app.dependency_overrides[get_db] = override_get_db
-    yield TestClient(app)
\ No newline at end of file
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    # Every test starts with an empty response cache and re-reads the ETL generation
+    response_cache.clear()
+    response_cache.poll_seconds = 0
+    yield TestClient(app)
+
+@pytest.fixture(scope="function")
+def stub_server():
+    """
+    Local HTTP server standing in for the upstream APIs.
+    Tests register responses per path: a list of (status, body, headers, delay) tuples that
+    are served in order (the last one repeats). Yields (base_url, routes, hits).
+    """
+    routes = {}
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            hits[path] = hits.get(path, 0) + 1
+            responses = routes.get(path, [(404, {"error": "not found"}, {}, 0)])
+            status, body, headers, delay = responses[min(hits[path], len(responses)) - 1]
+            if delay:
+                threading.Event().wait(delay)
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.handle_error = lambda request, client_address: None # Clients hanging up on timeouts is expected
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", routes, hits
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,5 +1,22 @@
+import io
+import json
 import os
+import subprocess
+import sys
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
 from fastapi import status
+from core.models import UnifiedData, LatestPrice, ETLRun, PriceConsensus, EntityIndicator
+from ingestion.pipeline import IngestionPipeline
+from api.cache import MemoryCacheBackend, SharedCacheBackend, response_cache
+from api.dependencies import AsyncReader, get_read_db
+from api.main import app
+from schemas.api_response import APIResponse
+from core.database import Base, pool_limits
+from core.metrics import MetricsRegistry, MultiprocessCollector
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
 
 API_KEY = os.getenv("API_KEY", "test_key")
 
@@ -11,6 +28,17 @@ def test_health_check(client):
     assert "status" in json_data
     assert "db_connectivity" in json_data
 
+def test_health_reports_the_last_run_like_stats(client, db_session):
+    """/health's ETL status is the last recorded run's, the same one /stats reports."""
+    assert client.get("/health").json()["etl_last_run_status"] == "never_run"
+
+    pipeline = IngestionPipeline(db_session)
+    pipeline._count("transform", "coingecko", rows=1)
+    pipeline.record_run("coingecko", datetime.now(timezone.utc), status="failed")
+
+    stats = client.get("/stats", headers={"x-api-key": API_KEY}).json()
+    assert client.get("/health").json()["etl_last_run_status"] == stats["last_run_status"] == "failed"
+
 def test_get_data_unauthorized(client):
     """Test that an INVALID API Key fails (Security Check)."""
     # We send a key, but it's WRONG. This triggers 401.
@@ -34,4 +62,315 @@ def test_get_data_success(client):
     data = response.json()
     assert "data" in data
     assert "pagination" in data
-    assert data["pagination"]["limit"] == 5
\ No newline at end of file
+    assert data["pagination"]["limit"] == 5
+
+def _seed_unified(db_session, n_rows, offset=0):
+    # Two rows share each timestamp so the id tie-breaker is exercised
+    db_session.add_all([
+        UnifiedData(
+            entity_name="Bitcoin",
+            value=100.0 + i,
+            event_timestamp=datetime(2024, 1, 1) + timedelta(minutes=i // 2),
+            source="coingecko" if i % 3 else "coinpaprika",
+            original_id=f"bitcoin-{offset + i}"
+        )
+        for i in range(n_rows)
+    ])
+    db_session.commit()
+
+def test_get_data_cursor_pagination(client, db_session):
+    """Walking next_cursor visits every row exactly once, newest first."""
+    _seed_unified(db_session, 7)
+    headers = {"x-api-key": API_KEY}
+
+    seen, cursor = [], None
+    while True:
+        url = "/data?limit=3&count=none" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url, headers=headers).json()
+        assert body["pagination"]["total_records"] is None
+        seen += body["data"]
+        cursor = body["pagination"]["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 7
+    assert len({item["id"] for item in seen}) == 7
+    keys = [(item["event_timestamp"], item["id"]) for item in seen]
+    assert keys == sorted(keys, reverse=True)
+
+def test_get_data_filtered_count(client, db_session):
+    """Counting respects the source filter; approximate falls back to exact off Postgres."""
+    _seed_unified(db_session, 6)
+    headers = {"x-api-key": API_KEY}
+
+    body = client.get("/data?source=coinpaprika&count=approximate", headers=headers).json()
+    assert body["pagination"]["total_records"] == 2
+    assert {item["source"] for item in body["data"]} == {"coinpaprika"}
+
+def test_get_data_invalid_cursor(client):
+    response = client.get("/data?cursor=not-a-cursor", headers={"x-api-key": API_KEY})
+    assert response.status_code == 400
+
+def test_get_data_entity_and_time_filters(client, db_session):
+    _seed_unified(db_session, 6)
+    db_session.add(UnifiedData(entity_name="Ethereum", value=1.0, event_timestamp=datetime(2024, 1, 1), source="coingecko", original_id="ethereum"))
+    db_session.commit()
+    headers = {"x-api-key": API_KEY}
+
+    body = client.get("/data?entity=Ethereum", headers=headers).json()
+    assert [item["entity_name"] for item in body["data"]] == ["Ethereum"]
+
+    # Rows 2..3 fall in minute 1 of the seed data
+    body = client.get("/data?entity=Bitcoin&start=2024-01-01T00:01:00&end=2024-01-01T00:02:00", headers=headers).json()
+    assert body["pagination"]["total_records"] == 2
+    assert sorted(item["value"] for item in body["data"]) == [102.0, 103.0]
+
+def test_get_aggregates_ohlc(client, db_session):
+    """Rollups are computed per entity/source/bucket with correct open and close."""
+    base = datetime(2024, 1, 1, 10, 0)
+    for minute, value in [(0, 10.0), (20, 30.0), (40, 5.0), (59, 20.0), (60, 50.0)]:
+        db_session.add(UnifiedData(entity_name="BTC", value=value, event_timestamp=base + timedelta(minutes=minute), source="historical_csv", original_id=f"t{minute}"))
+    db_session.commit()
+
+    body = client.get("/data/aggregate?entity=BTC&bucket=hour", headers={"x-api-key": API_KEY}).json()
+
+    first, second = body["data"]
+    assert first["bucket"].startswith("2024-01-01T10:00:00")
+    assert (first["open"], first["high"], first["low"], first["close"], first["count"]) == (10.0, 30.0, 5.0, 20.0, 4)
+    assert first["avg"] == 16.25
+    assert (second["open"], second["close"], second["count"]) == (50.0, 50.0, 1)
+
+def test_get_latest(client, db_session):
+    db_session.add_all([
+        LatestPrice(entity_name="Bitcoin", source="coingecko", value=50000.0, event_timestamp=datetime(2024, 1, 1), original_id="bitcoin"),
+        LatestPrice(entity_name="Bitcoin", source="coinpaprika", value=50010.0, event_timestamp=datetime(2024, 1, 1), original_id="btc-bitcoin"),
+        LatestPrice(entity_name="Ethereum", source="coingecko", value=3000.0, event_timestamp=datetime(2024, 1, 1), original_id="ethereum"),
+    ])
+    db_session.commit()
+
+    body = client.get("/latest?entity=Bitcoin", headers={"x-api-key": API_KEY}).json()
+    assert [(item["source"], item["value"]) for item in body["data"]] == [("coingecko", 50000.0), ("coinpaprika", 50010.0)]
+
+def test_get_consensus(client, db_session):
+    db_session.add_all([
+        PriceConsensus(asset_id="BTC", bucket=datetime(2024, 1, 1, 0, minute), consensus_price=100.0, min_price=99.0,
+                       max_price=101.0, spread=2.0, spread_bps=200.0, n_sources=len(sources.split(",")), sources=sources)
+        for minute, sources in ((0, "coingecko"), (1, "coingecko,coinpaprika"))
+    ])
+    db_session.commit()
+
+    response = client.get("/consensus?asset=btc&min_sources=2", headers={"x-api-key": API_KEY})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert len(data) == 1
+    assert data[0]["sources"] == ["coingecko", "coinpaprika"]
+    assert data[0]["spread_bps"] == 200.0
+
+def test_get_indicators(client, db_session):
+    db_session.add_all([
+        EntityIndicator(entity_name=name, source="coingecko", event_timestamp=datetime(2024, 1, day), value=100.0 + day,
+                        log_return=0.01 if day > 1 else None)
+        for name in ("Bitcoin", "Ethereum") for day in (1, 2, 3)
+    ])
+    db_session.commit()
+
+    response = client.get("/indicators?entity=Bitcoin&start=2024-01-02T00:00:00", headers={"x-api-key": API_KEY})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [row["event_timestamp"][:10] for row in data] == ["2024-01-03", "2024-01-02"]
+    assert {row["entity_name"] for row in data} == {"Bitcoin"}
+    assert data[0]["log_return"] == 0.01 and data[0]["sma_long"] is None
+
+def test_data_cache_etag_and_invalidation(client, db_session):
+    """Responses carry an ETag, repeat requests get a 304, and an ETL commit invalidates them."""
+    _seed_unified(db_session, 2)
+    headers = {"x-api-key": API_KEY}
+
+    first = client.get("/data?limit=5", headers=headers)
+    etag = first.headers["etag"]
+    # Weak: request_id/latency and the content encoding vary between responses
+    assert etag.startswith('W/"') and first.headers["vary"] == "Accept-Encoding"
+    assert client.get("/data?limit=5", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/data?limit=5", headers={**headers, "If-None-Match": etag.removeprefix("W/")}).status_code == 304
+
+    # Rows added outside the pipeline stay invisible until the generation moves
+    _seed_unified(db_session, 1, offset=2)
+    assert client.get("/data?limit=5", headers=headers).json()["pagination"]["total_records"] == 2
+
+    pipeline = IngestionPipeline(db_session)
+    pipeline._commit_load("coingecko")
+    refreshed = client.get("/data?limit=5", headers={**headers, "If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.json()["pagination"]["total_records"] == 3
+    assert refreshed.headers["etag"] != etag
+
+def test_cache_key_keeps_encoded_query_values_apart(client, db_session):
+    """An encoded "&"/"=" inside a value never shares a cache entry with real separate parameters."""
+    _seed_unified(db_session, 6)
+    headers = {"x-api-key": API_KEY}
+
+    split = client.get("/data?entity=Bitcoin&source=coinpaprika", headers=headers).json()
+    assert split["pagination"]["total_records"] == 2
+    joined = client.get("/data?entity=Bitcoin%26source%3Dcoinpaprika", headers=headers).json()
+    assert joined["pagination"]["total_records"] == 0
+
+def test_data_fast_serialization_and_compression(client, db_session):
+    """/data skips re-validation but still matches DataItem, and large bodies are gzipped."""
+    _seed_unified(db_session, 40)
+    headers = {"x-api-key": API_KEY}
+
+    plain = client.get("/data?limit=40", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    body = plain.json()
+    assert list(body)[:2] == ["request_id", "api_latency_ms"]
+    APIResponse.model_validate(body)
+    assert {item["value"] for item in body["data"]} == {100.0 + i for i in range(40)}
+
+    compressed = client.get("/data?limit=40", headers={**headers, "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers.get_list("vary") == ["Accept-Encoding"]
+    assert compressed.json()["data"] == body["data"]
+
+    # Small responses aren't worth compressing
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+@pytest.mark.parametrize("backend_factory", [
+    lambda tmp_path: MemoryCacheBackend(max_entries=2, ttl=60),
+    lambda tmp_path: SharedCacheBackend(directory=str(tmp_path), max_entries=2, ttl=60),
+])
+def test_cache_backends_evict(tmp_path, backend_factory):
+    backend = backend_factory(tmp_path)
+    for i in range(3):
+        backend.set(f"k{i}", {"value": i})
+        time.sleep(0.01) # Distinct mtimes for the file backend
+
+    assert backend.get("k0") is None
+    assert backend.get("k2") == {"value": 2}
+    backend.clear()
+    assert backend.get("k2") is None
+
+def test_read_routes_on_async_engine(tmp_path):
+    """The read routes work unchanged on an async session (aiosqlite standing in for asyncpg)."""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    db_file = tmp_path / "async.sqlite3"
+    sync_engine = create_engine(f"sqlite:///{db_file}")
+    Base.metadata.create_all(bind=sync_engine)
+    with Session(sync_engine) as session:
+        _seed_unified(session, 3)
+    sync_engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_read_db():
+        async with AsyncSessionLocal() as session:
+            yield AsyncReader(session)
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    response_cache.clear()
+    try:
+        client = TestClient(app)
+        body = client.get("/data?limit=2", headers={"x-api-key": API_KEY}).json()
+        assert body["pagination"]["total_records"] == 3
+        assert len(body["data"]) == 2
+        assert client.get("/health").json()["db_connectivity"] is True
+    finally:
+        del app.dependency_overrides[get_read_db]
+        response_cache.clear()
+
+def test_export_ndjson_and_csv(client, db_session):
+    _seed_unified(db_session, 4)
+    headers = {"x-api-key": API_KEY}
+
+    response = client.get("/export?format=ndjson&source=coingecko", headers=headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["value"] for row in rows] == [101.0, 102.0] # Oldest first, source filter applied
+
+    response = client.get("/export?format=csv", headers=headers)
+    lines = response.text.splitlines()
+    assert lines[0] == "id,entity_name,value,event_timestamp,source,original_id"
+    assert len(lines) == 5
+
+def test_export_parquet(client, db_session):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _seed_unified(db_session, 3)
+
+    response = client.get("/export?format=parquet", headers={"x-api-key": API_KEY})
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 3
+    # Rows share timestamps and tie-break on a random id, so compare order-insensitively
+    assert sorted(table.column("value").to_pylist()) == [100.0, 101.0, 102.0]
+
+def test_metrics_endpoint_reports_route_latency_and_db_time(client, db_session):
+    """/metrics exposes per-route latency and DB time histograms in the Prometheus text format."""
+    _seed_unified(db_session, 2)
+    assert client.get("/data?limit=5", headers={"x-api-key": API_KEY}).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/data",status="200"}' in body
+    assert 'http_request_db_seconds_count{route="/data"}' in body
+    assert "db_query_duration_seconds_count" in body
+
+def test_metrics_summed_across_worker_processes(tmp_path):
+    """Workers sharing METRICS_MULTIPROC_DIR all report the sum of every worker's samples."""
+    workers = []
+    for pid, requests in ((101, 2), (102, 3)):
+        worker_registry = MetricsRegistry()
+        requests_total = worker_registry.counter("requests_total", "Requests")
+        latency = worker_registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        requests_total.inc(requests, route="/data")
+        for _ in range(requests):
+            latency.observe(0.05)
+        worker_registry.multiprocess = MultiprocessCollector(worker_registry, str(tmp_path), pid=pid)
+        workers.append(worker_registry)
+
+    workers[1].render()  # its file exists once it has flushed
+    for body in (workers[0].render(), workers[1].render()):
+        assert 'requests_total{route="/data"} 5' in body
+        assert 'latency_seconds_bucket{le="0.1"} 5' in body
+        assert "latency_seconds_count 5" in body
+
+def test_stats_from_run_history(client, db_session):
+    """/stats reads the per-source totals that each recorded run adds to."""
+    headers = {"x-api-key": API_KEY}
+    empty = client.get("/stats", headers=headers).json()
+    assert (empty["total_records"], empty["last_run_status"], empty["sources"]) == (0, None, [])
+
+    for _ in range(2):
+        pipeline = IngestionPipeline(db_session)
+        pipeline._count("transform", "coingecko", rows=3, rejected=1)
+        pipeline._count("load", "coingecko", rows=3)
+        pipeline.record_run("coingecko", datetime.now(timezone.utc))
+
+    assert db_session.query(ETLRun).count() == 2
+    body = client.get("/stats", headers=headers).json()
+    assert body["total_records"] == 6
+    assert body["last_run_status"] == "success"
+    assert body["sources"][0] | {"last_run_at": None} == {
+        "source": "coingecko", "total_runs": 2, "rows_read": 8, "rows_loaded": 6,
+        "rows_rejected": 2, "last_run_status": "success", "last_run_at": None,
+    }
+
+
+def test_api_process_imports_no_etl_dependencies():
+    """The API process starts without pandas, requests or the ingestion package."""
+    code = (
+        "import sys, api.main; "
+        "print(','.join(m for m in ('pandas', 'numpy', 'requests', 'yfinance', 'ingestion') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={**os.environ, "API_KEY": API_KEY})
+    assert result.stdout.strip() == ""
+
+def test_pool_budget_split_across_workers():
+    assert pool_limits(budget=40, processes=4) == (5, 5)
+    assert pool_limits(budget=3, processes=4) == (1, 0) # Never below one connection
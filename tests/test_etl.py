@@ -1,7 +1,29 @@
+import asyncio
+import threading
+import time
+import httpx
 import pytest
-from datetime import datetime
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 from schemas.etl_schema import UnifiedRow
 from pydantic import ValidationError
+from core.database import Base
+from core.models import RawAPIData, RawCSVData, UnifiedData, ETLCheckpoint, LatestPrice, UnifiedRollup, EntityIdentity, PriceConsensus, EntityIndicator, IndicatorState
+from core.partitions import downsample_unified
+from ingestion.pipeline import IngestionPipeline, file_sha256
+from ingestion.workers import advance_watermarks, drain_raw_batches, run_transform_workers
+from services.scheduler import Scheduler
+from core.metrics import ETL_ROWS, ETL_STAGE_SECONDS
+from ingestion.raw_codec import encode_payload, iter_payload
+from ingestion.reconcile import consensus, reconcile_buckets
+from ingestion import indicators, reconcile
+from ingestion.normalize import normalize_csv_frame
+from ingestion.http_client import build_client, fetch_json
+from ingestion.sources import SOURCE_REGISTRY, SourceAdapter, CoinGeckoAdapter
+from benchmarks.generators import coingecko_payload, coinpaprika_payload, write_csv
 
 def test_valid_transformation():
     """Test that valid data passes Pydantic validation."""
@@ -35,4 +57,703 @@ def test_missing_field_validation():
             event_timestamp=datetime.now(),
             source="test_api",
             original_id="btc"
-        )
\ No newline at end of file
+        )
+
+def _seed_raw_batches(db_session):
+    """Adds one API batch (with a bad item) and two CSV rows (one bad)."""
+    db_session.add(RawAPIData(
+        source_name="coingecko",
+        payload=[
+            {"id": "bitcoin", "name": "Bitcoin", "current_price": 50000},
+            {"id": "ethereum", "name": "Ethereum", "current_price": -1}, # Invalid!
+        ],
+        processed=False
+    ))
+    db_session.add_all([
+        RawCSVData(filename="test.csv", row_data={"ticker": "BTC", "close_price": 42000.5, "trade_date": "2024-01-01T00:00:00", "trade_id": "t1"}),
+        RawCSVData(filename="test.csv", row_data={"ticker": "ETH", "close_price": "oops", "trade_date": "2024-01-01T00:00:00", "trade_id": "t2"}),
+    ])
+    db_session.commit()
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_process_raw_data_counts(db_session, bulk):
+    """Both transform modes skip bad rows and report accepted/rejected counts."""
+    _seed_raw_batches(db_session)
+
+    pipeline = IngestionPipeline(db_session, bulk=bulk, chunk_size=1)
+    result = pipeline.process_raw_data()
+
+    assert result == {"accepted": 2, "rejected": 2}
+    assert db_session.query(UnifiedData).count() == 2
+    assert db_session.query(RawAPIData).filter(RawAPIData.processed == False).count() == 0
+    # The bad CSV row is marked processed along with why it was skipped
+    reasons = {row.row_data["trade_id"]: (row.processed, row.reject_reason) for row in db_session.query(RawCSVData)}
+    assert reasons["t1"] == (True, None)
+    assert reasons["t2"] == (True, "invalid close_price" if bulk else "could not convert string to float: 'oops'")
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_load_counts_inserted_rows_and_rejects_once(db_session, bulk):
+    """rows_loaded leaves out rows the natural key dropped, and a rejected row is only counted by the run that read it."""
+    _seed_raw_batches(db_session)
+    # The same batch fetched twice at the same time: its rows are already in unified_data
+    first = db_session.query(RawAPIData).one()
+    db_session.add(RawAPIData(source_name="coingecko", payload=first.payload, ingested_at=first.ingested_at, processed=False))
+    db_session.commit()
+
+    pipeline = IngestionPipeline(db_session, bulk=bulk)
+    assert pipeline.process_raw_data() == {"accepted": 3, "rejected": 3}
+    assert pipeline.stats["transform"]["coingecko"]["rows"] == 2
+    assert pipeline.stats["load"]["coingecko"]["rows"] == 1
+    assert pipeline.stats["load"]["historical_csv"]["rows"] == 1
+    assert db_session.query(RawCSVData).filter(RawCSVData.processed == False).count() == 0
+
+    assert IngestionPipeline(db_session, bulk=bulk).process_raw_data() == {"accepted": 0, "rejected": 0}
+
+
+def _write_csv(tmp_path, n_rows):
+    path = tmp_path / "prices.csv"
+    lines = ["trade_date,ticker,close_price,trade_id"]
+    lines += [f"2024-01-{i + 1:02d}T00:00:00,BTC,{40000 + i},t{i}" for i in range(n_rows)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+def test_streaming_csv_load(db_session, tmp_path):
+    """Streaming mode loads every row and records the final row offset."""
+    path = _write_csv(tmp_path, 5)
+
+    IngestionPipeline(db_session).fetch_csv_data(path, chunk_size=2)
+
+    assert db_session.query(RawCSVData).count() == 5
+    checkpoint = db_session.query(ETLCheckpoint).filter(ETLCheckpoint.source_name == f"csv:{file_sha256(path)}").one()
+    assert checkpoint.last_run_status == "success"
+    assert checkpoint.last_processed_id == "5"
+
+def test_streaming_csv_resumes_after_crash(db_session, tmp_path):
+    """An interrupted load resumes after the last committed row offset."""
+    path = _write_csv(tmp_path, 5)
+    db_session.add(ETLCheckpoint(source_name=f"csv:{file_sha256(path)}", last_processed_id="3", last_run_status="running"))
+    db_session.commit()
+
+    IngestionPipeline(db_session).fetch_csv_data(path, chunk_size=2)
+
+    trade_ids = sorted(row.row_data["trade_id"] for row in db_session.query(RawCSVData).all())
+    assert trade_ids == ["t3", "t4"]
+
+
+def test_normalize_csv_frame_rejects_with_reasons():
+    """The vectorized normalizer applies the UnifiedRow rules and reports why rows failed."""
+    df = pd.DataFrame([
+        {"ticker": "BTC", "close_price": "42000.5", "trade_date": "2024-01-01T00:00:00", "trade_id": "t1"},
+        {"ticker": "ETH", "close_price": -5, "trade_date": "2024-01-01T00:00:00", "trade_id": "t2"},
+        {"ticker": "SOL", "close_price": "oops", "trade_date": "2024-01-01T00:00:00", "trade_id": "t3"},
+        {"ticker": "ADA", "close_price": 1.0, "trade_date": "not-a-date", "trade_id": "t4"},
+        {"ticker": None, "close_price": 1.0, "trade_date": "2024-01-01T00:00:00", "trade_id": "t5"},
+    ])
+
+    clean, rejected = normalize_csv_frame(df)
+
+    assert list(clean["original_id"]) == ["t1"]
+    assert clean.iloc[0]["value"] == 42000.5
+    assert clean.iloc[0]["event_timestamp"] == datetime(2024, 1, 1)
+    assert rejected.to_dict() == {
+        1: "value must be positive",
+        2: "invalid close_price",
+        3: "invalid trade_date",
+        4: "missing ticker",
+    }
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_csv_blank_ticker_or_trade_id_is_rejected(db_session, tmp_path, bulk):
+    """Blank cells (NaN once pandas reads the file) are rejected by both paths, never loaded as "nan"."""
+    path = tmp_path / "blanks.csv"
+    path.write_text(
+        "trade_date,ticker,close_price,trade_id\n"
+        "2024-01-01T00:00:00,BTC,42000,t1\n"
+        "2024-01-02T00:00:00,,42001,t2\n"
+        "2024-01-03T00:00:00,ETH,2000,\n"
+    )
+    pipeline = IngestionPipeline(db_session, bulk=bulk)
+    pipeline.fetch_csv_data(str(path))
+
+    assert pipeline.process_raw_data() == {"accepted": 1, "rejected": 2}
+    assert [(row.entity_name, row.original_id) for row in db_session.query(UnifiedData)] == [("BTC", "t1")]
+
+
+def test_fetch_api_sources_concurrently_with_retry(db_session, stub_server):
+    """Sources are fetched concurrently; 429s are retried and one failing source doesn't block the rest."""
+    base_url, routes, hits = stub_server
+    routes["/slow"] = [(200, [{"id": "a"}], {}, 0.5)]
+    routes["/limited"] = [(429, {}, {"Retry-After": "0"}, 0), (200, [{"id": "b"}], {}, 0.5)]
+    routes["/broken"] = [(500, {}, {}, 0)]
+
+    pipeline = IngestionPipeline(db_session, sources={
+        "slow": SourceAdapter(name="slow", url=f"{base_url}/slow", timeout=5),
+        "limited": SourceAdapter(name="limited", url=f"{base_url}/limited", timeout=5),
+        "broken": SourceAdapter(name="broken", url=f"{base_url}/broken", timeout=5, max_retries=2, backoff=0.01),
+    })
+
+    start = time.perf_counter()
+    pipeline.fetch_api_sources()
+    elapsed = time.perf_counter() - start
+
+    saved = {row.source_name: row.payload for row in db_session.query(RawAPIData).all()}
+    assert saved == {"slow": [{"id": "a"}], "limited": [{"id": "b"}]}
+    assert hits["/limited"] == 2
+    assert hits["/broken"] == 3
+    # Both 0.5s sources ran at the same time instead of one after another
+    assert elapsed < 1.0
+
+class _UnstorableAdapter(SourceAdapter):
+    async def fetch(self, client):
+        return [{"id": {"not", "json"}}] # Fails when the raw row is written
+
+def test_fetch_api_sources_isolates_store_failures(db_session, stub_server):
+    """A payload that can't be stored is rolled back and logged; the other sources are still saved."""
+    base_url, routes, hits = stub_server
+    routes["/ok"] = [(200, [{"id": "a"}], {}, 0)]
+
+    pipeline = IngestionPipeline(db_session, sources={
+        "bad": _UnstorableAdapter(name="bad", url=f"{base_url}/unused", timeout=5),
+        "ok": SourceAdapter(name="ok", url=f"{base_url}/ok", timeout=5),
+    })
+    pipeline.fetch_api_sources()
+
+    assert {row.source_name: row.payload for row in db_session.query(RawAPIData)} == {"ok": [{"id": "a"}]}
+
+def test_fetch_json_times_out(stub_server):
+    """A source slower than its timeout fails after exhausting its retries."""
+    base_url, routes, hits = stub_server
+    routes["/hang"] = [(200, [], {}, 1)]
+
+    async def run():
+        async with build_client() as client:
+            await fetch_json(client, f"{base_url}/hang", timeout=0.1, max_retries=1, backoff=0.01)
+
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(run())
+    assert hits["/hang"] == 2
+
+
+def test_registered_sources_map_items():
+    """Every built-in source is registered and maps its payload shape to a UnifiedRow."""
+    now = datetime.now()
+    paprika = SOURCE_REGISTRY["coinpaprika"].map_item({"id": "btc-bitcoin", "name": "Bitcoin", "quotes": {"USD": {"price": 20000}}}, now)
+    gecko = SOURCE_REGISTRY["coingecko"].map_item({"id": "bitcoin", "name": "Bitcoin", "current_price": 20001}, now)
+
+    assert (paprika.source, paprika.original_id, paprika.value) == ("coinpaprika", "btc-bitcoin", 20000.0)
+    assert (gecko.source, gecko.original_id, gecko.value) == ("coingecko", "bitcoin", 20001.0)
+
+def test_coingecko_fetches_all_pages():
+    """Pages are fetched until the first short page, several at a time."""
+    pages = {1: [{"id": "a"}, {"id": "b"}], 2: [{"id": "c"}, {"id": "d"}], 3: [{"id": "e"}], 4: []}
+    requested = []
+
+    class PagedAdapter(CoinGeckoAdapter):
+        async def get_json(self, client, limiter, params=None):
+            requested.append(params["page"])
+            return pages[params["page"]]
+
+    adapter = PagedAdapter(per_page=2, max_pages=10, max_concurrency=2, min_interval=0)
+
+    async def run():
+        async with build_client() as client:
+            return await adapter.fetch(client)
+
+    items = asyncio.run(run())
+    assert [item["id"] for item in items] == ["a", "b", "c", "d", "e"]
+    # Pages 3 and 4 were requested together; nothing after the short page
+    assert sorted(requested) == [1, 2, 3, 4]
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_latest_prices_upserted(db_session, bulk):
+    """latest_prices keeps the newest value per entity/source and ignores older late data."""
+    pipeline = IngestionPipeline(db_session, bulk=bulk)
+    rows = lambda value, day: [UnifiedRow(entity_name="BTC", value=value, event_timestamp=datetime(2024, 1, day), source="historical_csv", original_id=f"t{day}")]
+
+    pipeline._load_unified(rows(100.0, 2) + rows(90.0, 1))
+    db_session.commit()
+    pipeline._load_unified(rows(80.0, 1)) # Older than what we have
+    db_session.commit()
+    pipeline._load_unified(rows(120.0, 3))
+    db_session.commit()
+
+    latest = db_session.query(LatestPrice).one()
+    assert (latest.entity_name, latest.source, latest.value, latest.original_id) == ("BTC", "historical_csv", 120.0, "t3")
+
+
+@pytest.mark.parametrize("chunk_size", [0, 2])
+def test_rerun_on_unchanged_inputs_is_a_noop(db_session, tmp_path, chunk_size):
+    """A second load of the same file is skipped by content hash and adds no unified rows."""
+    path = _write_csv(tmp_path, 3)
+    pipeline = IngestionPipeline(db_session, bulk=True)
+
+    pipeline.fetch_csv_data(path, chunk_size=chunk_size)
+    pipeline.process_raw_data()
+    pipeline.fetch_csv_data(path, chunk_size=chunk_size)
+    assert pipeline.process_raw_data() == {"accepted": 0, "rejected": 0}
+
+    assert db_session.query(RawCSVData).count() == 3
+    assert db_session.query(UnifiedData).count() == 3
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_unified_load_upserts_on_natural_key(db_session, bulk):
+    """Loading the same rows twice (e.g. an edited copy of a file) keeps one row per natural key."""
+    pipeline = IngestionPipeline(db_session, bulk=bulk)
+    rows = [UnifiedRow(entity_name="BTC", value=1.0, event_timestamp=datetime(2024, 1, 1), source="historical_csv", original_id="t1")]
+
+    pipeline._load_unified(rows + rows)
+    pipeline._load_unified(rows)
+    db_session.commit()
+
+    assert db_session.query(UnifiedData).count() == 1
+
+def test_transform_advances_watermark(db_session):
+    """Each source's watermark moves with the load; raw rows older than it are not scanned again."""
+    _seed_raw_batches(db_session)
+    pipeline = IngestionPipeline(db_session)
+    pipeline.process_raw_data()
+
+    batch = db_session.query(RawAPIData).one()
+    checkpoint = db_session.query(ETLCheckpoint).filter(ETLCheckpoint.source_name == "coingecko").one()
+    assert (checkpoint.last_processed_id, checkpoint.last_run_status) == (batch.id, "success")
+    assert db_session.query(ETLCheckpoint).filter(ETLCheckpoint.source_name == "coinpaprika").first() is None
+
+    # A leftover unprocessed batch from long before the watermark is outside the selection window
+    db_session.add(RawAPIData(
+        source_name="coingecko",
+        payload=[{"id": "old", "name": "Old", "current_price": 1}],
+        ingested_at=checkpoint.last_processed_timestamp - timedelta(days=1),
+        processed=False
+    ))
+    db_session.commit()
+    assert pipeline.process_raw_data()["accepted"] == 0
+
+def test_downsample_unified_rolls_old_rows_into_daily_candles(db_session):
+    """Rows older than the cutoff become one OHLC row per entity/source/day; recent rows stay."""
+    now = datetime(2024, 3, 1, 12)
+    old_day = datetime(2024, 1, 1)
+    for i, value in enumerate([10.0, 30.0, 5.0, 20.0]):
+        db_session.add(UnifiedData(entity_name="BTC", value=value, event_timestamp=old_day + timedelta(hours=i + 1), source="coingecko", original_id=f"old-{i}"))
+    db_session.add(UnifiedData(entity_name="BTC", value=99.0, event_timestamp=now, source="coingecko", original_id="new"))
+    db_session.commit()
+
+    assert downsample_unified(db_session, after_days=30, now=now) == 1
+
+    rollup = db_session.query(UnifiedRollup).one()
+    assert (rollup.open, rollup.high, rollup.low, rollup.close, rollup.count) == (10.0, 30.0, 5.0, 20.0, 4)
+    assert rollup.avg == pytest.approx(16.25)
+    assert [row.original_id for row in db_session.query(UnifiedData)] == ["new"]
+
+    # Late rows for an already rolled-up day are merged into its candle
+    db_session.add(UnifiedData(entity_name="BTC", value=50.0, event_timestamp=old_day + timedelta(hours=6), source="coingecko", original_id="late"))
+    db_session.commit()
+    downsample_unified(db_session, after_days=30, now=now)
+
+    rollup = db_session.query(UnifiedRollup).populate_existing().one()
+    assert (rollup.open, rollup.high, rollup.close, rollup.count) == (10.0, 50.0, 50.0, 5)
+
+    # Late rows from before the candle's first row move its open, and don't touch its close
+    db_session.add(UnifiedData(entity_name="BTC", value=7.0, event_timestamp=old_day + timedelta(minutes=30), source="coingecko", original_id="early"))
+    db_session.commit()
+    downsample_unified(db_session, after_days=30, now=now)
+
+    rollup = db_session.query(UnifiedRollup).populate_existing().one()
+    assert (rollup.open, rollup.close, rollup.count) == (7.0, 50.0, 6)
+
+def test_worker_drains_raw_batches_once(db_session):
+    """A transform worker claims every unprocessed batch once and stops when nothing is left."""
+    _seed_raw_batches(db_session)
+    db_session.add(RawAPIData(source_name="coinpaprika", payload=[{"id": "btc-bitcoin", "name": "Bitcoin", "quotes": {"USD": {"price": 1.0}}}], processed=False))
+    # A source without an adapter (e.g. since removed) is left alone, as in the sequential transform
+    db_session.add(RawAPIData(source_name="retired", payload=[{"id": "bitcoin", "current_price": 1.0}], processed=False))
+    db_session.commit()
+
+    result = drain_raw_batches(db_session, csv_claim_size=1)
+
+    assert result | {"positions": None} == {"accepted": 3, "rejected": 2, "batches": 4, "positions": None}
+    assert set(result["positions"]) == {"coingecko", "coinpaprika", "historical_csv"}
+    assert db_session.query(UnifiedData).count() == 3
+    assert [row.source_name for row in db_session.query(RawAPIData).filter(RawAPIData.processed == False)] == ["retired"]
+    # The rejected CSV row is marked too, like in the sequential transform
+    assert db_session.query(RawCSVData).filter(RawCSVData.processed == False).count() == 0
+
+def test_workers_advance_the_watermarks(tmp_path):
+    """After the pool, each watermark sits on the last row processed, or on the oldest row a late commit left behind."""
+    database_url = f"sqlite:///{tmp_path / 'etl.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    batch = lambda minute, price: RawAPIData(
+        source_name="coingecko", ingested_at=datetime(2024, 1, 1, 0, minute), processed=False,
+        payload=[{"id": "bitcoin", "name": "Bitcoin", "current_price": price}]
+    )
+    with Session() as db:
+        db.add_all([batch(0, 100), batch(10, 110)])
+        db.add(RawCSVData(filename="test.csv", ingested_at=datetime(2024, 1, 1, 0, 5), row_data={
+            "ticker": "BTC", "close_price": 42000.5, "trade_date": "2024-01-01T00:00:00", "trade_id": "t1"
+        }))
+        db.commit()
+
+    assert run_transform_workers(1, database_url)["batches"] == 3
+
+    with Session() as db:
+        watermarks = {c.source_name: c.last_processed_timestamp for c in db.query(ETLCheckpoint)}
+        assert watermarks == {"coingecko": datetime(2024, 1, 1, 0, 10), "historical_csv": datetime(2024, 1, 1, 0, 5)}
+
+        # Workers processed up to 00:20 while a batch from 00:15 was still being committed
+        late = batch(15, 115)
+        db.add_all([late, batch(20, 120)])
+        db.commit()
+        newest = db.query(RawAPIData).filter(RawAPIData.ingested_at == datetime(2024, 1, 1, 0, 20)).one()
+        newest.processed = True
+        db.commit()
+        advance_watermarks(db, {"coingecko": (newest.ingested_at, newest.id)})
+        checkpoint = db.query(ETLCheckpoint).filter(ETLCheckpoint.source_name == "coingecko").one()
+        assert (checkpoint.last_processed_timestamp, checkpoint.last_processed_id) == (late.ingested_at, late.id)
+    engine.dispose()
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_scheduler_never_overlaps_a_running_job():
+    """A job still running at its next tick misses that tick; other jobs keep their own cadence."""
+    clock = _FakeClock()
+    release = threading.Event()
+    runs = {"slow": 0, "fast": 0}
+
+    def slow():
+        runs["slow"] += 1
+        release.wait(5)
+
+    scheduler = Scheduler(clock=clock)
+    scheduler.add_job("slow", slow, interval=60, jitter=0)
+    scheduler.add_job("fast", lambda: runs.__setitem__("fast", runs["fast"] + 1), interval=10, jitter=0)
+    try:
+        assert len(scheduler.run_pending()) == 2
+        for _ in range(6):
+            clock.now += 10
+            for future in scheduler.run_pending():
+                future.result(timeout=1)
+        # slow is still blocked, so its tick at +60 was dropped rather than queued; fast ran every tick
+        assert runs == {"slow": 1, "fast": 7}
+
+        release.set()
+        time.sleep(0.1)
+        clock.now += 60
+        scheduler.run_pending()
+        time.sleep(0.1)
+        assert runs["slow"] == 2
+    finally:
+        release.set()
+        scheduler.stop()
+
+@pytest.mark.parametrize("misfire, expected_runs", [("coalesce", 2), ("skip", 1)])
+def test_scheduler_misfire_policy(misfire, expected_runs):
+    """After missing several ticks, coalesce runs once to catch up and skip waits for the next tick."""
+    clock = _FakeClock()
+    runs = []
+    scheduler = Scheduler(clock=clock)
+    scheduler.add_job("job", lambda: runs.append(clock.now), interval=60, jitter=0, misfire=misfire)
+    try:
+        for future in scheduler.run_pending():
+            future.result(timeout=1)
+        clock.now += 60 * 3 + 5
+        for future in scheduler.run_pending():
+            future.result(timeout=1)
+        assert len(runs) == expected_runs
+        # Either way, the next run is the next tick on the original grid
+        assert scheduler.jobs[0].next_run == 1000.0 + 60 * 4
+    finally:
+        scheduler.stop()
+
+def test_pipeline_records_stage_metrics(db_session):
+    """Every stage is timed per source, and accepted/rejected rows are counted for the run and the process."""
+    _seed_raw_batches(db_session)
+    rejected_before = ETL_ROWS.value(stage="transform", source="coingecko", outcome="rejected")
+    loads_before = ETL_STAGE_SECONDS.count(stage="load", source="coingecko")
+
+    pipeline = IngestionPipeline(db_session)
+    pipeline.process_raw_data()
+
+    assert pipeline.stats["transform"]["coingecko"]["rows"] == 1
+    assert pipeline.stats["transform"]["coingecko"]["rejected"] == 1
+    assert pipeline.stats["transform"]["historical_csv"]["rejected"] == 1
+    assert pipeline.stats["commit"]["coingecko"]["seconds"] > 0
+    assert ETL_ROWS.value(stage="transform", source="coingecko", outcome="rejected") == rejected_before + 1
+    assert ETL_STAGE_SECONDS.count(stage="load", source="coingecko") == loads_before + 1
+
+def test_compressed_payload_roundtrip():
+    """Compressed payloads decode back to the same items, and the hash ignores key order."""
+    items = [{"id": "bitcoin", "current_price": 1.5}, {"id": "ethereum", "current_price": 2}]
+    blob, content_hash = encode_payload(items, "gzip")
+
+    assert list(iter_payload(blob, "gzip")) == items
+    assert encode_payload([{"current_price": 1.5, "id": "bitcoin"}, items[1]], "gzip")[1] == content_hash
+
+def test_compressed_raw_storage_skips_unchanged_payloads(db_session):
+    """In compressed mode raw batches are stored as bytes, repeats are skipped, and the transform reads them."""
+    pipeline = IngestionPipeline(db_session, raw_compression="gzip")
+    payload = [{"id": "bitcoin", "name": "Bitcoin", "current_price": 50000}]
+
+    pipeline._store_raw("coingecko", payload)
+    pipeline._store_raw("coingecko", payload)
+    batch = db_session.query(RawAPIData).one()
+    assert (batch.payload, batch.payload_encoding, len(batch.content_hash)) == (None, "gzip", 64)
+
+    assert pipeline.process_raw_data() == {"accepted": 1, "rejected": 0}
+    assert db_session.query(UnifiedData).one().value == 50000
+
+    # A changed payload is stored again
+    pipeline._store_raw("coingecko", [{"id": "bitcoin", "name": "Bitcoin", "current_price": 50001}])
+    assert db_session.query(RawAPIData).count() == 2
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_reconciliation_builds_identity_index_and_consensus(db_session, bulk):
+    """Each source's BTC maps to one asset id; a minute bucket takes every source's price as of it."""
+    db_session.add_all([
+        RawAPIData(source_name="coingecko", ingested_at=datetime(2024, 1, 1, 0, 0, 10), processed=False, payload=[
+            {"id": "bitcoin", "name": "Bitcoin", "symbol": "btc", "current_price": 50000},
+            {"id": "ethereum", "name": "Ethereum", "symbol": "eth", "current_price": 3000},
+        ]),
+        # 70 seconds later, in the next bucket, and again well past the tolerance
+        RawAPIData(source_name="coinpaprika", ingested_at=datetime(2024, 1, 1, 0, 1, 20), processed=False, payload=[
+            {"id": "btc-bitcoin", "name": "Bitcoin", "symbol": "BTC", "quotes": {"USD": {"price": 50100}}},
+        ]),
+        RawAPIData(source_name="coinpaprika", ingested_at=datetime(2024, 1, 1, 0, 9), processed=False, payload=[
+            {"id": "btc-bitcoin", "name": "Bitcoin", "symbol": "BTC", "quotes": {"USD": {"price": 50200}}},
+        ]),
+        # A daily close: the day before, it never lands near the minute ticks
+        RawCSVData(filename="test.csv", row_data={"ticker": "BTC", "close_price": 42000, "trade_date": "2023-12-31T00:00:00", "trade_id": "t1"}),
+    ])
+    db_session.commit()
+
+    # CoinPaprika first: CoinGecko's earlier tick, loaded later, still counts for the 00:01 bucket
+    IngestionPipeline(db_session, bulk=bulk, sources={"coinpaprika": SOURCE_REGISTRY["coinpaprika"]}).process_raw_data(include_csv=False)
+    IngestionPipeline(db_session, bulk=bulk).process_raw_data()
+
+    identities = {(i.source, i.entity_name): (i.asset_id, i.original_id) for i in db_session.query(EntityIdentity)}
+    assert identities == {
+        ("coingecko", "Bitcoin"): ("BTC", "bitcoin"),
+        ("coingecko", "Ethereum"): ("ETH", "ethereum"),
+        ("coinpaprika", "Bitcoin"): ("BTC", "btc-bitcoin"),
+        ("historical_csv", "BTC"): ("BTC", None),
+    }
+
+    btc = {row.bucket: row for row in db_session.query(PriceConsensus).filter(PriceConsensus.asset_id == "BTC")}
+    assert sorted(btc) == [datetime(2023, 12, 31), datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 1, 0, 1), datetime(2024, 1, 1, 0, 9)]
+    both = btc[datetime(2024, 1, 1, 0, 1)]
+    assert (both.consensus_price, both.min_price, both.max_price, both.spread) == (50050, 50000, 50100, 100)
+    assert (both.n_sources, both.sources) == (2, "coingecko,coinpaprika")
+    assert btc[datetime(2024, 1, 1, 0, 0)].sources == "coingecko"
+    assert btc[datetime(2024, 1, 1, 0, 9)].sources == "coinpaprika"
+    assert btc[datetime(2023, 12, 31)].sources == "historical_csv"
+    assert db_session.query(PriceConsensus).filter(PriceConsensus.asset_id == "ETH").one().n_sources == 1
+
+@pytest.mark.parametrize("asset_map", [{}, {("coingecko", "uniswap"): "UNI"}])
+def test_reconciliation_excludes_ambiguous_tickers(db_session, monkeypatch, asset_map):
+    """Two CoinGecko coins share the ticker UNI: neither is UNI unless mapped by its CoinGecko id."""
+    monkeypatch.setattr(reconcile, "ASSET_ID_MAP", asset_map)
+    # Recorded before the ticker turned out to be ambiguous
+    db_session.add(EntityIdentity(source="coingecko", entity_name="Universe Token", asset_id="UNI", original_id="universe"))
+    db_session.add_all([
+        RawAPIData(source_name="coingecko", ingested_at=datetime(2024, 1, 1, 0, 0, 10), processed=False, payload=[
+            {"id": "uniswap", "name": "Uniswap", "symbol": "uni", "current_price": 6.0},
+            {"id": "universe", "name": "Universe Token", "symbol": "uni", "current_price": 0.02},
+        ]),
+        RawAPIData(source_name="coinpaprika", ingested_at=datetime(2024, 1, 1, 0, 0, 40), processed=False, payload=[
+            {"id": "uni-uniswap", "name": "Uniswap", "symbol": "UNI", "quotes": {"USD": {"price": 6.1}}},
+        ]),
+    ])
+    db_session.commit()
+
+    IngestionPipeline(db_session).process_raw_data(include_csv=False)
+
+    identities = {(i.source, i.entity_name): i.asset_id for i in db_session.query(EntityIdentity)}
+    uni = db_session.query(PriceConsensus).filter(PriceConsensus.asset_id == "UNI").one()
+    if asset_map:
+        assert identities == {("coingecko", "Uniswap"): "UNI", ("coinpaprika", "Uniswap"): "UNI"}
+        assert (uni.sources, uni.min_price, uni.max_price) == ("coingecko,coinpaprika", 6.0, 6.1)
+    else:
+        assert identities == {("coinpaprika", "Uniswap"): "UNI"}
+        assert uni.sources == "coinpaprika"
+
+def test_parse_asset_map():
+    assert reconcile.parse_asset_map(" coingecko:uniswap=uni, coinpaprika:uni-uniswap=UNI ") == {
+        ("coingecko", "uniswap"): "UNI", ("coinpaprika", "uni-uniswap"): "UNI",
+    }
+    with pytest.raises(ValueError):
+        reconcile.parse_asset_map("coingecko=UNI")
+
+def test_reconcile_buckets_are_aware_utc():
+    """Buckets are UTC-aware whatever the input, so Postgres never reads them in its session time zone."""
+    utc_midnight = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    paris = timezone(timedelta(hours=1))
+    assert reconcile.bucket_start(datetime(2024, 1, 1, 1, 0, 30, tzinfo=paris), "hour") == utc_midnight
+    assert reconcile.bucket_start(datetime(2024, 1, 1, 0, 0, 30), "minute").tzinfo == timezone.utc
+    assert reconcile.as_of_buckets(datetime(2024, 1, 1, 0, 59, 30), "minute", timedelta(minutes=1)) == [
+        utc_midnight + timedelta(minutes=59), utc_midnight + timedelta(hours=1),
+    ]
+
+def test_consensus_serializes_concurrent_sources(tmp_path):
+    """Two sources' jobs recomputing the same bucket at once: the second waits and sees the first's price."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'etl.db'}", connect_args={"timeout": 10})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    price = lambda source, second, value: UnifiedData(entity_name="Bitcoin", source=source, value=value, original_id=source,
+                                                      event_timestamp=datetime(2024, 1, 1, 0, 0, second))
+    bucket = {("BTC", datetime(2024, 1, 1))}
+    with Session() as db:
+        db.add_all([EntityIdentity(source=source, entity_name="Bitcoin", asset_id="BTC") for source in ("coingecko", "coinpaprika")])
+        db.add(price("coinpaprika", 40, 50100.0))
+        db.commit()
+
+    first, second = Session(), Session()
+    first.add(price("coingecko", 10, 50000.0))
+    first.flush()
+    reconcile_buckets(first, bucket) # CoinGecko's load, not committed yet
+
+    def other_job():
+        reconcile_buckets(second, bucket)
+        second.commit()
+    job = threading.Thread(target=other_job)
+    job.start()
+    time.sleep(0.3) # Let the other job get as far as the bucket
+    first.commit()
+    job.join()
+    first.close()
+    second.close()
+
+    with Session() as db:
+        assert db.query(PriceConsensus).one().sources == "coingecko,coinpaprika"
+    engine.dispose()
+
+def test_consensus_uses_the_median():
+    result = consensus({"a": 100.0, "b": 102.0, "c": 1000.0, "d": 101.0})
+    assert result["consensus_price"] == 101.5
+    assert result["spread"] == 900.0
+    assert result["n_sources"] == 4
+
+def test_benchmark_generators_match_the_adapters(tmp_path):
+    """Synthetic payloads map through the real adapters onto the same assets, and CSVs carry the requested bad rows."""
+    now = datetime(2024, 1, 1)
+    gecko = [SOURCE_REGISTRY["coingecko"].map_item(item, now) for item in coingecko_payload(5, bad_every=0)]
+    paprika = [SOURCE_REGISTRY["coinpaprika"].map_item(item, now) for item in coinpaprika_payload(5, bad_every=0)]
+    assert [row.asset_id for row in gecko] == [row.asset_id for row in paprika] == [f"C{i}" for i in range(5)]
+    assert coingecko_payload(5) == coingecko_payload(5) # Deterministic
+
+    path = write_csv(str(tmp_path / "prices.csv"), 100, bad_every=10)
+    clean, rejected = normalize_csv_frame(pd.read_csv(path))
+    assert (len(clean), len(rejected)) == (90, 10)
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_transform_pages_through_the_backlog(db_session, bulk):
+    """Small pages still drain everything, skip past rejected CSV rows, and leave no raw rows in the session."""
+    db_session.add_all([
+        RawAPIData(source_name="coingecko", ingested_at=datetime(2024, 1, 1, 0, i), processed=False,
+                   payload=[{"id": "bitcoin", "name": "Bitcoin", "current_price": 100 + i}])
+        for i in range(5)
+    ])
+    db_session.add_all([
+        RawCSVData(filename="test.csv", ingested_at=datetime(2024, 1, 1, 0, i), row_data={
+            "ticker": "BTC", "close_price": "oops" if i == 1 else 40000 + i, "trade_date": f"2024-01-0{i + 1}T00:00:00", "trade_id": f"t{i}"
+        })
+        for i in range(5)
+    ])
+    db_session.commit()
+    db_session.expunge_all()
+
+    pipeline = IngestionPipeline(db_session, bulk=bulk, batch_size=2, csv_batch_size=2)
+    assert pipeline.process_raw_data() == {"accepted": 9, "rejected": 1}
+    assert db_session.query(UnifiedData).count() == 9
+    assert db_session.query(RawAPIData).filter(RawAPIData.processed == False).count() == 0
+    assert not [obj for obj in db_session.identity_map.values() if isinstance(obj, (RawAPIData, RawCSVData))]
+
+def test_indicators_match_pandas():
+    """The NumPy indicators agree with pandas' rolling/ewm, also when computed in two increments."""
+    prices = pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.02, 600))))
+    full = indicators.compute_series(prices.to_numpy())
+
+    returns = np.log(prices).diff()
+    expected = {
+        "log_return": returns,
+        "sma_short": prices.rolling(indicators.SHORT_WINDOW).mean(),
+        "sma_long": prices.rolling(indicators.LONG_WINDOW).mean(),
+        "ema_short": prices.ewm(span=indicators.SHORT_WINDOW, adjust=False).mean(),
+        "ema_long": prices.ewm(span=indicators.LONG_WINDOW, adjust=False).mean(),
+        "volatility": returns.rolling(indicators.VOLATILITY_WINDOW).std(),
+    }
+    for name, series in expected.items():
+        np.testing.assert_allclose(full[name], series.to_numpy(), rtol=1e-9, equal_nan=True, err_msg=name)
+
+    # Continuing from the state after 400 points gives the same last 200
+    head = indicators.compute_series(prices[:400].to_numpy())
+    tail = indicators.compute_series(prices[400:].to_numpy(), prices[400 - indicators.tail_size():400].to_numpy(),
+                                     head["ema_short"][-1], head["ema_long"][-1])
+    for name in expected:
+        np.testing.assert_allclose(tail[name], full[name][400:], rtol=1e-9, equal_nan=True, err_msg=name)
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_indicators_update_incrementally_and_rebuild_on_backfill(db_session, bulk):
+    """New days extend the stored series; an older day triggers a rebuild that matches a from-scratch run."""
+    pipeline = IngestionPipeline(db_session, bulk=bulk, reconcile=False, indicators=True)
+    row = lambda day, value: UnifiedRow(entity_name="BTC", value=value, event_timestamp=datetime(2024, 1, 1) + timedelta(days=day),
+                                        source="historical_csv", original_id=f"t{day}")
+    prices = {day: 100.0 + day + (day % 3) for day in range(40)}
+
+    pipeline._load_unified([row(day, prices[day]) for day in range(5, 30)])
+    db_session.commit()
+    pipeline._load_unified([row(day, prices[day]) for day in range(30, 40)]) # Appended
+    db_session.commit()
+    pipeline._load_unified([row(day, prices[day]) for day in range(0, 5)]) # Backfill before the first day
+    db_session.commit()
+
+    stored = db_session.query(EntityIndicator).order_by(EntityIndicator.event_timestamp).all()
+    assert len(stored) == 40
+    expected = indicators.compute_series(np.array([prices[day] for day in range(40)]))
+    np.testing.assert_allclose([r.ema_long for r in stored], expected["ema_long"], rtol=1e-9)
+    np.testing.assert_allclose([r.sma_long if r.sma_long is not None else np.nan for r in stored], expected["sma_long"], rtol=1e-9, equal_nan=True)
+    assert stored[0].log_return is None and stored[-1].volatility is not None
+
+def test_indicator_state_serializes_concurrent_batches(tmp_path):
+    """Two workers loading consecutive batches of a series at once: the second waits and continues from the first."""
+    # A file database, so the two sessions really are separate connections with their own transactions
+    engine = create_engine(f"sqlite:///{tmp_path / 'etl.db'}", connect_args={"timeout": 10})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    point = lambda day, value: {"entity_name": "BTC", "source": "historical_csv", "value": value,
+                                "event_timestamp": datetime(2024, 1, 1) + timedelta(days=day)}
+
+    with Session() as db:
+        db.add(UnifiedData(**point(0, 100.0), original_id="t0"))
+        indicators.update_indicators(db, [point(0, 100.0)])
+        db.commit()
+
+    first, second = Session(), Session()
+    indicators.update_indicators(first, [point(1, 110.0)]) # Holds the series' state, not committed yet
+
+    def other_worker():
+        indicators.update_indicators(second, [point(2, 121.0)])
+        second.commit()
+    worker = threading.Thread(target=other_worker)
+    worker.start()
+    time.sleep(0.3) # Let the other worker get as far as the state
+    first.commit()
+    worker.join()
+    first.close()
+    second.close()
+
+    expected = indicators.compute_series(np.array([100.0, 110.0, 121.0]))
+    with Session() as db:
+        state = db.get(IndicatorState, ("BTC", "historical_csv"))
+        assert state.tail == [100.0, 110.0, 121.0]
+        assert state.ema_short == pytest.approx(expected["ema_short"][-1])
+        last = db.query(EntityIndicator).order_by(EntityIndicator.event_timestamp.desc()).first()
+        assert last.log_return == pytest.approx(np.log(121.0 / 110.0))
+    engine.dispose()